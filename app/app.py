@@ -5,11 +5,13 @@ from datetime import datetime
 import os
 
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 
 from sqlalchemy.orm import sessionmaker  # import the sessionmaker for adding data to the database
 from sqlalchemy.ext.automap import automap_base # import for declaring classes
 
+from src.helpers.helpers import create_db_engine  # import the helper for creating the shared, pooled engine
+from src.model_registry import get_current_version  # import for resolving the current version of the models
+
 # Initialize the Flask application
 app = Flask(__name__)
 
@@ -23,10 +25,10 @@ logging.config.fileConfig(app.config["LOGGING_CONFIG"])
 logger = logging.getLogger("sell_out_project")
 logger.debug('start of app')
 
-# Initialize the database
-db = SQLAlchemy(app)
-
-engine = db.engine
+# Initialize the database through the same pooled engine factory used by the pipeline
+engine = create_db_engine(app.config["DATABASE_NAME"], app.config["DATABASE_TYPE"],
+                          pool_size=app.config["POOL_SIZE"], max_overflow=app.config["MAX_OVERFLOW"],
+                          pool_pre_ping=app.config["POOL_PRE_PING"], pool_recycle=app.config["POOL_RECYCLE"])
 
 # use the engine to build a reflection of the database
 Base = automap_base()
@@ -60,8 +62,10 @@ def index():
     try:
         results = session.query(Event, Venue, Score).join(Venue, Venue.id==Event.venueId).join(Score, Score.event_id==Event.id).filter(Event.startDate >= datetime.today()).filter(Score.predictionDate >= datetime(datetime.today().year,datetime.today().month,datetime.today().day-1,12)).order_by(Event.startDate).limit(app.config["MAX_ROWS_SHOW"]).all()
         logger.debug("Index page accessed")
+        # resolve the current version of the models through the registry
+        model = get_current_version(engine)
         # render the query results into the page
-        return render_template('index.html', results=results)
+        return render_template('index.html', results=results, model=model)
     except:
         # if there is an issue, then display the error page
         traceback.print_exc()
@@ -1,18 +1,12 @@
-import os
-
 DEBUG = True
 LOGGING_CONFIG = "config/logging/local.conf"
 PORT = 3000
 APP_NAME = "sell_out_project"
-conn_type = "mysql+pymysql"
-user = os.environ.get("MYSQL_USER")
-password = os.environ.get("MYSQL_PASSWORD")
-host = os.environ.get("MYSQL_HOST")
-port = os.environ.get("MYSQL_PORT")
+DATABASE_TYPE = "mysql+pymysql"  # the MYSQL_USER, MYSQL_PASSWORD, MYSQL_HOST and MYSQL_PORT are read from the environment
 DATABASE_NAME = 'msia423'
-SQLALCHEMY_DATABASE_URI = "{}://{}:{}@{}:{}/{}".\
-format(conn_type, user, password, host, port, DATABASE_NAME)
-SQLALCHEMY_TRACK_MODIFICATIONS = True
+POOL_SIZE = 5  # connections kept open in the pool
+MAX_OVERFLOW = 10  # connections allowed beyond POOL_SIZE under load
+POOL_PRE_PING = True  # check connections on checkout so stale RDS connections are replaced
+POOL_RECYCLE = 3600  # seconds before a pooled connection is recycled
 HOST = "0.0.0.0"
-SQLALCHEMY_ECHO = False  # If true, SQL for queries made will be printed
 MAX_ROWS_SHOW = 500
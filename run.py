@@ -24,8 +24,13 @@ from src.populate_database import run_populate
 from src.update_database import run_update
 from src.generate_features import run_generate
 from src.train_model import run_train_model
+from src.model_registry import run_registry
 from src.score_model import run_scoring
 from src.evaluate_model import run_evaluate
+from src.archive_data import run_archive
+from src.compact_scores import run_compact
+from src.sell_out_stats import run_rebuild_stats
+from src.run_daily import run_daily
 
 def run_app(args):
     app.run(debug=app.config["DEBUG"], port=app.config["PORT"], host=app.config["HOST"])
@@ -69,6 +74,9 @@ if __name__ == '__main__':
     sb_features.add_argument('--type', default=None, help="type of database, 'sqlite' or 'mysql+pymysql'")
     sb_features.add_argument('--database_name', default=None,
                            help="location of the database (including name.db)")
+    sb_features.add_argument('--full_rebuild', action='store_true', help="rebuild the features of every event")
+    sb_features.add_argument('--refresh_vocabulary', action='store_true',
+                             help="add the venues and presenters that now have enough events to the vocabulary")
     sb_features.set_defaults(func=run_generate)
 
     sb_train = subparsers.add_parser("train", description="Train models based on the features")
@@ -76,11 +84,29 @@ if __name__ == '__main__':
     sb_train.add_argument('--type', default=None, help="type of database, 'sqlite' or 'mysql+pymysql'")
     sb_train.add_argument('--database_name', default=None,
                              help="location of the database (including name.db)")
-    sb_train.add_argument('--model_type', default='linear', help='type of models to train, should be "linear" or "tree"')
+    sb_train.add_argument('--model_type', default='linear',
+                          help='type of models to train, should be "linear", "tree", "forest", "boosted", or "sgd" '
+                               '(the only type --incremental can update)')
     sb_train.add_argument('--model_location', default=None, help='location of where to save models')
     sb_train.add_argument('--location_type', default=None, help='whether the models will be saved locally or in s3')
+    sb_train.add_argument('--search', action='store_true',
+                          help='search the families of models and their hyperparameters for the best models')
+    sb_train.add_argument('--incremental', action='store_true',
+                          help='update the saved models with only the events labeled since they were trained')
+    sb_train.add_argument('--fast', action='store_true',
+                          help='train approximate models on a sample of the events, logging their estimated gap to '
+                               'full training')
     sb_train.set_defaults(func=run_train_model)
 
+    sb_models = subparsers.add_parser("models", description="List, promote, or roll back the versions of the models")
+    sb_models.add_argument("--config", default=None, help="Location of configuration yaml")
+    sb_models.add_argument('--type', default=None, help="type of database, 'sqlite' or 'mysql+pymysql'")
+    sb_models.add_argument('--database_name', default=None,
+                           help="location of the database (including name.db)")
+    sb_models.add_argument('--promote', default=None, help='version of the models to make current')
+    sb_models.add_argument('--rollback', action='store_true', help='make the previously current version current again')
+    sb_models.set_defaults(func=run_registry)
+
     sb_score = subparsers.add_parser("score", description="Score the models based on the features")
     sb_score.add_argument("--config", default=None, help="Location of configuration yaml")
     sb_score.add_argument('--type', default=None, help="type of database, 'sqlite' or 'mysql+pymysql'")
@@ -99,6 +125,47 @@ if __name__ == '__main__':
     sb_evaluate.add_argument('--location_type', default=None, help='whether the results should be saved locally or in s3')
     sb_evaluate.set_defaults(func=run_evaluate)
 
+    sb_archive = subparsers.add_parser("archive", description="Move past events, their features, and scores into the archive tables")
+    sb_archive.add_argument("--config", default=None, help="Location of configuration yaml")
+    sb_archive.add_argument('--type', default=None, help="type of database, 'sqlite' or 'mysql+pymysql'")
+    sb_archive.add_argument('--database_name', default=None,
+                            help="location of the database (including name.db)")
+    sb_archive.add_argument('--archive_days', default=None, help="days after an event's start before it is archived")
+    sb_archive.set_defaults(func=run_archive)
+
+    sb_compact = subparsers.add_parser("compact", description="Compact the old daily scores into per-event rollups")
+    sb_compact.add_argument("--config", default=None, help="Location of configuration yaml")
+    sb_compact.add_argument('--type', default=None, help="type of database, 'sqlite' or 'mysql+pymysql'")
+    sb_compact.add_argument('--database_name', default=None,
+                            help="location of the database (including name.db)")
+    sb_compact.add_argument('--retention_days', default=None, help="days of full daily scores to keep")
+    sb_compact.set_defaults(func=run_compact)
+
+    sb_stats = subparsers.add_parser("stats", description="Rebuild the venue and presenter sell out statistics from every event")
+    sb_stats.add_argument("--config", default=None, help="Location of configuration yaml")
+    sb_stats.add_argument('--type', default=None, help="type of database, 'sqlite' or 'mysql+pymysql'")
+    sb_stats.add_argument('--database_name', default=None,
+                          help="location of the database (including name.db)")
+    sb_stats.set_defaults(func=run_rebuild_stats)
+
+    sb_daily = subparsers.add_parser("daily", description="Run the update, features, train, score, and evaluate stages in a single process")
+    sb_daily.add_argument("--config", default=None, help="Location of configuration yaml")
+    sb_daily.add_argument('--type', default=None, help="type of database, 'sqlite' or 'mysql+pymysql'")
+    sb_daily.add_argument('--database_name', default=None,
+                          help="location of the database (including name.db)")
+    sb_daily.add_argument('--API_token', default=None, help="API OAuth Token for API calls")
+    sb_daily.add_argument('--formats_cats', default=False, help="Whether to update formats and categories or not")
+    sb_daily.add_argument('--model_type', default=None,
+                          help='type of models to train, should be "linear", "tree", "forest", "boosted", or "sgd" '
+                               '(the only type --incremental can update)')
+    sb_daily.add_argument('--force', action='store_true', help='run every stage even if its inputs are unchanged')
+    sb_daily.add_argument('--full_rebuild', action='store_true', help='rebuild the features of every event')
+    sb_daily.add_argument('--refresh_vocabulary', action='store_true',
+                          help='add the venues and presenters that now have enough events to the vocabulary')
+    sb_daily.add_argument('--incremental', action='store_true',
+                          help='update the saved models with only the events labeled since they were trained')
+    sb_daily.set_defaults(func=run_daily)
+
     flask_run = subparsers.add_parser("app", description="Run Flask app")
     flask_run.set_defaults(func=run_app)
 
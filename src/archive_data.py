@@ -0,0 +1,176 @@
+import os
+import sys  # import sys for getting arguments from the command line call
+sys.path.append(os.environ.get('PYTHONPATH'))
+import argparse  # import argparse for getting arguments from the command line
+import yaml  # import yaml for pulling config file
+from datetime import datetime, timedelta  # import datetime for the archive cutoff
+import logging.config  # import logging config
+
+from sqlalchemy import MetaData, Table, Column, text, bindparam  # import for copying the hot tables and moving rows
+
+configPath = os.path.join("config", "logging", "local.conf")
+logging.config.fileConfig(configPath)
+logger = logging.getLogger("archive_data_log")
+
+from src.helpers.helpers import get_engine_from_config  # import helper for creating an engine
+
+# the hot tables that are archived, with the column linking each row to its event and the key of their rows
+ARCHIVE_TABLES = [('features', 'id', 'id'), ('scores', 'event_id', 'pred_id'), ('model_scores', 'event_id', 'score_id'),
+                  ('events', 'id', 'id')]
+
+
+def create_archive_tables(engine):
+    """function for creating the archive tables and the views over the hot and archived rows
+
+    For each of the events, features, scores and model_scores tables that exist, an <table>_archive table with the
+    same columns is created, along with an all_<table> view that unions the hot table with the archived rows not also
+    in it, for the queries that need the full history (training and evaluation).
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        None
+
+    """
+    metadata = MetaData()
+    tables = engine.table_names()
+
+    for table, event_column, key in ARCHIVE_TABLES:
+        # a hot table that hasn't been created yet (e.g. scores before the first scoring) has nothing to archive
+        if table not in tables:
+            logger.debug('No %s table to archive yet', table)
+            continue
+
+        # check if the archive table already exists, skip it if it does
+        if (table + '_archive') in tables:
+            logger.debug('%s_archive table already exists', table)
+            continue
+
+        # copy the columns of the hot table, so the two can be unioned column for column
+        hot = Table(table, metadata, autoload=True, autoload_with=engine)
+        Table(table + '_archive', metadata,
+              *[Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+                for column in hot.columns])
+
+        try:
+            # create the table
+            metadata.create_all(engine, tables=[metadata.tables[table + '_archive']])
+            logger.info("Created table %s_archive", table)
+        except Exception as e:
+            logger.error("Could not create the %s_archive table: %s", table, e)
+
+    # (re)create the views over both tiers, where a row that reappeared in the hot table (an archived event that was
+    # updated again) hides its archived copy until the event is archived again
+    tables = engine.table_names()
+    with engine.begin() as connection:
+        for table, event_column, key in ARCHIVE_TABLES:
+            if (table + '_archive') in tables:
+                connection.execute('DROP VIEW IF EXISTS all_{}'.format(table))
+                connection.execute('CREATE VIEW all_{0} AS SELECT * FROM {0} UNION ALL SELECT * FROM {0}_archive '
+                                   'WHERE {1} NOT IN (SELECT {1} FROM {0})'.format(table, key))
+                logger.debug("Created view all_%s", table)
+
+
+def archive_events(engine, archive_days, batch_size=500):
+    """function for moving past events, along with their features and scores, into the archive tables
+
+    Events that started more than archive_days ago are moved in a single transaction. Only the events that already
+    have features are archived (the features are only generated from the hot events table), so an event that landed
+    long after it started keeps its place in the hot tables until its features are generated. An event that
+    reappears in the hot tables after being archived replaces its archived rows the next time it is archived.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        archive_days (int): the number of days after an event's start before it is archived
+        batch_size (int): the number of events to move the rows of at a time
+
+    Returns:
+        num_archived (int): the number of events archived
+
+    """
+    logger.info('Archiving events that started more than %s days ago', archive_days)
+
+    create_archive_tables(engine)
+
+    # events without features yet have nothing to archive, and must stay hot to get their features
+    if 'features' not in engine.table_names():
+        logger.info('No features generated yet, no events to archive')
+        return 0
+
+    cutoff = datetime(*datetime.today().timetuple()[:3]) - timedelta(days=archive_days)
+
+    with engine.begin() as connection:
+        # the ids of the past events with features are read first, as the features are moved before the events
+        past_events = [row[0] for row in connection.execute(
+            text('SELECT id FROM events WHERE startDate < :cutoff AND id IN (SELECT id FROM features)'), cutoff=cutoff)]
+        num_archived = len(past_events)
+
+        if num_archived == 0:
+            logger.info('No events started before %s with features to archive', cutoff)
+            return 0
+
+        # the rows are moved a batch of events at a time, with the events moved last
+        tables = engine.table_names(connection=connection)
+        for table, event_column, key in ARCHIVE_TABLES:
+            if (table + '_archive') not in tables:
+                continue
+
+            def execute(statement, ids):
+                return connection.execute(text(statement.format(table) + ' WHERE {} IN :ids'.format(event_column))
+                                          .bindparams(bindparam('ids', expanding=True)), ids=ids)
+
+            moved = 0
+            for i in range(0, num_archived, batch_size):
+                ids = past_events[i:i + batch_size]
+                execute('DELETE FROM {}_archive', ids)
+                moved += execute('INSERT INTO {0}_archive SELECT * FROM {0}', ids).rowcount
+                execute('DELETE FROM {}', ids)
+            logger.debug('%s rows of %s archived', moved, table)
+
+    logger.info('%s events started before %s archived', num_archived, cutoff)
+
+    return num_archived
+
+
+def run_archive(args):
+    """runs the archiving script"""
+    try:  # opens the specified config file
+        with open(args.config, "r") as f:
+            config = yaml.load(f, Loader=yaml.Loader)
+    except Exception as e:
+        logger.error('Error loading the config file: %s, be sure you specified a config.yml file', e)
+        sys.exit()
+
+    # if an archive_days argument was passed, then use it
+    if args.archive_days is not None:
+        archive_days = int(args.archive_days)
+
+    # if no archive_days argument was passed, then look for it in the config file
+    elif "archive_data" in config and "archive_days" in config["archive_data"]:
+        archive_days = config["archive_data"]["archive_days"]
+
+    else:  # if no additional arguments were passed and the config file didn't have it, then log the error and exit
+        logger.error('Archive days must be passed in arguments or in the config file')
+        sys.exit()
+
+    # create the engine for the database and type
+    engine = get_engine_from_config(config, args.type, args.database_name)
+
+    archive_events(engine, archive_days)
+
+
+if __name__ == '__main__':
+    logger.debug('Start of archive_data script')
+
+    # if this code is run as a script, then parse arguments for the location of the config and, optionally, the type and location of the db
+    parser = argparse.ArgumentParser(description="archive past events")
+    parser.add_argument('--config', help='path to yaml file with configurations')
+    parser.add_argument('--type', default=None, help="type of database, 'sqlite' or 'mysql+pymysql'")
+    parser.add_argument('--database_name', default=None, help="location of database (including name.db)")
+    parser.add_argument('--archive_days', default=None, help="days after an event's start before it is archived")
+
+    args = parser.parse_args()
+
+    # run the archiving based on the parsed arguments
+    run_archive(args)
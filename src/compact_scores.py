@@ -0,0 +1,255 @@
+import os
+import sys  # import sys for getting arguments from the command line call
+sys.path.append(os.environ.get('PYTHONPATH'))
+import argparse  # import argparse for getting arguments from the command line
+import yaml  # import yaml for pulling config file
+from datetime import datetime, timedelta  # import datetime for the retention cutoff
+import logging.config  # import logging config
+
+import pandas as pd
+import numpy as np
+from sqlalchemy import Column, String, SmallInteger, Boolean, DATETIME  # import needed sqlalchemy libraries for db
+from sqlalchemy.ext.declarative import declarative_base  # import for declaring classes
+from sqlalchemy import MetaData, Table, bindparam, text  # import for working with the reflected scores tables
+
+configPath = os.path.join("config", "logging", "local.conf")
+logging.config.fileConfig(configPath)
+logger = logging.getLogger("compact_scores_log")
+
+from src.helpers.helpers import get_engine_from_config  # import helper for creating an engine
+
+
+def create_score_rollups_table(engine):
+    """function for creating a score_rollups table in a database
+
+    Given a database connection engine, access the database and create a score_rollups table, which holds the
+    predictions kept for each event once its daily scores are older than the retention period.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        None
+
+    """
+    # check if the score_rollups table already exists, stop execution if it does
+    if 'score_rollups' in engine.table_names():
+        logger.debug('score_rollups table already exists')
+
+    else:
+        logger.debug("Creating a score_rollups table at %s", engine.url)
+
+        Base = declarative_base()
+
+        # create a score rollup class, one row per kept prediction of an event
+        class ScoreRollup(Base):
+            """Create a data model for the score_rollups table """
+            __tablename__ = 'score_rollups'
+            event_id = Column(String(12), primary_key=True)
+            predictionDate = Column(DATETIME(), primary_key=True)
+            startDate = Column(DATETIME(), unique=False, nullable=False)
+            willSellOut = Column(Boolean(), unique=False, nullable=False)
+            confidence = Column(SmallInteger(), unique=False, nullable=False)
+            howFarOut = Column(SmallInteger(), unique=False, nullable=False)
+            reason = Column(String(40), unique=False, nullable=False)
+
+            def __repr__(self):
+                return '<ScoreRollup %r %r>' % (self.event_id, self.predictionDate)
+
+        try:
+            # create the table
+            Base.metadata.create_all(engine)
+            logger.info("Created table score_rollups")
+        except Exception as e:
+            logger.error("Could not create the score_rollups table: %s", e)
+
+
+def rollup_scores(scores, lead_times):
+    """function for reducing the predictions of each event to the ones worth keeping long term
+
+    The first and last prediction of each event are kept, along with every prediction where willSellOut changed
+    from the prediction before it, and the latest prediction made at least each of the lead times (in days) before
+    the start of the event. Rolling up a mix of daily scores and earlier rollups gives the same result as rolling up
+    the original daily scores, as the earlier rollups contain every point that could be kept.
+
+    Args:
+        scores (pandas DataFrame): a dataframe with event_id, startDate, predictionDate, willSellOut, confidence, and
+            howFarOut columns
+        lead_times (list): the number of days before the start of the event at which to keep the prediction
+
+    Returns:
+        rollups (pandas DataFrame): a dataframe of the kept predictions, one row per event and prediction date, with
+            the reasons each was kept
+
+    """
+    logger.debug('Start of rollup scores function')
+
+    scores = scores.sort_values(['event_id', 'predictionDate']).reset_index(drop=True)
+    by_event = scores.groupby('event_id', sort=False)
+
+    reasons = pd.DataFrame(index=scores.index)
+    reasons['first'] = by_event.cumcount() == 0
+    reasons['last'] = by_event.cumcount(ascending=False) == 0
+
+    # a change is a prediction that differs from the event's previous prediction
+    previous = by_event['willSellOut'].shift()
+    reasons['change'] = previous.notna() & (scores['willSellOut'].astype(int) != previous.fillna(-1).astype(int))
+
+    # for each lead time, keep the latest prediction made at or before that many days ahead of the start
+    for lead_time in lead_times:
+        in_window = scores['predictionDate'] <= scores['startDate'] - timedelta(days=lead_time)
+        latest = scores.index.to_series()[in_window].groupby(scores.loc[in_window, 'event_id']).max()
+        reasons['lead_{}'.format(lead_time)] = scores.index.isin(latest.values)
+
+    # keep the rows with at least one reason, recording the reasons as a comma separated list
+    kept = reasons.any(axis=1)
+    reason_names = np.array(reasons.columns)
+    rollups = scores.loc[kept, ['event_id', 'predictionDate', 'startDate', 'willSellOut', 'confidence',
+                                'howFarOut']].copy()
+    rollups['reason'] = [','.join(reason_names[row]) for row in reasons[kept].values]
+
+    # store the rollups in compact types
+    rollups['willSellOut'] = rollups['willSellOut'].astype(bool)
+    rollups['confidence'] = rollups['confidence'].astype(float).round().astype('int16')
+    rollups['howFarOut'] = rollups['howFarOut'].astype(float).round().astype('int16')
+
+    logger.debug('%s scores rolled up to %s rows', scores.shape[0], rollups.shape[0])
+
+    return rollups
+
+
+def compact_scores(engine, retention_days, lead_times):
+    """function for compacting the daily scores older than the retention period into the score_rollups table
+
+    The daily scores with a prediction date more than retention_days ago are rolled up (merged with any rollups the
+    events already have) and then deleted from the scores table, all in a single transaction. The scores of the
+    versions compared head to head (the model_scores table) are kept for the same period, and are deleted without
+    being rolled up.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        retention_days (int): the number of days of full daily scores to keep, must be at least 1 so that the
+            latest predictions (read by the app) always stay in the scores table
+        lead_times (list): the number of days before the start of the event at which to keep the prediction
+
+    Returns:
+        num_compacted (int): the number of daily scores compacted
+
+    """
+    logger.info('Compacting scores older than %s days', retention_days)
+
+    if retention_days < 1:
+        logger.error('retention_days must be at least 1, the latest scores are read from the scores table')
+        raise ValueError('retention_days must be at least 1')
+
+    create_score_rollups_table(engine)
+
+    cutoff = datetime(*datetime.today().timetuple()[:3]) - timedelta(days=retention_days)
+
+    # remove the expired scores of the versions compared head to head, which grow with every challenger scored
+    if 'model_scores' in engine.table_names():
+        with engine.begin() as connection:
+            num_model_scores = connection.execute(text("DELETE FROM model_scores WHERE predictionDate < :cutoff"),
+                                                  cutoff=cutoff).rowcount
+        logger.info('%s model scores older than %s removed', num_model_scores, cutoff)
+
+    columns = 'event_id, startDate, predictionDate, willSellOut, confidence, howFarOut'
+
+    # pull the expired daily scores, along with the existing rollups of the same events
+    expired = pd.read_sql(text("SELECT pred_id, {} FROM scores WHERE predictionDate < :cutoff".format(columns)),
+                          engine, params={'cutoff': cutoff})
+
+    if expired.shape[0] == 0:
+        logger.info('No scores older than %s to compact', cutoff)
+        return 0
+
+    event_ids = list(expired['event_id'].unique())
+    existing_query = text("SELECT {} FROM score_rollups WHERE event_id IN :event_ids".format(columns)).bindparams(
+        bindparam('event_ids', expanding=True))
+    existing = pd.concat([pd.read_sql(existing_query, engine, params={'event_ids': event_ids[i:i + 500]})
+                          for i in range(0, len(event_ids), 500)], ignore_index=True)
+
+    combined = pd.concat([expired.drop(columns=['pred_id']), existing], ignore_index=True)
+    combined['startDate'] = pd.to_datetime(combined['startDate'])
+    combined['predictionDate'] = pd.to_datetime(combined['predictionDate'])
+
+    rollups = rollup_scores(combined, lead_times)
+
+    # reflect the two tables for the bulk statements
+    metadata = MetaData()
+    scores_table = Table('scores', metadata, autoload=True, autoload_with=engine)
+    rollups_table = Table('score_rollups', metadata, autoload=True, autoload_with=engine)
+
+    rollup_rows = rollups.to_dict('records')
+    for row in rollup_rows:
+        row['startDate'] = row['startDate'].to_pydatetime()
+        row['predictionDate'] = row['predictionDate'].to_pydatetime()
+        row['willSellOut'] = bool(row['willSellOut'])
+        row['confidence'] = int(row['confidence'])
+        row['howFarOut'] = int(row['howFarOut'])
+
+    # replace the events' rollups and remove the compacted daily scores together
+    with engine.begin() as connection:
+        connection.execute(rollups_table.delete().where(rollups_table.c.event_id == bindparam('b_event_id')),
+                           [{'b_event_id': event_id} for event_id in event_ids])
+        connection.execute(rollups_table.insert(), rollup_rows)
+        connection.execute(scores_table.delete().where(scores_table.c.pred_id == bindparam('b_pred_id')),
+                           [{'b_pred_id': pred_id} for pred_id in expired['pred_id']])
+
+    logger.info('%s daily scores of %s events compacted into %s rollup rows', expired.shape[0], len(event_ids),
+                len(rollup_rows))
+
+    return expired.shape[0]
+
+
+def run_compact(args):
+    """runs the scores compaction script"""
+    try:  # opens the specified config file
+        with open(args.config, "r") as f:
+            config = yaml.load(f, Loader=yaml.Loader)
+    except Exception as e:
+        logger.error('Error loading the config file: %s, be sure you specified a config.yml file', e)
+        sys.exit()
+
+    # if a retention_days argument was passed, then use it
+    if args.retention_days is not None:
+        retention_days = int(args.retention_days)
+
+    # if no retention_days argument was passed, then look for it in the config file
+    elif "compact_scores" in config and "retention_days" in config["compact_scores"]:
+        retention_days = config["compact_scores"]["retention_days"]
+
+    else:  # if no additional arguments were passed and the config file didn't have it, then log the error and exit
+        logger.error('Retention days must be passed in arguments or in the config file')
+        sys.exit()
+
+    if "compact_scores" in config and "lead_times" in config["compact_scores"]:
+        lead_times = config["compact_scores"]["lead_times"]
+    else:
+        logger.error('lead_times must be set under compact_scores in the config file')
+        sys.exit()
+
+    # create the engine for the database and type
+    engine = get_engine_from_config(config, args.type, args.database_name)
+
+    if 'scores' not in engine.table_names():
+        logger.error('No scores table to compact')
+        sys.exit()
+
+    compact_scores(engine, retention_days, lead_times)
+
+
+if __name__ == '__main__':
+    logger.debug('Start of compact_scores script')
+
+    # if this code is run as a script, then parse arguments for the location of the config and, optionally, the type and location of the db
+    parser = argparse.ArgumentParser(description="compact old scores")
+    parser.add_argument('--config', help='path to yaml file with configurations')
+    parser.add_argument('--type', default=None, help="type of database, 'sqlite' or 'mysql+pymysql'")
+    parser.add_argument('--database_name', default=None, help="location of database (including name.db)")
+    parser.add_argument('--retention_days', default=None, help="days of full daily scores to keep")
+
+    args = parser.parse_args()
+
+    # run the compaction based on the parsed arguments
+    run_compact(args)
@@ -13,7 +13,7 @@ configPath = os.path.join("config","logging","local.conf")
 logging.config.fileConfig(configPath)
 logger = logging.getLogger("create_database_log")
 
-from src.helpers.helpers import create_db_engine  # helper function for creating a db engine
+from src.helpers.helpers import create_db_engine, get_engine_options  # helper functions for creating a db engine and its pool options
 
 def create_db(engine):
     """create a database at a specified location
@@ -145,7 +145,7 @@ def run_create(args):
             sys.exit()
 
         # create the engine for the database and type
-        engine = create_db_engine(db_name, type)
+        engine = create_db_engine(db_name, type, **get_engine_options(config))
 
         # create the database schema in the engine
         create_db(engine)
@@ -176,7 +176,7 @@ def run_create(args):
             sys.exit()
 
         # create the engine for the database and type
-        engine = create_db_engine(db_name, type)
+        engine = create_db_engine(db_name, type, **get_engine_options(config))
 
         # create the database schema in the engine
         create_db(engine)
@@ -0,0 +1,182 @@
+import os
+import json  # import json for the counts of the cached rows
+import shutil  # import shutil for removing the caches of old encoders
+import logging.config  # import logging config
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from joblib import hash as joblib_hash  # import joblib for the version of a fitted transformer
+
+configPath = os.path.join("config", "logging", "local.conf")
+logging.config.fileConfig(configPath)
+logger = logging.getLogger("design_cache_log")
+
+# the arrays of a cached design matrix, as the files they are appended to and their types (int32 indices, so scipy
+# uses the memory-mapped arrays as they are rather than copying them to a common index type)
+CACHE_ARRAYS = {'keys': np.uint64, 'data': np.float64, 'indices': np.int32, 'indptr': np.int32}
+
+
+def encoder_version(ct):
+    """helper function for the version of a fitted transformer, the hash of its parameters and fitted state"""
+    return joblib_hash(ct)
+
+
+def input_columns(ct):
+    """helper function for the columns of the inputs a fitted transformer reads"""
+    columns = []
+    for name, transformer, selected in ct.transformers_:
+        if name == 'remainder' and transformer == 'drop':
+            continue
+        columns.extend([selected] if isinstance(selected, str) else list(selected))
+    return columns
+
+
+def read_cache(folder):
+    """function for opening the cached design matrix of an encoder, memory-mapped
+
+    Only the rows recorded in the counts of the cache are read, so a partially appended row (from an append that
+    didn't finish) is never seen.
+
+    Args:
+        folder (str): the folder of the cache of the encoder
+
+    Returns:
+        counts (dict): the number of rows, non-zeros, and columns of the cache
+        arrays (dict): the memory-mapped arrays of CACHE_ARRAYS
+
+    """
+    meta_file = os.path.join(folder, 'meta.json')
+    if not os.path.exists(meta_file):
+        return None, None
+
+    with open(meta_file, 'r') as f:
+        counts = json.load(f)
+
+    lengths = {'keys': counts['numRows'], 'data': counts['nnz'], 'indices': counts['nnz'],
+               'indptr': counts['numRows'] + 1}
+    arrays = {}
+    for name, dtype in CACHE_ARRAYS.items():
+        if lengths[name] == 0:
+            arrays[name] = np.zeros(0, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(os.path.join(folder, name + '.bin'), dtype=dtype, mode='r',
+                                     shape=(lengths[name],))
+
+    return counts, arrays
+
+
+def append_cache(folder, counts, keys, X):
+    """function for appending the encoded rows of new inputs to the cached design matrix of an encoder
+
+    The arrays are appended to their files, after cutting off anything beyond the recorded counts, and the counts are
+    replaced last, so the new rows only become part of the cache once they are fully written.
+
+    Args:
+        folder (str): the folder of the cache of the encoder
+        counts (dict): the current counts of the cache, or None for a new cache
+        keys (numpy array): the hash of the inputs of each new row
+        X (scipy sparse matrix): the encoded new rows
+
+    Returns:
+        counts (dict): the new counts of the cache
+
+    """
+    if counts is None:
+        os.makedirs(folder, exist_ok=True)
+        counts = {'numRows': 0, 'nnz': 0, 'numColumns': int(X.shape[1])}
+        with open(os.path.join(folder, 'indptr.bin'), 'wb') as f:
+            f.write(np.zeros(1, dtype=np.int32).tobytes())
+
+    X = X.tocsr()
+    appended = {'keys': keys.astype(np.uint64), 'data': X.data.astype(np.float64),
+                'indices': X.indices.astype(np.int32), 'indptr': (X.indptr[1:] + counts['nnz']).astype(np.int32)}
+    lengths = {'keys': counts['numRows'], 'data': counts['nnz'], 'indices': counts['nnz'],
+               'indptr': counts['numRows'] + 1}
+
+    for name, dtype in CACHE_ARRAYS.items():
+        with open(os.path.join(folder, name + '.bin'), 'ab') as f:
+            f.truncate(lengths[name] * np.dtype(dtype).itemsize)
+            f.write(appended[name].tobytes())
+
+    counts = {'numRows': counts['numRows'] + X.shape[0], 'nnz': counts['nnz'] + int(X.nnz),
+              'numColumns': counts['numColumns']}
+    with open(os.path.join(folder, 'meta.json.partial'), 'w') as f:
+        json.dump(counts, f)
+    os.replace(os.path.join(folder, 'meta.json.partial'), os.path.join(folder, 'meta.json'))
+
+    return counts
+
+
+def prune_caches(cache_location, keep_version, keep_versions):
+    """helper function for removing all but the most recently used caches of encoders"""
+    folders = sorted([os.path.join(cache_location, name) for name in os.listdir(cache_location)
+                      if os.path.isdir(os.path.join(cache_location, name)) and name != keep_version],
+                     key=os.path.getmtime, reverse=True)
+    for folder in folders[max(keep_versions - 1, 0):]:
+        shutil.rmtree(folder, ignore_errors=True)
+        logger.debug('Removed the design matrix cache %s', folder)
+
+
+def design_matrix(ct, inputs, cache_location=None, keep_versions=2):
+    """function for the design matrix of a set of inputs, read from an on-disk cache of the rows already encoded
+
+    The cache of each version of the fitted transformer holds the encoded rows as memory-mapped CSR arrays, each row
+    keyed by the hash of the inputs it was encoded from (rather than by event, as the encoding only depends on the
+    inputs), so an event whose features change gets a new row. Inputs without a cached row are encoded and appended,
+    and the matrix of the inputs is then read from the cache: when their rows are contiguous in the cache (as when
+    the same inputs are read again) the matrix uses the memory-mapped arrays without copying them, and otherwise only
+    their rows are copied out. Only the caches of the keep_versions most recently used transformers are kept.
+
+    Args:
+        ct (ColumnTransformer): the fitted transformer of the inputs
+        inputs (pandas DataFrame): the inputs to encode
+        cache_location (str): the local folder of the caches, or None to encode the inputs without caching
+        keep_versions (int): the number of caches of transformers to keep
+
+    Returns:
+        X (scipy sparse matrix): the CSR design matrix of the inputs, in their order
+
+    """
+    if cache_location is None:
+        return ct.transform(inputs)
+
+    version = encoder_version(ct)
+    folder = os.path.join(cache_location, version)
+    keys = pd.util.hash_pandas_object(inputs[input_columns(ct)], index=False).values
+    counts, arrays = read_cache(folder)
+
+    # encode and append the inputs that aren't cached yet, each distinct input once
+    positions = pd.Index(arrays['keys'] if arrays is not None else np.zeros(0, dtype=np.uint64)).get_indexer(keys)
+    missing = positions == -1
+    if missing.any():
+        new_keys, first = np.unique(keys[missing], return_index=True)
+        new_rows = np.flatnonzero(missing)[first]
+        X_new = sparse.csr_matrix(ct.transform(inputs.iloc[new_rows]))
+        if (counts['nnz'] if counts is not None else 0) + X_new.nnz >= np.iinfo(np.int32).max:
+            logger.warning('The design matrix cache %s is full, encoding the inputs without it', folder)
+            return ct.transform(inputs)
+
+        # keep the new rows in the order of the inputs, so inputs read again are contiguous in the cache
+        order = np.argsort(new_rows, kind='mergesort')
+        counts = append_cache(folder, counts, new_keys[order], X_new[order])
+        counts, arrays = read_cache(folder)
+        positions = pd.Index(arrays['keys']).get_indexer(keys)
+        logger.info('Encoded %s new rows into the design matrix cache, reused %s', len(new_rows),
+                    len(keys) - missing.sum())
+    else:
+        logger.info('Read all %s rows from the design matrix cache', len(keys))
+
+    os.utime(folder)
+    prune_caches(cache_location, version, keep_versions)
+
+    shape = (len(positions), counts['numColumns'])
+    if len(positions) > 0 and (positions == np.arange(positions[0], positions[0] + len(positions))).all():
+        start, end = arrays['indptr'][positions[0]], arrays['indptr'][positions[-1] + 1]
+        indptr = arrays['indptr'][positions[0]:positions[-1] + 2]
+        return sparse.csr_matrix((arrays['data'][start:end], arrays['indices'][start:end],
+                                  indptr if start == 0 else indptr - start), shape=shape)
+
+    X = sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                          shape=(counts['numRows'], counts['numColumns']))
+    return X[positions]
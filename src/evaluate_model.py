@@ -14,8 +14,8 @@ configPath = os.path.join("config", "logging", "local.conf")
 logging.config.fileConfig(configPath)
 logger = logging.getLogger("evaluate_model_log")
 
-from src.helpers.helpers import create_db_engine, \
-    pull_features, pull_scores  # import helpers for creating an engine and pulling the features and scores tables
+from src.helpers.helpers import create_db_engine, get_engine_options, pull_features, pull_scores, \
+    pull_model_scores  # import helpers for creating an engine and pulling the features and scores tables
 
 
 def evaluate_models(features, scores):
@@ -94,12 +94,56 @@ def evaluate_models(features, scores):
     return results
 
 
-def save_results_local(results, location):
+def compare_models(features, model_scores):
+    """function for comparing the scored model versions head to head by prediction date
+
+    On each prediction date, only the events that every version scored that day are compared, so a version is never
+    credited or penalized for events the others didn't see. The statistics of evaluate_models are then computed for
+    each version.
+
+    Args:
+        features (pandas DataFrame): a dataframe containing the features columns for each event
+        model_scores (pandas DataFrame): a dataframe containing the scores columns and modelVersion of each event and
+            version (see pull_model_scores)
+
+    Returns:
+        comparison (pandas DataFrame): a dataframe containing the summary statistics of each version by prediction
+            date, empty if fewer than two versions have been scored
+
+    """
+    logger.debug('Start of compare models function')
+
+    # only the events with features can be compared
+    model_scores = model_scores.loc[model_scores['event_id'].isin(features['id'])].copy()
+    if model_scores['modelVersion'].nunique() < 2:
+        logger.info('Fewer than two model versions scored, nothing to compare')
+        return pd.DataFrame()
+
+    # keep the events scored by every version scored on their prediction date
+    model_scores['predDate'] = model_scores['predictionDate'].dt.date
+    day_versions = model_scores.groupby('predDate')['modelVersion'].transform('nunique')
+    event_versions = model_scores.groupby(['predDate', 'event_id'], observed=True)['modelVersion'].transform('nunique')
+    shared = model_scores.loc[(event_versions == day_versions) & (day_versions > 1)]
+    logger.debug('%s of %s model scores are shared by every version', shared.shape[0], model_scores.shape[0])
+
+    if shared.shape[0] == 0:
+        logger.info('No events scored by every model version to compare')
+        return pd.DataFrame()
+
+    # compute the statistics of each version
+    comparison = pd.concat({version: evaluate_models(features, version_scores.drop(columns=['predDate']))
+                            for version, version_scores in shared.groupby('modelVersion')}, names=['modelVersion'])
+
+    return comparison.reset_index().set_index(['predDate', 'modelVersion']).sort_index()
+
+
+def save_results_local(results, location, name='results.csv'):
     """function for saving results to local
 
     Args:
         results(pandas DataFrame): a dataframe containing the summary statistics for evaluating a model
         location (path): the path object for where to save the results (should be a directory)
+        name (str): the name of the results file
 
     Returns:
         None
@@ -107,7 +151,7 @@ def save_results_local(results, location):
     """
     logger.debug('Start of save results function')
 
-    results_file = os.path.join(location, 'results.csv')
+    results_file = os.path.join(location, name)
 
     # save the results
     with open(results_file, "w") as f:
@@ -115,12 +159,13 @@ def save_results_local(results, location):
         logger.info("Results saved to %s", f.name)
 
 
-def save_results_s3(results, location):
+def save_results_s3(results, location, name='results.csv'):
     """function for saving results to s3
 
     Args:
         results(pandas DataFrame): a dataframe containing the summary statistics for evaluating a model
         location (path): the path object for where to save the results (should be a directory)
+        name (str): the name of the results file
 
     Returns:
         None
@@ -133,7 +178,7 @@ def save_results_s3(results, location):
 
     try:  # try creating the object
         # build the results object
-        results_name = 'results/results.csv'
+        results_name = 'results/' + name
 
         # create the s3 object
         results_file = s3.Object(location, results_name)
@@ -181,7 +226,7 @@ def run_evaluate(args):
             sys.exit()
 
         # create the engine for the database and type
-        engine = create_db_engine(db_name, type)
+        engine = create_db_engine(db_name, type, **get_engine_options(config))
 
     elif config["database_info"]["how"] == "local":
         # if a type argument was passed, then use it for calling the appropriate database type
@@ -210,7 +255,7 @@ def run_evaluate(args):
             sys.exit()
 
         # create the engine for the database and type
-        engine = create_db_engine(db_name, type)
+        engine = create_db_engine(db_name, type, **get_engine_options(config))
 
     else:
         logger.error('Method of database storage (should be "rds" or "local") in config file not supported')
@@ -223,6 +268,9 @@ def run_evaluate(args):
     # create the results table
     results = evaluate_models(features, scores)
 
+    # compare the model versions scored side by side, if there are any
+    comparison = compare_models(features, pull_model_scores(engine))
+
     # check for the specified save location type as an argument or in the config file
     if args.location_type is not None:
         save_type = args.location_type
@@ -253,6 +301,8 @@ def run_evaluate(args):
         save_path = os.path.join(save_location)
 
         save_results_local(results, save_path)
+        if comparison.shape[0] > 0:
+            save_results_local(comparison, save_path, 'comparison.csv')
 
     # if the location type is 's3', then save the models in s3
     elif save_type == 's3':
@@ -273,6 +323,8 @@ def run_evaluate(args):
         save_path = os.path.join(save_location)
 
         save_results_s3(results, save_path)
+        if comparison.shape[0] > 0:
+            save_results_s3(comparison, save_path, 'comparison.csv')
 
     # otherwise, log the error and exit
     else:
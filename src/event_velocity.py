@@ -0,0 +1,247 @@
+import os
+import logging.config  # import logging config
+from datetime import datetime  # import datetime for parsing the pull times
+
+import pandas as pd
+import numpy as np
+from sqlalchemy import Column, String, Integer, Boolean, DATETIME, DECIMAL  # import needed sqlalchemy libraries for db
+from sqlalchemy.ext.declarative import declarative_base  # import for declaring classes
+from sqlalchemy import bindparam, text  # import for reading the counters of the pulled events
+
+configPath = os.path.join("config", "logging", "local.conf")
+logging.config.fileConfig(configPath)
+logger = logging.getLogger("event_velocity_log")
+
+from src.helpers.helpers import upsert_frame  # import helper for writing the counters
+
+# the columns of the event_velocity table
+VELOCITY_TABLE_COLUMNS = ['id', 'numPulls', 'numPriceChanges', 'numAvailabilityFlips', 'firstPullDate', 'lastPullDate',
+                          'firstWaitListDate', 'lastMinPrice', 'lastMaxPrice', 'lastIsAvailable']
+
+
+def create_event_velocity_table(engine):
+    """function for creating an event_velocity table in a database
+
+    Given a database connection engine, access the database and create an event_velocity table, which holds running
+    counters over the successive pulls of each event, along with the state of its last pull to compare the next one to.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        None
+
+    """
+    # check if the event_velocity table already exists, stop execution if it does
+    if 'event_velocity' in engine.table_names():
+        logger.debug('event_velocity table already exists')
+
+    else:
+        logger.debug("Creating an event_velocity table at %s", engine.url)
+
+        Base = declarative_base()
+
+        # create an event velocity class, one row per event
+        class EventVelocity(Base):
+            """Create a data model for the event_velocity table """
+            __tablename__ = 'event_velocity'
+            id = Column(String(12), primary_key=True)
+            numPulls = Column(Integer(), unique=False, nullable=False)
+            numPriceChanges = Column(Integer(), unique=False, nullable=False)
+            numAvailabilityFlips = Column(Integer(), unique=False, nullable=False)
+            firstPullDate = Column(DATETIME(), unique=False, nullable=False)
+            lastPullDate = Column(DATETIME(), unique=False, nullable=False)
+            firstWaitListDate = Column(DATETIME(), unique=False, nullable=True)
+            lastMinPrice = Column(DECIMAL(), unique=False, nullable=True)
+            lastMaxPrice = Column(DECIMAL(), unique=False, nullable=True)
+            lastIsAvailable = Column(Boolean(), unique=False, nullable=False)
+
+            def __repr__(self):
+                return '<EventVelocity %r>' % self.id
+
+        try:
+            # create the table
+            Base.metadata.create_all(engine)
+            logger.info("Created table event_velocity")
+        except Exception as e:
+            logger.error("Could not create the event_velocity table: %s", e)
+
+
+def create_event_velocity_snapshots_table(engine):
+    """function for creating an event_velocity_snapshots table in a database
+
+    Given a database connection engine, access the database and create an event_velocity_snapshots table, which holds
+    the counters of each event after every pull counted for it, keyed by the event and the time of the pull
+    (validFrom), so the counters can be read as they were at a point in time. When the table is created for counters
+    that already exist, it is started with their current values, valid from their last pull.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        None
+
+    """
+    # check if the event_velocity_snapshots table already exists, stop execution if it does
+    if 'event_velocity_snapshots' in engine.table_names():
+        logger.debug('event_velocity_snapshots table already exists')
+        return
+
+    logger.debug("Creating an event_velocity_snapshots table at %s", engine.url)
+
+    Base = declarative_base()
+
+    # create an event velocity snapshot class, one row per counted pull of an event
+    class EventVelocitySnapshot(Base):
+        """Create a data model for the event_velocity_snapshots table """
+        __tablename__ = 'event_velocity_snapshots'
+        id = Column(String(12), primary_key=True)
+        validFrom = Column(DATETIME(), primary_key=True)
+        numPulls = Column(Integer(), unique=False, nullable=False)
+        numPriceChanges = Column(Integer(), unique=False, nullable=False)
+        numAvailabilityFlips = Column(Integer(), unique=False, nullable=False)
+        firstPullDate = Column(DATETIME(), unique=False, nullable=False)
+        lastPullDate = Column(DATETIME(), unique=False, nullable=False)
+        firstWaitListDate = Column(DATETIME(), unique=False, nullable=True)
+        lastMinPrice = Column(DECIMAL(), unique=False, nullable=True)
+        lastMaxPrice = Column(DECIMAL(), unique=False, nullable=True)
+        lastIsAvailable = Column(Boolean(), unique=False, nullable=False)
+
+        def __repr__(self):
+            return '<EventVelocitySnapshot %r %r>' % (self.id, self.validFrom)
+
+    try:
+        # create the table
+        Base.metadata.create_all(engine)
+        logger.info("Created table event_velocity_snapshots")
+    except Exception as e:
+        logger.error("Could not create the event_velocity_snapshots table: %s", e)
+        return
+
+    # start the snapshots with the counters counted before they existed
+    if 'event_velocity' in engine.table_names():
+        columns = ', '.join(VELOCITY_TABLE_COLUMNS)
+        with engine.begin() as connection:
+            result = connection.execute('INSERT INTO event_velocity_snapshots ({0}, validFrom) SELECT {0}, lastPullDate '
+                                        'FROM event_velocity'.format(columns))
+        logger.info('Started the event velocity snapshots with the counters of %s events', result.rowcount)
+
+
+def pull_state(events):
+    """function for extracting the part of each pulled event that the counters follow
+
+    Args:
+        events (list): the event dictionaries of a pull, as in the landed JSONs
+
+    Returns:
+        state (pandas DataFrame): the id, minPrice, maxPrice, isAvailable, hasWaitList, and isSoldOut of each event,
+            keeping the last of any repeated event
+
+    """
+    def price(event, key):
+        value = event['ticket_availability'][key]
+        return float(value['major_value']) if value is not None else None
+
+    state = pd.DataFrame({'id': [event['id'] for event in events],
+                          'minPrice': [price(event, 'minimum_ticket_price') for event in events],
+                          'maxPrice': [price(event, 'maximum_ticket_price') for event in events],
+                          'isAvailable': [bool(event['ticket_availability']['has_available_tickets']) for event in events],
+                          'hasWaitList': [bool(event['ticket_availability']['waitlist_available']) for event in events],
+                          'isSoldOut': [bool(event['ticket_availability']['is_sold_out']) for event in events]},
+                         columns=['id', 'minPrice', 'maxPrice', 'isAvailable', 'hasWaitList', 'isSoldOut'])
+
+    return state.drop_duplicates('id', keep='last').reset_index(drop=True)
+
+
+def advance_counters(counters, state, pull_time):
+    """function for advancing the counters of a set of events by one pull
+
+    Each event's counters only depend on its previous counters and the new pull, so the work per pull is constant.
+    Pulls no newer than an event's last counted pull are ignored, so reprocessing a pull doesn't count it twice.
+    Pulls of an event while it is sold out are ignored too, so the counters stop at its sell out (which flips its
+    availability and often opens a wait list) rather than carrying the outcome into the features, as the events
+    being scored haven't sold out.
+
+    Args:
+        counters (pandas DataFrame): the current rows of the event_velocity table for the pulled events (events
+            pulled for the first time have no row)
+        state (pandas DataFrame): the state of each event in the pull, from pull_state
+        pull_time (datetime): the time of the pull
+
+    Returns:
+        counters (pandas DataFrame): the new rows of the event_velocity table for the events the pull was counted for
+
+    """
+    if 'isSoldOut' in state.columns:
+        state = state.loc[~state['isSoldOut'].astype(bool)]
+    merged = pd.merge(state, counters, how='left', on='id', indicator=True)
+    seen = (merged['_merge'] == 'both').values
+    lastPullDate = pd.to_datetime(merged['lastPullDate'])
+    merged = merged.loc[~seen | (lastPullDate < pull_time).values].reset_index(drop=True)
+    seen = (merged['_merge'] == 'both').values
+
+    def changed(new, old):
+        # a change between two pulls, with a missing price the same as another missing price
+        new = new.astype(float)
+        old = old.astype(float)
+        return ~(np.isclose(new, old, rtol=0, atol=1e-9) | (new.isna() & old.isna()))
+
+    priceChanged = seen & (changed(merged['minPrice'], merged['lastMinPrice']) |
+                           changed(merged['maxPrice'], merged['lastMaxPrice'])).values
+    availabilityFlipped = seen & (merged['isAvailable'].values != merged['lastIsAvailable'].fillna(False).astype(bool).values)
+
+    firstWaitListDate = pd.to_datetime(merged['firstWaitListDate'])
+    firstWaitListDate = firstWaitListDate.where(firstWaitListDate.notna() | ~merged['hasWaitList'], pull_time)
+
+    return pd.DataFrame({'id': merged['id'],
+                         'numPulls': merged['numPulls'].fillna(0).astype(int) + 1,
+                         'numPriceChanges': merged['numPriceChanges'].fillna(0).astype(int) + priceChanged,
+                         'numAvailabilityFlips': merged['numAvailabilityFlips'].fillna(0).astype(int) + availabilityFlipped,
+                         'firstPullDate': pd.to_datetime(merged['firstPullDate']).fillna(pull_time),
+                         'lastPullDate': pull_time,
+                         'firstWaitListDate': firstWaitListDate,
+                         'lastMinPrice': merged['minPrice'],
+                         'lastMaxPrice': merged['maxPrice'],
+                         'lastIsAvailable': merged['isAvailable']})
+
+
+def update_event_velocity(engine, events, pull_time, batch_size=500):
+    """function for counting a pull of a set of events in the event_velocity table
+
+    Only the counters of the pulled events are read and written, so the raw data never needs to be read again. The new
+    counters are also kept in the event_velocity_snapshots table, valid from the time of the pull.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        events (list): the event dictionaries of the pull, as in the landed JSONs
+        pull_time (str): the time of the pull, in the YY-MM-DD-HH-MM-SS format of the PullTime
+        batch_size (int): the number of events to read the counters of at a time
+
+    Returns:
+        None
+
+    """
+    create_event_velocity_table(engine)
+    create_event_velocity_snapshots_table(engine)
+
+    state = pull_state(events)
+    if state.shape[0] == 0:
+        return
+
+    # read the counters of the pulled events
+    query = text('SELECT * FROM event_velocity WHERE id IN :event_ids').bindparams(bindparam('event_ids', expanding=True))
+    event_ids = list(state['id'])
+    counters = pd.concat([pd.DataFrame(columns=VELOCITY_TABLE_COLUMNS)] +
+                         [pd.read_sql(query, engine, params={'event_ids': event_ids[i:i + batch_size]})
+                          for i in range(0, len(event_ids), batch_size)], ignore_index=True)
+
+    pull_time = datetime.strptime(pull_time, '%y-%m-%d-%H-%M-%S')
+    counters = advance_counters(counters, state, pull_time)
+    if counters.shape[0] == 0:
+        logger.debug('Pull of %s was already counted, or only has sold out events', pull_time)
+        return
+
+    num_added, num_updated, num_unchanged = upsert_frame(engine, counters, 'event_velocity', 'id',
+                                                         history_table='event_velocity_snapshots',
+                                                         valid_from=pull_time)
+    logger.debug('Pull of %s counted for %s new and %s seen events', pull_time, num_added, num_updated)
@@ -0,0 +1,185 @@
+import os
+import logging.config  # import logging config
+from datetime import timedelta  # import timedelta for the point in time of each event
+
+import pandas as pd
+from sqlalchemy import Column, String, Integer, Boolean, DATETIME, DECIMAL  # import needed sqlalchemy libraries for db
+from sqlalchemy.ext.declarative import declarative_base  # import for declaring classes
+from sqlalchemy import MetaData, Table, text  # import for copying and reading the snapshots
+
+configPath = os.path.join("config", "logging", "local.conf")
+logging.config.fileConfig(configPath)
+logger = logging.getLogger("feature_snapshots_log")
+
+from src.helpers.helpers import read_sql_frame, set_column_types, lookup_as_of, add_velocity_features, \
+    FEATURE_TYPES, VELOCITY_COLUMNS  # import helpers for reading and typing the snapshots, and the point in time pull counters
+
+# the columns of a snapshot that are the outcome of the event rather than an input, always taken from the latest features
+OUTCOME_COLUMNS = ['startDate', 'isSoldOut', 'soldOutLead']
+
+
+def create_feature_snapshots_table(engine):
+    """function for creating a feature_snapshots table in a database
+
+    Given a database connection engine, access the database and create a feature_snapshots table, which holds every
+    version of the features of each event, keyed by the event and the time the version was generated (validFrom).
+    The primary key indexes the versions of an event in time order, and validFrom is indexed for reading the versions
+    of every event as of a time.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        created (bool): whether the table was created, rather than already existing
+
+    """
+    # check if the feature_snapshots table already exists, stop execution if it does
+    if 'feature_snapshots' in engine.table_names():
+        logger.debug('feature_snapshots table already exists')
+        return False
+
+    logger.debug("Creating a feature_snapshots table at %s", engine.url)
+
+    Base = declarative_base()
+
+    # create a feature snapshot class, one row per version of the features of an event
+    class FeatureSnapshot(Base):
+        """Create a data model for the feature_snapshots table """
+        __tablename__ = 'feature_snapshots'
+        id = Column(String(12), primary_key=True)
+        validFrom = Column(DATETIME(), primary_key=True, index=True)
+        startDate = Column(DATETIME(), unique=False, nullable=False)
+        categoryId = Column(Integer(), unique=False, nullable=False)
+        formatId = Column(Integer(), unique=False, nullable=False)
+        inventoryType = Column(String(30), unique=False, nullable=False)
+        isFree = Column(Boolean(), unique=False, nullable=False)
+        isReservedSeating = Column(Boolean(), unique=False, nullable=False)
+        minPrice = Column(DECIMAL(), unique=False, nullable=False)
+        maxPrice = Column(DECIMAL(), unique=False, nullable=False)
+        venueName_simple = Column(String(255), unique=False, nullable=False)
+        onSaleWindow = Column(Integer(), unique=False, nullable=False)
+        eventWeekday = Column(Integer(), unique=False, nullable=False)
+        startHour = Column(Integer(), unique=False, nullable=False)
+        capacity = Column(Integer(), unique=False, nullable=False)
+        locale = Column(String(10), unique=False, nullable=False)
+        ageRestriction = Column(String(30), unique=False, nullable=False)
+        presentedBy_simple = Column(String(255), unique=False, nullable=False)
+        isSoldOut = Column(Boolean(), unique=False, nullable=False)
+        soldOutLead = Column(Integer(), unique=False, nullable=False)
+
+        def __repr__(self):
+            return '<FeatureSnapshot %r %r>' % (self.id, self.validFrom)
+
+    try:
+        # create the table
+        Base.metadata.create_all(engine)
+        logger.info("Created table feature_snapshots")
+    except Exception as e:
+        logger.error("Could not create the feature_snapshots table: %s", e)
+
+    return True
+
+
+def backfill_feature_snapshots(engine, valid_from):
+    """function for starting the snapshots with the current features of every event
+
+    The versions before the snapshots existed are unknown, so the current features are valid from the given time.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        valid_from (datetime): the validFrom of the copied features
+
+    Returns:
+        None
+
+    """
+    columns = ', '.join(column.name for column in Table('features', MetaData(), autoload=True, autoload_with=engine).c)
+
+    with engine.begin() as connection:
+        result = connection.execute(text('INSERT INTO feature_snapshots ({0}, validFrom) SELECT {0}, :validFrom '
+                                         'FROM features'.format(columns)), validFrom=valid_from)
+
+    logger.info('Started the feature snapshots with the features of %s events', result.rowcount)
+
+
+def features_as_of(engine, when):
+    """function for reading the features of every event as they were at a point in time
+
+    The latest version of each event generated at or before the time is read in a single query, which the indexes of
+    the feature_snapshots table answer without scanning the versions of every event.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        when (datetime): the point in time
+
+    Returns:
+        features (pandas DataFrame): the features of each event that had any at the time, with their validFrom, in the
+            types of FEATURE_TYPES
+
+    """
+    query = ('SELECT s.* FROM feature_snapshots s JOIN '
+             '(SELECT id, MAX(validFrom) AS validFrom FROM feature_snapshots WHERE validFrom <= :when GROUP BY id) l '
+             'ON s.id = l.id AND s.validFrom = l.validFrom')
+
+    return set_column_types(read_sql_frame(text(query), engine, params={'when': when}), FEATURE_TYPES)
+
+
+def lookup_features_as_of(engine, requests, batch_size=500):
+    """function for reading the features of a set of events, each as it was at its own point in time
+
+    The versions of the requested events are read in batches of ids and matched to the requests with a single as-of
+    merge, which takes the latest version generated at or before each request's time.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        requests (pandas DataFrame): a dataframe with the id of each event and the time to read its features as of (asOf)
+        batch_size (int): the number of ids to read the versions of at a time
+
+    Returns:
+        features (pandas DataFrame): the features of each request, in the order of the requests, with a validFrom of
+            NaT (and missing features) for events that had no features at their time, so in the types of the database
+
+    """
+    return lookup_as_of(engine, 'feature_snapshots', requests, batch_size)
+
+
+def point_in_time_features(engine, features, as_of_days):
+    """function for replacing the inputs of a set of features with their versions from before each event
+
+    The inputs of each event are taken as of as_of_days before it started, so a model isn't trained on what only became
+    known after the time it would have been scored. The counters of the pulls of each event (VELOCITY_COLUMNS) are
+    taken as of the same time. The outcome columns (and the other columns added when the features are pulled) are
+    kept, and events without a version by their time keep their latest inputs.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        features (pandas DataFrame): a dataframe containing the features columns for each event
+        as_of_days (int): the number of days before the start of each event to take its inputs as of
+
+    Returns:
+        features (pandas DataFrame): a copy of the features with the point in time inputs, in the types of FEATURE_TYPES
+
+    """
+    requests = pd.DataFrame({'id': features['id'].values,
+                             'asOf': pd.to_datetime(features['startDate']).values - pd.Timedelta(timedelta(days=as_of_days))})
+
+    # the counters of the pulls, which grow up to the start of the event, as of the same time
+    if all(column in features.columns for column in VELOCITY_COLUMNS):
+        features = add_velocity_features(engine, features, as_of=requests['asOf'])
+
+    if 'feature_snapshots' not in engine.table_names():
+        logger.warning('No feature snapshots to build point in time features from, using the latest features')
+        return features
+
+    snapshots = lookup_features_as_of(engine, requests)
+    found = snapshots['validFrom'].notna().values
+
+    features = features.copy()
+    inputs = [column for column in snapshots.columns if column not in ['id', 'validFrom'] + OUTCOME_COLUMNS]
+    for column in inputs:
+        features[column] = features[column].astype(object).where(~found, snapshots[column].astype(object).values)
+
+    logger.info('Took the inputs of %s of %s events as of %s days before they started', found.sum(), features.shape[0],
+                as_of_days)
+
+    return set_column_types(features, FEATURE_TYPES)
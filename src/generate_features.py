@@ -5,99 +5,672 @@ import yaml  # import yaml for pulling config file
 from datetime import datetime  # import datetime for formatting of timestamps
 import logging.config  # import logging config
 
+import hashlib  # import hashlib for the code version of the features
+import json  # import json for storing the venue vocabulary and hashes in the features state
 import pandas as pd
-import re
-from sqlalchemy.orm import sessionmaker  # import the sessionmaker for adding data to the database
-from sqlalchemy.ext.automap import automap_base # import for declaring classes
+import numpy as np
 from sqlalchemy.ext.declarative import declarative_base  # import for declaring classes
-from sqlalchemy import Column, String, Integer, Boolean, DATETIME, DECIMAL  # import needed sqlalchemy libraries for db
+from sqlalchemy import Column, String, Integer, Boolean, DATETIME, DECIMAL, Text  # import needed sqlalchemy libraries for db
+from sqlalchemy import bindparam, text  # import for selecting the changed events
 
 configPath = os.path.join("config", "logging", "local.conf")
 logging.config.fileConfig(configPath)
 logger = logging.getLogger("generate_features_log")
 
-from src.helpers.helpers import create_db_engine, create_feature, update_feature  # import helpers for creating an engine, creating and updating features
+from src.helpers.helpers import create_db_engine, get_engine_options, upsert_frame  # import helpers for creating an engine and writing the features
+from src.helpers.helpers import history_source, read_sql_frame  # import helpers for selecting the archived events along with the hot ones, and reading in chunks
+from src.feature_snapshots import create_feature_snapshots_table, backfill_feature_snapshots  # import for keeping every version of the features
 
-def convert_data_to_features(engine):
-    """function for pulling data from a populated and updated database for training a model
+# the columns of the features table, in order
+FEATURE_COLUMNS = ['id', 'startDate', 'categoryId', 'formatId', 'inventoryType', 'isFree', 'isReservedSeating', 'minPrice',
+                   'maxPrice', 'venueName_simple', 'onSaleWindow', 'eventWeekday', 'startHour', 'capacity', 'locale',
+                   'ageRestriction', 'presentedBy_simple', 'isSoldOut', 'soldOutLead']
 
-    Given a database connection engine, access the database and pull the requested
-    data as a Pandas dataframe.
+# the presenters the vocabulary starts with, as the lower case text matched within presentedBy and the feature value
+PRESENTER_SEEDS = [('harmonica dunn', 'Harmonica Dunn'), ('elbo room', 'Elbo Room')]
+
+
+def get_main_venues(engine, venues, min_events=10):
+    """function for finding the venues with enough events to be kept as their own value of venueName_simple
+
+    The events of each venue are counted over the full history (including archived events), so archiving doesn't
+    change which venues are kept. The counting is an aggregate query, so only one row per venue is transferred.
 
     Args:
         engine (SQLAlchemy engine): the engine for working with a database
+        venues (pandas DataFrame): a dataframe of the venues table
+        min_events (int): the number of events a venue needs to be kept
 
     Returns:
-        features (pandas DataFrame): a dataframe containing the features columns for each event
+        mainVenues (pandas Index): the lower case names of the venues with at least min_events events
 
     """
-    logger.debug('Start of pull and convert data to features function')
+    counts = pd.read_sql('SELECT venueId, COUNT(*) AS numEvents FROM {} GROUP BY venueId'.format(
+        history_source(engine, 'events')), engine)
+    counts = pd.merge(counts, venues[['id', 'name']], how='left', left_on='venueId', right_on='id')
+
+    # venues are counted by their lower case name, as in the venueName_simple feature
+    venueCounts = counts.groupby(counts['name'].str.lower().fillna("unknown"))['numEvents'].sum()
+
+    return venueCounts[venueCounts >= min_events].index
+
+
+def get_main_presenters(engine, min_events=10):
+    """function for finding the presenters with enough events to be kept as their own value of presentedBy_simple
+
+    As with the venues, the events are counted over the full history with an aggregate query.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        min_events (int): the number of events a presenter needs to be kept
+
+    Returns:
+        mainPresenters (pandas Index): the lower case presentedBy of the presenters with at least min_events events
+
+    """
+    counts = pd.read_sql('SELECT presentedBy, COUNT(*) AS numEvents FROM {} WHERE presentedBy IS NOT NULL '
+                         'GROUP BY presentedBy'.format(history_source(engine, 'events')), engine)
+
+    # presenters are counted by their lower case text, as they are matched when building presentedBy_simple
+    presenterCounts = counts.groupby(counts['presentedBy'].str.lower().str.strip())['numEvents'].sum()
+    presenterCounts = presenterCounts[presenterCounts.index != ""]
+
+    return presenterCounts[presenterCounts >= min_events].index
+
+
+def create_vocabulary_table(engine):
+    """function for creating a feature_vocabulary table in a database
+
+    Given a database connection engine, access the database and create a table holding the venues and presenters
+    kept as their own values of venueName_simple and presentedBy_simple. The vocabulary only grows, each refresh adding
+    its new entries under a new version, so the features of the events stay the same between refreshes.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        None
+
+    """
+    # check if the feature_vocabulary table already exists, stop execution if it does
+    if 'feature_vocabulary' in engine.table_names():
+        logger.debug('feature_vocabulary table already exists')
+
+    else:
+        logger.debug("Creating a feature_vocabulary table at %s", engine.url)
+
+        Base = declarative_base()
+
+        # create a vocabulary entry class, one row per kept venue or presenter
+        class VocabularyEntry(Base):
+            """Create a data model for the feature_vocabulary table """
+            __tablename__ = 'feature_vocabulary'
+            kind = Column(String(10), primary_key=True)
+            name = Column(String(255), primary_key=True)
+            label = Column(String(255), unique=False, nullable=False)
+            version = Column(Integer(), unique=False, nullable=False)
+            addedDate = Column(DATETIME(), unique=False, nullable=False)
+
+            def __repr__(self):
+                return '<VocabularyEntry %r %r>' % (self.kind, self.name)
+
+        try:
+            # create the table
+            Base.metadata.create_all(engine)
+            logger.info("Created table feature_vocabulary")
+        except Exception as e:
+            logger.error("Could not create the feature_vocabulary table: %s", e)
+
+
+def get_vocabulary(engine):
+    """function for pulling the persisted venue and presenter vocabulary
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        vocabulary (pandas DataFrame): the kind, name, label, version, and addedDate of each entry, in the order they
+            were added (empty if there is no vocabulary yet)
+
+    """
+    if 'feature_vocabulary' not in engine.table_names():
+        return pd.DataFrame(columns=['kind', 'name', 'label', 'version', 'addedDate'])
+
+    return pd.read_sql('SELECT * FROM feature_vocabulary ORDER BY version, kind, name', engine)
+
+
+def refresh_vocabulary(engine, min_events=10):
+    """function for adding the venues and presenters that now have enough events to the vocabulary
+
+    Entries are never removed or relabelled. A presenter is only added if none of the existing presenter entries is
+    already matched within it. The first refresh also adds the seeded presenters.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        min_events (int): the number of events a venue or presenter needs to be added
 
-    events = pd.read_sql('SELECT * FROM events', engine)
+    Returns:
+        num_added (int): the number of entries added
 
-    logger.debug('%s', events.head())
+    """
+    create_vocabulary_table(engine)
+    vocabulary = get_vocabulary(engine)
+    version = 1 if vocabulary.shape[0] == 0 else int(vocabulary['version'].max()) + 1
 
     venues = pd.read_sql('SELECT * FROM venues', engine)
+    knownVenues = set(vocabulary.loc[vocabulary['kind'] == 'venue', 'name'])
+    entries = [('venue', name, name) for name in get_main_venues(engine, venues, min_events) if name not in knownVenues]
 
-    logger.debug('%s', venues.head())
+    presenters = list(vocabulary.loc[vocabulary['kind'] == 'presenter', 'name'])
+    if len(presenters) == 0:
+        entries += [('presenter', name, label) for name, label in PRESENTER_SEEDS]
+        presenters = [name for name, label in PRESENTER_SEEDS]
+    for name in get_main_presenters(engine, min_events):
+        if not any(presenter in name for presenter in presenters):
+            entries.append(('presenter', name, name))
+            presenters.append(name)
 
-    data = pd.merge(events, venues, how='left', left_on='venueId', right_on='id', suffixes=('_event', '_venue'))
+    if len(entries) == 0:
+        logger.info('No venues or presenters to add to the vocabulary')
+        return 0
 
-    logger.debug('%s', data.head())
+    addedDate = datetime.now()
+    query = text("INSERT INTO feature_vocabulary (kind, name, label, version, addedDate) "
+                 "VALUES (:kind, :name, :label, :version, :addedDate)")
+    with engine.begin() as connection:
+        connection.execute(query, [{'kind': kind, 'name': name, 'label': label, 'version': version,
+                                    'addedDate': addedDate} for kind, name, label in entries])
+
+    logger.info('Added %s venues and %s presenters to the vocabulary as version %s',
+                sum(kind == 'venue' for kind, name, label in entries),
+                sum(kind == 'presenter' for kind, name, label in entries), version)
+
+    return len(entries)
+
+
+def map_presenters(presentedBy, presenters):
+    """function for mapping the presentedBy of events to presentedBy_simple
+
+    Args:
+        presentedBy (pandas Series): the presentedBy of each event
+        presenters (list): the (name, label) of each presenter in the vocabulary, the label of the first name matched
+            within the lower case presentedBy is used
+
+    Returns:
+        presentedBy_simple (numpy array): the label of each event's presenter, or "Other"
+
+    """
+    presentedBy = presentedBy.str.lower()
+
+    return np.select([presentedBy.str.contains(name, regex=False, na=False) for name, label in presenters],
+                     [label for name, label in presenters], default="Other")
 
-    data['onSaleWindow'] = (
-        data['startDate'].apply(lambda x: datetime.fromisoformat(x) if type(x) == str else x.to_pydatetime()) - data['onSaleDate'].apply(lambda x: datetime.fromisoformat(x) if type(x) == str else x.to_pydatetime())).apply(
-        lambda x: x.days)
 
-    data['eventWeekday'] = data['startDate'].apply(lambda x: datetime.fromisoformat(x) if type(x) == str else x.to_pydatetime()).apply(lambda x: x.weekday())
+def build_features(events, venues, mainVenues, presenters=PRESENTER_SEEDS):
+    """function for converting events and venues into features
 
-    data['startHour'] = data['startDate'].apply(lambda x: datetime.fromisoformat(x) if type(x) == str else x.to_pydatetime()).apply(lambda x: x.hour)
+    Every column is computed on whole columns at once, with each date column parsed a single time.
 
-    data['capacity'] = data.apply(lambda x: x['capacity_event'] if x['capacity_event'] <= x['capacity_venue'] and x[
-                                                                                                                      'capacity_event'] != 10000 else
-    x['capacity_venue'], axis=1)
+    Args:
+        events (pandas DataFrame): a dataframe of rows of the events table
+        venues (pandas DataFrame): a dataframe of the venues table
+        mainVenues (pandas Index): the lower case names of the venues kept as their own value of venueName_simple
+        presenters (list): the (name, label) of the presenters kept as their own value of presentedBy_simple
+
+    Returns:
+        features (pandas DataFrame): a dataframe containing the features columns for each event
 
-    data['city'] = data['city'].apply(lambda x: "" if x is None else x).apply(str.lower).apply(str.strip)
+    """
+    data = pd.merge(events, venues, how='left', left_on='venueId', right_on='id', suffixes=('_event', '_venue'))
+
+    logger.debug('%s', data.head())
 
-    data['locale'] = data['city'].apply(lambda x: x if x == 'chicago' else 'suburbs')
+    # parse each of the date columns once, they come back as strings from sqlite and datetimes from mysql
+    startDate = pd.to_datetime(data['startDate'])
+    onSaleDate = pd.to_datetime(data['onSaleDate'])
+    soldOutDate = pd.to_datetime(data['soldOutDate'])
 
-    data['ageRestriction'] = data.apply(
-        lambda x: x['ageRestriction_event'] if x['ageRestriction_event'] is not None else x['ageRestriction_venue'] if
-        x['ageRestriction_venue'] is not None else "None", axis=1)
+    data['onSaleWindow'] = (startDate - onSaleDate).dt.days
 
-    data['presentedBy_simple'] = data['presentedBy'].apply(lambda x: (
-        "Harmonica Dunn" if re.search('harmonica dunn', x.lower()) is not None else (
-            "Elbo Room" if re.search('elbo room', x.lower()) is not None else "Other")) if x is not None else "Other")
+    data['eventWeekday'] = startDate.dt.weekday
 
-    data['soldOutLead'] = data.apply(
-        lambda x: max(((datetime.fromisoformat(x['startDate']) if type(x['startDate']) == str else x['startDate'].to_pydatetime()) - (datetime.fromisoformat(x['soldOutDate']) if type(x['soldOutDate']) == str else x['soldOutDate'].to_pydatetime())).days, 0) if x[
-                                                                                                                          'isSoldOut'] == 1 else 0,
-        axis=1)
+    data['startHour'] = startDate.dt.hour
 
-    data['venueName'] = data['name_venue'].apply(lambda x: x.lower() if x is not None else "unknown")
+    # use the event capacity if it is set (not the default of 10000) and no larger than the venue's
+    data['capacity'] = data['capacity_event'].where(
+        (data['capacity_event'] <= data['capacity_venue']) & (data['capacity_event'] != 10000), data['capacity_venue'])
 
-    venueCounts = data['venueName'].value_counts()
+    data['city'] = data['city'].fillna("").str.lower().str.strip()
 
-    venueCounts1 = venueCounts[venueCounts >= 10]
+    data['locale'] = np.where(data['city'] == 'chicago', data['city'], 'suburbs')
 
-    mainVenues = venueCounts1.index
+    data['ageRestriction'] = data['ageRestriction_event'].where(data['ageRestriction_event'].notna(),
+                                                                data['ageRestriction_venue']).fillna("None")
 
-    data['venueName_simple'] = data['venueName'].apply(lambda x: x if x in mainVenues else "other")
+    data['presentedBy_simple'] = map_presenters(data['presentedBy'], presenters)
+
+    # the lead is only counted for sold out events, and never negative
+    soldOutLead = (startDate - soldOutDate).dt.days.clip(lower=0)
+    data['soldOutLead'] = np.where(data['isSoldOut'] == 1, soldOutLead.fillna(0), 0).astype('int64')
+
+    data['venueName'] = data['name_venue'].str.lower().fillna("unknown")
+
+    data['venueName_simple'] = data['venueName'].where(data['venueName'].isin(mainVenues), "other")
 
     data['minPrice'] = data['minPrice'].fillna(0)
 
     data['maxPrice'] = data['maxPrice'].fillna(0)
 
-    data = data.rename(columns={'id_event': 'id'})
+    # select the feature columns before renaming, so only those columns are copied
+    features = data[['id_event'] + FEATURE_COLUMNS[1:]].rename(columns={'id_event': 'id'})
 
-    features = data[
-        ['id', 'startDate', 'categoryId', 'formatId', 'inventoryType', 'isFree', 'isReservedSeating', 'minPrice', 'maxPrice',
-         'venueName_simple', 'onSaleWindow', 'eventWeekday', 'startHour', 'capacity', 'locale', 'ageRestriction',
-         'presentedBy_simple', 'isSoldOut', 'soldOutLead']]
+    return features
 
-    logger.debug('%s', features.head())
 
-    return features
+def create_features_state_table(engine):
+    """function for creating a features_state table in a database
+
+    Given a database connection engine, access the database and create a table recording the state of the events
+    and venues at each feature generation, so the next generation can select only what changed since.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        None
+
+    """
+    # check if the features_state table already exists, stop execution if it does
+    if 'features_state' in engine.table_names():
+        logger.debug('features_state table already exists')
+
+    else:
+        logger.debug("Creating a features_state table at %s", engine.url)
+
+        Base = declarative_base()
+
+        # create a features state class
+        class FeaturesState(Base):
+            """Create a data model for the features_state table """
+            __tablename__ = 'features_state'
+            id = Column(Integer(), primary_key=True, autoincrement=True)
+            runDate = Column(DATETIME(), unique=False, nullable=False)
+            mode = Column(String(12), unique=False, nullable=False)
+            lastInfoDate = Column(DATETIME(), unique=False, nullable=True)
+            codeVersion = Column(String(64), unique=False, nullable=False)
+            mainVenues = Column(Text(), unique=False, nullable=False)
+            venueHashes = Column(Text(), unique=False, nullable=False)
+
+            def __repr__(self):
+                return '<FeaturesState %r>' % self.id
+
+        try:
+            # create the table
+            Base.metadata.create_all(engine)
+            logger.info("Created table features_state")
+        except Exception as e:
+            logger.error("Could not create the features_state table: %s", e)
+
+
+def get_current_features_state(engine):
+    """function for building the state of the events and venues that the features are about to be generated from
+
+    The state holds the latest lastInfoDate of the events, the venue vocabulary (the venues kept as their own value
+    of venueName_simple), the presenter vocabulary, a hash of each venue row, and a hash of this module's code. The
+    lastInfoDate is read before the events themselves, so an event updated while the features are generated is
+    picked up next time. Without a persisted vocabulary, the one a first refresh would add is used.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        state (dict): the lastInfoDate, codeVersion, mainVenues, presenters, and venueHashes of the current data
+
+    """
+    with engine.connect() as connection:
+        lastInfoDate = connection.execute('SELECT MAX(lastInfoDate) FROM events').scalar()
+
+    venues = pd.read_sql('SELECT * FROM venues', engine)
+    venueHashes = pd.util.hash_pandas_object(venues.astype(str), index=False)
+
+    with open(__file__, 'rb') as f:
+        codeVersion = hashlib.sha256(f.read()).hexdigest()
+
+    vocabulary = get_vocabulary(engine)
+    if vocabulary.shape[0] > 0:
+        mainVenues = vocabulary.loc[vocabulary['kind'] == 'venue', 'name']
+        presenters = vocabulary.loc[vocabulary['kind'] == 'presenter', ['name', 'label']].itertuples(index=False)
+    else:
+        mainVenues = get_main_venues(engine, venues)
+        presenters = PRESENTER_SEEDS
+
+    return {'lastInfoDate': None if lastInfoDate is None else pd.to_datetime(lastInfoDate).to_pydatetime(),
+            'codeVersion': codeVersion,
+            'mainVenues': sorted(mainVenues),
+            'presenters': [(name, label) for name, label in presenters],
+            'venueHashes': {str(id): str(h) for id, h in zip(venues['id'], venueHashes)}}
+
+
+def get_features_state(engine):
+    """function for pulling the state recorded at the last feature generation, or None if there wasn't one"""
+    if 'features_state' not in engine.table_names():
+        return None
+
+    state = pd.read_sql('SELECT * FROM features_state ORDER BY id DESC LIMIT 1', engine)
+    if state.shape[0] == 0:
+        return None
+
+    state = state.iloc[0]
+
+    return {'runDate': pd.to_datetime(state['runDate']).to_pydatetime(),
+            'lastInfoDate': None if pd.isnull(state['lastInfoDate']) else pd.to_datetime(state['lastInfoDate']).to_pydatetime(),
+            'codeVersion': state['codeVersion'],
+            'mainVenues': json.loads(state['mainVenues']),
+            'venueHashes': json.loads(state['venueHashes'])}
+
+
+def save_features_state(engine, state, mode):
+    """function for recording the state the features were generated from in the features_state table
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        state (dict): the state returned by get_current_features_state before the features were generated
+        mode (str): 'full' or 'incremental'
+
+    Returns:
+        None
+
+    """
+    query = text("INSERT INTO features_state (runDate, mode, lastInfoDate, codeVersion, mainVenues, venueHashes) "
+                 "VALUES (:runDate, :mode, :lastInfoDate, :codeVersion, :mainVenues, :venueHashes)")
+    with engine.begin() as connection:
+        connection.execute(query, runDate=datetime.now(), mode=mode, lastInfoDate=state['lastInfoDate'],
+                           codeVersion=state['codeVersion'], mainVenues=json.dumps(state['mainVenues']),
+                           venueHashes=json.dumps(state['venueHashes']))
+
+    logger.debug('Saved the %s features state up to %s', mode, state['lastInfoDate'])
+
+
+def get_changed_venues(engine, previous_state, current_state):
+    """function for finding the venues whose events need new features since a previous generation
+
+    A venue's events need new features either because the venue itself changed, or because the venue entered or left
+    the vocabulary (which changes the venueName_simple of its events).
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        previous_state (dict): the state of the last generation
+        current_state (dict): the state of the current data
+
+    Returns:
+        changed_venues (list): the sorted ids of the changed venues
+
+    """
+    venues = pd.read_sql('SELECT id, name FROM venues', engine)
+    vocabulary_changes = set(current_state['mainVenues']) ^ set(previous_state['mainVenues'])
+    changed_venues = [id for id, h in current_state['venueHashes'].items() if previous_state['venueHashes'].get(id) != h]
+    changed_venues = set(int(id) for id in changed_venues) | set(
+        venues.loc[venues['name'].str.lower().fillna("unknown").isin(vocabulary_changes), 'id'].astype(int))
+    logger.info('%s venues changed, %s venues entered or left the vocabulary', len(changed_venues),
+                len(vocabulary_changes))
+
+    return sorted(changed_venues)
+
+
+def feature_query(dialect, where=""):
+    """function for building the query that computes the features of events inside the database
+
+    The join, the date parts, the capacity and ageRestriction coalescing, the locale mapping, and the sold out lead
+    are all computed by the database, so only the feature columns (and the lower case venue name and the presentedBy
+    for the vocabulary mapping) are transferred.
+
+    Args:
+        dialect (str): the name of the database dialect, 'sqlite' or 'mysql'
+        where (str): an optional condition on the events (aliased as e) to select
+
+    Returns:
+        query (str): the SQL query
+
+    """
+    # the difference in days between two dates (rounded down, as with a timedelta) and the parts of a date
+    if dialect == 'sqlite':
+        def days(later, earlier):
+            return ("(CAST(julianday({0}) - julianday({1}) AS INTEGER) - (julianday({0}) - julianday({1}) < "
+                    "CAST(julianday({0}) - julianday({1}) AS INTEGER)))").format(later, earlier)
+        weekday = "((CAST(strftime('%w', e.startDate) AS INTEGER) + 6) % 7)"
+        hour = "CAST(strftime('%H', e.startDate) AS INTEGER)"
+        greatest = "MAX"
+    elif dialect == 'mysql':
+        def days(later, earlier):
+            return "FLOOR(TIMESTAMPDIFF(SECOND, {1}, {0}) / 86400)".format(later, earlier)
+        weekday = "WEEKDAY(e.startDate)"
+        hour = "HOUR(e.startDate)"
+        greatest = "GREATEST"
+    else:
+        logger.error("Type of database provided wasn't supported for computing features: %s", dialect)
+        raise TypeError("Type of database provided wasn't supported for computing features")
+
+    return """SELECT e.id AS id, e.startDate AS startDate, e.categoryId AS categoryId, e.formatId AS formatId,
+            e.inventoryType AS inventoryType, e.isFree AS isFree, e.isReservedSeating AS isReservedSeating,
+            COALESCE(e.minPrice, 0) AS minPrice, COALESCE(e.maxPrice, 0) AS maxPrice,
+            COALESCE(LOWER(v.name), 'unknown') AS venueName,
+            {onSaleWindow} AS onSaleWindow, {weekday} AS eventWeekday, {hour} AS startHour,
+            CASE WHEN e.capacity <= v.capacity AND e.capacity != 10000 THEN e.capacity ELSE v.capacity END AS capacity,
+            CASE WHEN LOWER(TRIM(COALESCE(v.city, ''))) = 'chicago' THEN 'chicago' ELSE 'suburbs' END AS locale,
+            COALESCE(e.ageRestriction, v.ageRestriction, 'None') AS ageRestriction,
+            e.presentedBy AS presentedBy,
+            e.isSoldOut AS isSoldOut,
+            CASE WHEN e.isSoldOut = 1 THEN COALESCE({greatest}({soldOutLead}, 0), 0) ELSE 0 END AS soldOutLead
+        FROM events e LEFT JOIN venues v ON e.venueId = v.id {where}""".format(
+        onSaleWindow=days('e.startDate', 'e.onSaleDate'), weekday=weekday, hour=hour, greatest=greatest,
+        soldOutLead=days('e.startDate', 'e.soldOutDate'), where=where)
+
+
+def stream_features(engine, previous_state=None, current_state=None, sql_pushdown=False, chunk_size=None):
+    """function for converting the events into features a chunk of events at a time
+
+    With a chunk_size, the events are read in pages of chunk_size events ordered by id (each page starting after the
+    last id of the one before), so no more than one chunk of events and features is held in memory at a time and no
+    read is left open while a chunk is written. If the state of a previous generation is given, only the events that
+    may have changed since are converted: those with a lastInfoDate at or after the previous one, and those at venues
+    whose row changed or which entered or left the venue vocabulary.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        previous_state (dict): the state of the last generation, or None to convert every event
+        current_state (dict): the state of the current data, built if not given
+        sql_pushdown (bool): whether to compute the features inside the database rather than in pandas
+        chunk_size (int): the number of events in each chunk, or None to convert every event in a single chunk
+
+    Returns:
+        chunks (generator): a generator of features dataframes
+
+    """
+    if current_state is None:
+        current_state = get_current_features_state(engine)
+
+    # select every event, or only those that may have changed since the previous generation
+    conditions = []
+    params = {}
+    if previous_state is not None:
+        # an unused venue id stands in for an empty list of changed venues
+        conditions.append("(e.lastInfoDate >= :lastInfoDate OR e.lastInfoDate IS NULL OR e.venueId IN :venue_ids)")
+        params = {'lastInfoDate': previous_state['lastInfoDate'] or datetime(1990, 1, 1),
+                  'venue_ids': get_changed_venues(engine, previous_state, current_state) or [-1]}
+
+    # page through the events by id
+    order = ""
+    if chunk_size is not None:
+        conditions.append("e.id > :last_id")
+        order = " ORDER BY e.id LIMIT :chunk_size"
+        params.update({'last_id': '', 'chunk_size': int(chunk_size)})
+
+    where = ("WHERE " + " AND ".join(conditions) if len(conditions) > 0 else "") + order
+
+    if sql_pushdown:
+        query = text(feature_query(engine.dialect.name, where))
+    else:
+        query = text("SELECT e.* FROM events e " + where)
+        venues = pd.read_sql('SELECT * FROM venues', engine)
+        logger.debug('%s', venues.head())
+
+    if previous_state is not None:
+        query = query.bindparams(bindparam('venue_ids', expanding=True))
+
+    while True:
+        if sql_pushdown:
+            features = read_sql_frame(query, engine, params=params)
+            num_events = features.shape[0]
+            last_id = features['id'].iloc[-1] if num_events > 0 else None
+
+            # the venue and presenter vocabularies are the mappings left to pandas
+            features['venueName_simple'] = features['venueName'].where(
+                features['venueName'].isin(current_state['mainVenues']), "other")
+            features['presentedBy_simple'] = map_presenters(features['presentedBy'], current_state['presenters'])
+            features = features[FEATURE_COLUMNS]
+
+        else:
+            events = pd.read_sql(query, engine, params=params)
+            num_events = events.shape[0]
+            last_id = events['id'].iloc[-1] if num_events > 0 else None
+
+            logger.debug('%s', events.head())
+
+            features = build_features(events, venues, pd.Index(current_state['mainVenues']),
+                                      current_state['presenters'])
+
+        logger.debug('%s', features.head())
+
+        # a single chunk is returned even if it is empty, so the columns are still there
+        if chunk_size is None:
+            yield features
+            break
+
+        if num_events > 0:
+            yield features
+
+        if num_events < chunk_size:
+            break
+
+        params['last_id'] = last_id
+
+
+def convert_data_to_features(engine, previous_state=None, current_state=None, sql_pushdown=False):
+    """function for pulling data from a populated and updated database for training a model
+
+    Given a database connection engine, access the database and pull the requested
+    data as a Pandas dataframe. See stream_features for the events that are converted when the state of a previous
+    generation is given.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        previous_state (dict): the state of the last generation, or None to convert every event
+        current_state (dict): the state of the current data, built if not given
+        sql_pushdown (bool): whether to compute the features inside the database rather than in pandas
+
+    Returns:
+        features (pandas DataFrame): a dataframe containing the features columns for each event
+
+    """
+    logger.debug('Start of pull and convert data to features function')
+
+    return next(stream_features(engine, previous_state, current_state, sql_pushdown))
+
+
+def generate_features(engine, full_rebuild=False, sql_pushdown=False, chunk_size=None, refresh=False, min_events=10):
+    """function for generating and saving the features of the events that changed since the last generation
+
+    The features of every event are rebuilt when full_rebuild is set, when there is no state of a previous generation,
+    when the code of this module has changed since then, or when presenters were added to the vocabulary since then
+    (as a new presenter can match events at any venue). Otherwise only the events selected by
+    convert_data_to_features are converted and saved. The vocabulary is only refreshed when refresh is set or when
+    there is none yet, so the features of unchanged events stay the same between refreshes. Every added or changed
+    feature is also kept in the feature_snapshots table, valid from the time of the generation.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        full_rebuild (bool): whether to rebuild the features of every event
+        sql_pushdown (bool): whether to compute the features inside the database rather than in pandas
+        chunk_size (int): the number of events converted and saved at a time, or None to convert them all at once
+        refresh (bool): whether to add the venues and presenters that now have enough events to the vocabulary
+        min_events (int): the number of events a venue or presenter needs to be added to the vocabulary
+
+    Returns:
+        features (pandas DataFrame): the features generated, or None if they were generated in chunks
+        full (bool): whether the features of every event were rebuilt
+
+    """
+    create_features_table(engine)
+    create_features_state_table(engine)
+    create_vocabulary_table(engine)
+
+    # start the snapshots with the features already generated, valid from when they were
+    if create_feature_snapshots_table(engine):
+        last_state = get_features_state(engine)
+        backfill_feature_snapshots(engine, last_state['runDate'] if last_state is not None else datetime.now())
+
+    if refresh or get_vocabulary(engine).shape[0] == 0:
+        refresh_vocabulary(engine, min_events)
+
+    current_state = get_current_features_state(engine)
+    previous_state = None if full_rebuild else get_features_state(engine)
+
+    # a change to the feature code can change the features of every event
+    if previous_state is not None and previous_state['codeVersion'] != current_state['codeVersion']:
+        logger.info('The feature code has changed since the last generation, rebuilding every feature')
+        previous_state = None
+
+    # as can a presenter added to the vocabulary, only the events whose features change are written
+    vocabulary = get_vocabulary(engine)
+    if previous_state is not None and (pd.to_datetime(vocabulary.loc[vocabulary['kind'] == 'presenter', 'addedDate'])
+                                       > previous_state['runDate']).any():
+        logger.info('Presenters were added to the vocabulary since the last generation, rebuilding every feature')
+        previous_state = None
+
+    # convert and save the features a chunk at a time, only keeping them if they are all in a single chunk
+    features = None
+    num_features = 0
+    run_date = datetime.now()
+    for chunk in stream_features(engine, previous_state, current_state, sql_pushdown, chunk_size):
+        save_features(engine, chunk, run_date)
+        num_features += chunk.shape[0]
+        features = chunk if chunk_size is None else None
+
+    logger.info('Generated the features of %s events (%s)', num_features,
+                'full rebuild' if previous_state is None else 'incremental')
+
+    save_features_state(engine, current_state, 'full' if previous_state is None else 'incremental')
+
+    return features, previous_state is None
+
+
+def widen_presenter_labels(engine):
+    """function for widening the presentedBy_simple columns of tables created when they held at most 30 characters
+
+    The labels of the presenters are their lower case presentedBy (up to 255 characters), so shorter columns would
+    reject them (or, outside of strict mode, truncate them into the same label). Only MySQL enforces the length.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        None
+
+    """
+    if engine.dialect.name != 'mysql':
+        return
+
+    tables = engine.table_names()
+    with engine.begin() as connection:
+        for table in ['features', 'features_archive', 'feature_snapshots']:
+            if table not in tables:
+                continue
+            length = connection.execute(text(
+                "SELECT CHARACTER_MAXIMUM_LENGTH FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() "
+                "AND TABLE_NAME = :table AND COLUMN_NAME = 'presentedBy_simple'"), table=table).scalar()
+            if length is not None and length < 255:
+                connection.execute('ALTER TABLE {} MODIFY presentedBy_simple VARCHAR(255) NOT NULL'.format(table))
+                logger.info('Widened presentedBy_simple of %s to 255 characters', table)
 
 
 def create_features_table(engine):
@@ -115,6 +688,7 @@ def create_features_table(engine):
     # check if the features table already exists, stop execution if it does
     if 'features' in engine.table_names():
         logging.warning('features table already exists!')
+        widen_presenter_labels(engine)
 
     else:
         logger.debug("Creating a features table at %s", engine.url)
@@ -143,7 +717,7 @@ def create_features_table(engine):
             capacity = Column(Integer(), unique=False, nullable=False)
             locale = Column(String(10), unique=False, nullable=False)
             ageRestriction = Column(String(30), unique=False, nullable=False)
-            presentedBy_simple = Column(String(30), unique=False, nullable=False)
+            presentedBy_simple = Column(String(255), unique=False, nullable=False)
             isSoldOut = Column(Boolean(), unique=False, nullable=False)
             soldOutLead = Column(Integer(), unique=False, nullable=False)
 
@@ -161,14 +735,17 @@ def create_features_table(engine):
             logger.error("Could not create the database: %s", e)
 
 
-def save_features(engine, features):
+def save_features(engine, features, valid_from=None):
     """function for loading a features dataset into a database
 
-    Given a database connection engine, access the database and push the features data into the features table
+    Given a database connection engine, access the database and push the features data into the features table,
+    adding the new features and updating the changed ones in a single transaction, along with their snapshots
 
     Args:
         engine (SQLAlchemy engine): the engine for working with a database
         features (pandas DataFrame): a dataframe containing the features columns for each event
+        valid_from (datetime): the validFrom of the snapshots of the added and changed features, or None to not keep
+            snapshots
 
     Returns:
         None
@@ -176,64 +753,12 @@ def save_features(engine, features):
     """
     logger.info('Saving features')
 
-    # use the engine to build a reflection of the database
-    Base = automap_base()
-    Base.prepare(engine, reflect=True)
-
-    # build the feature class from the features table in the database
-    Feature = Base.classes.features
-
-    # create a session from the engine
-    session_mk = sessionmaker()
-    session_mk.configure(bind=engine)
-    session = session_mk()
-
-    # initialize counters for the number of features updated and added
-    num_features_added = 0
-    num_features_updated = 0
-
-    # initialize a list of objects to add to the database
-    objects_to_add = []
-
-    # convert the dataframe into a dictionary of rows
-    features_dict = features.to_dict('index')
-
-    # query the features table for all ids, creating a dictionary of keys (for fast lookup)
-    feature_ids = session.query(Feature.id).all()
-    feature_ids = {entity[0]: "" for entity in feature_ids}
-    logger.debug('%s feature ids retrieved', len(feature_ids))
-
-    # pull the current features dataframe
-    current_features = pd.read_sql('SELECT * FROM features', engine)
-
-    # for each feature in the features dict, check the feature
-    for feature in features_dict.values():
-        # if the feature id is in the current list, check against the pandas dataframe
-        if feature['id'] in feature_ids.keys():
-            # compare the feature row to the corresponding row in the current features dataframe from the database
-            if list(current_features[current_features['id'] == feature['id']].to_dict('index').values())[0] != feature:
-                # if the entries are different, then update the feature
-                update_feature(engine, feature)
-                num_features_updated += 1
-            else:
-                logger.debug('Feature %s is the same', feature['id'])
-        # otherwise, create the feature and add it to the list of objects to add
-        else:
-            objects_to_add.append(create_feature(engine, feature))
-            num_features_added += 1
-
-    # for each object to add, add it using the session
-    num_added = 0
-    for object in objects_to_add:
-        session.add(object)
-        logger.debug("Object %s added", object)
-        num_added += 1
-
-    session.commit()
-    logger.info("%s objects added", num_added)
+    num_features_added, num_features_updated, num_features_unchanged = upsert_frame(
+        engine, features, 'features', 'id', history_table='feature_snapshots' if valid_from is not None else None,
+        valid_from=valid_from)
 
-    logger.info("%s features added, %s features updated", num_features_added, num_features_updated)
-    session.close()
+    logger.info("%s features added, %s features updated, %s features unchanged", num_features_added,
+                num_features_updated, num_features_unchanged)
 
 
 def run_generate(args):
@@ -245,6 +770,15 @@ def run_generate(args):
         logger.error('Error loading the config file: %s, be sure you specified a config.yml file', e)
         sys.exit()
 
+    # whether to compute the features inside the database, off unless set in the config file
+    sql_pushdown = config.get("generate_features", {}).get("sql_pushdown", False)
+
+    # the number of events converted and saved at a time, all at once unless set in the config file
+    chunk_size = config.get("generate_features", {}).get("chunk_size", None)
+
+    # the number of events a venue or presenter needs to be added to the vocabulary when it is refreshed
+    min_events = config.get("generate_features", {}).get("vocabulary_min_events", 10)
+
     if config["database_info"]["how"] == "rds":
         # if a type argument was passed, then use it for calling the appropriate database type
         if args.type is not None:
@@ -271,16 +805,10 @@ def run_generate(args):
             sys.exit()
 
         # create the engine for the database and type
-        engine = create_db_engine(db_name, type)
-
-        # create the database schema in the engine
-        create_features_table(engine)
+        engine = create_db_engine(db_name, type, **get_engine_options(config))
 
-        # pull the data and make a features dataframe
-        features = convert_data_to_features(engine)
-
-        # save the features into the database
-        save_features(engine, features)
+        # generate the features of the changed events (or every event) and save them into the database
+        generate_features(engine, args.full_rebuild, sql_pushdown, chunk_size, args.refresh_vocabulary, min_events)
 
     elif config["database_info"]["how"] == "local":
         # if a type argument was passed, then use it for calling the appropriate database type
@@ -309,16 +837,10 @@ def run_generate(args):
             sys.exit()
 
         # create the engine for the database and type
-        engine = create_db_engine(db_name, type)
-
-        # create the database schema in the engine
-        create_features_table(engine)
-
-        # pull the data and make a features dataframe
-        features = convert_data_to_features(engine)
+        engine = create_db_engine(db_name, type, **get_engine_options(config))
 
-        # save the features into the database
-        save_features(engine, features)
+        # generate the features of the changed events (or every event) and save them into the database
+        generate_features(engine, args.full_rebuild, sql_pushdown, chunk_size, args.refresh_vocabulary, min_events)
 
     else:
         logger.error('Method of database storage (should be "rds" or "local") in config file not supported')
@@ -334,6 +856,9 @@ if __name__ == '__main__':
     parser.add_argument('--type', default=None, help="type of database, 'sqlite' or 'mysql+pymysql'")
     parser.add_argument('--database_name', default=None,
                         help="location of database (including name.db)")
+    parser.add_argument('--full_rebuild', action='store_true', help="rebuild the features of every event")
+    parser.add_argument('--refresh_vocabulary', action='store_true',
+                        help="add the venues and presenters that now have enough events to the vocabulary")
 
     args = parser.parse_args()
 
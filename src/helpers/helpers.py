@@ -6,15 +6,43 @@ from datetime import datetime  # import datetime for building folder paths
 import json, requests  # import necessary libraries for intake of JSON results from eventbrite
 
 from sqlalchemy import create_engine # import needed sqlalchemy library for db engine creation
+from sqlalchemy import MetaData, Table, bindparam, text  # import for set-based writes to reflected tables
 
 from sqlalchemy.ext.automap import automap_base # import for declaring classes
 from sqlalchemy.orm import sessionmaker  # import the sessionmaker for adding data to the database
 import pandas as pd
+import numpy as np
  
 configPath = os.path.join("config","logging","local.conf")
 logging.config.fileConfig(configPath)
 logger = logging.getLogger("helpers")
 
+# cache of the engines created in this process, keyed by engine string and pool options
+_engines = {}
+
+# the venue and presenter sell out statistics added to the features, as of each event's on sale date
+SELL_OUT_STATS_COLUMNS = ['venueEvents', 'venueSellOutRate', 'venueSoldOutLead', 'presenterEvents',
+                          'presenterSellOutRate', 'presenterSoldOutLead']
+
+# the counters over the successive pulls of each event added to the features
+VELOCITY_COLUMNS = ['numPulls', 'numPriceChanges', 'numAvailabilityFlips', 'waitListDays', 'hadWaitList']
+
+# the free text of each event added to the features, hashed into token features by the models
+TEXT_COLUMNS = ['eventName', 'presentedBy']
+
+# the compact types the features and scores columns are loaded as for training, scoring, and evaluation
+FEATURE_TYPES = {'startDate': 'datetime64[ns]', 'categoryId': 'int16', 'formatId': 'int16', 'inventoryType': 'category',
+                 'isFree': 'int8', 'isReservedSeating': 'int8', 'minPrice': 'float32', 'maxPrice': 'float32',
+                 'venueName_simple': 'category', 'onSaleWindow': 'int32', 'eventWeekday': 'int8', 'startHour': 'int8',
+                 'capacity': 'int32', 'locale': 'category', 'ageRestriction': 'category',
+                 'presentedBy_simple': 'category', 'isSoldOut': 'int8', 'soldOutLead': 'int16',
+                 'venueEvents': 'float32', 'venueSellOutRate': 'float32', 'venueSoldOutLead': 'float32',
+                 'presenterEvents': 'float32', 'presenterSellOutRate': 'float32', 'presenterSoldOutLead': 'float32',
+                 'numPulls': 'float32', 'numPriceChanges': 'float32', 'numAvailabilityFlips': 'float32',
+                 'waitListDays': 'float32', 'hadWaitList': 'float32'}
+SCORE_TYPES = {'event_id': 'category', 'startDate': 'datetime64[ns]', 'predictionDate': 'datetime64[ns]',
+               'willSellOut': 'int8', 'confidence': 'float32', 'howFarOut': 'float32'}
+
 
 def set_headers(oauth_token=None):
     """get the OAuth token needed for an API connection and set the header for the connection
@@ -92,12 +120,19 @@ def API_request(API_url, page_num=1, headers=None):
     return results
 
 
-def create_db_engine(database_name, type):
+def create_db_engine(database_name, type, pool_size=None, max_overflow=None, pool_pre_ping=False, pool_recycle=-1):
     """Create an engine for a specific database and database type
 
+    Engines are cached per engine string and pool settings, so repeated calls within a process share a single
+    connection pool rather than paying the connection setup again.
+
     Args:
     	database_name (str): the name of the database to create
     	type (str): the type of database to create
+    	pool_size (int): the number of connections to keep open in the pool (mysql only)
+    	max_overflow (int): the number of connections allowed beyond the pool_size (mysql only)
+    	pool_pre_ping (bool): whether to test connections for liveness when they are checked out of the pool
+    	pool_recycle (int): the number of seconds after which a connection is replaced, -1 to never recycle
 
     Returns:
         engine (SQLAlchemy engine): the engine for working with a database
@@ -125,13 +160,256 @@ def create_db_engine(database_name, type):
         raise TypeError("Type of database provided wasn't supported")
 
     logger.debug("Engine string is %s", engine_string)
+
+    # build the pool options, the pool size and overflow only apply to the queue pool used for mysql
+    engine_options = {'pool_pre_ping': pool_pre_ping, 'pool_recycle': pool_recycle}
+    if type == "mysql+pymysql":
+        if pool_size is not None:
+            engine_options['pool_size'] = pool_size
+        if max_overflow is not None:
+            engine_options['max_overflow'] = max_overflow
+
+    # if an engine was already built for this database and these options, then reuse it
+    engine_key = (engine_string, tuple(sorted(engine_options.items())))
+    if engine_key in _engines:
+        logger.debug("Reusing the existing engine for %s", database_name)
+        return _engines[engine_key]
+
     # create the engine
-    engine = create_engine(engine_string)
+    engine = create_engine(engine_string, **engine_options)
+    _engines[engine_key] = engine
 
     # return the engine
     return engine
 
 
+def get_engine_options(config):
+    """helper function for pulling the connection pool options for an engine from the database_info of a config"""
+    engine_options = {}
+    for option in ['pool_size', 'max_overflow', 'pool_pre_ping', 'pool_recycle']:
+        if "database_info" in config and option in config["database_info"]:
+            engine_options[option] = config["database_info"][option]
+
+    return engine_options
+
+
+def get_engine_from_config(config, type=None, database_name=None):
+    """Create the engine for the database described in the database_info section of a config
+
+    Args:
+    	config (dict): the loaded config.yml
+    	type (str): optionally override the type of database from the config
+    	database_name (str): optionally override the name (or local path) of the database from the config
+
+    Returns:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    """
+    if config["database_info"]["how"] == "rds":
+        type_key, name_key = "rds_database_type", "rds_database_name"
+    elif config["database_info"]["how"] == "local":
+        type_key, name_key = "local_database_type", "local_database_name"
+    else:
+        logger.error('Method of database storage (should be "rds" or "local") in config file not supported')
+        sys.exit()
+
+    # if no type was passed, then look for it in the config file
+    if type is None:
+        if type_key in config["database_info"]:
+            type = config["database_info"][type_key]
+        else:  # if the config file didn't have it, then log the error and exit
+            logger.error('Database type must be passed in arguments or in the config file')
+            sys.exit()
+
+    # if no database_name was passed, then look for it in the config file
+    if database_name is None:
+        if name_key in config["database_info"] and config["database_info"]["how"] == "rds":
+            database_name = config["database_info"][name_key]
+        elif name_key in config["database_info"]:
+            database_name = os.path.join(config["database_info"]["local_database_folder"],
+                                         config["database_info"][name_key])
+        else:  # if the config file didn't have it, then log the error and exit
+            logger.error('Database name must be passed in arguments or in the config file')
+            sys.exit()
+
+    # create the engine for the database and type
+    return create_db_engine(database_name, type, **get_engine_options(config))
+
+
+def read_sql_stream(query, engine, chunksize=10000, params=None):
+    """function for reading a query in chunks through a server-side cursor
+
+    The connection is opened with stream_results, so for mysql the rows are fetched from the server as the chunks
+    are consumed rather than being buffered in full by the driver. Dialects without server-side cursors (sqlite)
+    ignore the option.
+
+    Args:
+        query (str): the SQL query to run
+        engine (SQLAlchemy engine): the engine for working with a database
+        chunksize (int): the number of rows in each chunk
+        params (dict): the parameters of the query
+
+    Returns:
+        chunks (generator): a generator of pandas DataFrames with up to chunksize rows each
+
+    """
+    with engine.connect().execution_options(stream_results=True) as connection:
+        for chunk in pd.read_sql(query, connection, chunksize=chunksize, params=params):
+            yield chunk
+
+
+def read_sql_frame(query, engine, chunksize=10000, params=None):
+    """function for reading a full query result into a single dataframe through a server-side cursor
+
+    Args:
+        query (str): the SQL query to run
+        engine (SQLAlchemy engine): the engine for working with a database
+        chunksize (int): the number of rows fetched from the server at a time
+        params (dict): the parameters of the query
+
+    Returns:
+        frame (pandas DataFrame): a dataframe containing the results of the query
+
+    """
+    chunks = list(read_sql_stream(query, engine, chunksize, params))
+
+    # if no chunks were returned, then fall back to a plain read for the empty frame with its columns
+    if len(chunks) == 0:
+        return pd.read_sql(query, engine, params=params)
+
+    return pd.concat(chunks, ignore_index=True)
+
+
+def normalize_column(values, column_type):
+    """helper function for converting a column to the values its database column holds, so they can be compared
+
+    Args:
+        values (pandas Series): the values of the column, from a dataframe or read from the database
+        column_type (SQLAlchemy type): the type of the column in the database table
+
+    Returns:
+        values (pandas Series): datetimes for date columns, floats for boolean and numeric columns, and objects (with
+            None for missing values) for everything else
+
+    """
+    try:
+        python_type = column_type.python_type
+    except NotImplementedError:
+        python_type = object
+
+    if python_type is datetime:
+        return pd.to_datetime(values)
+
+    if python_type in (bool, int, float) or python_type.__name__ == 'Decimal':
+        return pd.to_numeric(values.astype(float))
+
+    return values.astype(object).where(values.notna(), None)
+
+
+def upsert_frame(engine, frame, table, key, update_columns=None, batch_size=500, history_table=None, valid_from=None):
+    """function for writing a dataframe into a table, inserting the new rows and updating the changed ones
+
+    The current rows of the frame's keys are read in batches and compared to the frame a column at a time, and then
+    the new rows are bulk inserted and the changed rows bulk updated, all in a single transaction. When a history table
+    is given, the new and changed rows are also inserted into it with a validFrom column, in the same transaction.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        frame (pandas DataFrame): the rows to write, with columns named as in the table
+        table (str): the name of the table to write to
+        key (str): the primary key column of the table
+        update_columns (list): the columns compared and updated for existing rows, every column but the key if None
+        batch_size (int): the number of keys to read the current rows of at a time
+        history_table (str): the name of a table to also insert the new and changed rows into, or None
+        valid_from (datetime): the validFrom of the rows inserted into the history table
+
+    Returns:
+        num_added (int): the number of rows inserted
+        num_updated (int): the number of rows updated
+        num_unchanged (int): the number of rows that were already the same in the table
+
+    """
+    db_table = Table(table, MetaData(), autoload=True, autoload_with=engine)
+
+    if update_columns is None:
+        update_columns = [column for column in frame.columns if column != key]
+
+    # convert the frame to the values the table holds, keeping the last row of any repeated key
+    frame = frame.drop_duplicates(key, keep='last').reset_index(drop=True)
+    frame = pd.DataFrame({column: normalize_column(frame[column], db_table.c[column].type) for column in frame.columns})
+
+    # read the current rows of the frame's keys
+    query = text('SELECT {} FROM {} WHERE {} IN :keys'.format(', '.join([key] + update_columns), table, key)).bindparams(
+        bindparam('keys', expanding=True))
+    keys = list(frame[key])
+    current = [pd.read_sql(query, engine, params={'keys': keys[i:i + batch_size]}) for i in range(0, len(keys), batch_size)]
+    current = pd.concat(current, ignore_index=True) if len(current) > 0 else pd.DataFrame(columns=[key] + update_columns)
+
+    # find the new rows, then compare the existing rows a column at a time
+    existing = frame[key].isin(current[key])
+    compared = pd.merge(frame.loc[existing, [key] + update_columns], current, how='left', on=key, suffixes=('', '_current'))
+    changed = pd.Series(False, index=compared.index)
+    for column in update_columns:
+        new_values = compared[column]
+        current_values = normalize_column(compared[column + '_current'], db_table.c[column].type)
+        if new_values.dtype.kind in 'fiub' or current_values.dtype.kind in 'fiub':
+            same = np.isclose(new_values.astype(float), current_values.astype(float), rtol=0, atol=1e-9, equal_nan=True)
+        else:
+            same = (new_values == current_values) | (new_values.isna() & current_values.isna())
+        changed = changed | ~np.asarray(same)
+
+    added = frame.loc[~existing]
+    updated = compared.loc[changed.values, [key] + update_columns]
+
+    # write the new and changed rows together
+    with engine.begin() as connection:
+        if added.shape[0] > 0:
+            connection.execute(db_table.insert(), frame_to_records(added, db_table))
+        if updated.shape[0] > 0:
+            statement = db_table.update().where(db_table.c[key] == bindparam('b_' + key)).values(
+                {column: bindparam('b_' + column) for column in update_columns})
+            connection.execute(statement, [{'b_' + column: value for column, value in record.items()}
+                                           for record in frame_to_records(updated, db_table)])
+        if history_table is not None and added.shape[0] + updated.shape[0] > 0:
+            history = Table(history_table, MetaData(), autoload=True, autoload_with=engine)
+            records = frame_to_records(frame.loc[frame[key].isin(pd.concat([added[key], updated[key]]))], db_table)
+            for record in records:
+                record['validFrom'] = valid_from
+            connection.execute(history.insert(), records)
+
+    return added.shape[0], updated.shape[0], compared.shape[0] - updated.shape[0]
+
+
+def frame_to_records(frame, db_table):
+    """helper function for converting a normalized dataframe into a list of row dictionaries of python values
+
+    The values are converted a column at a time (missing values to None, timestamps to datetimes, and booleans and
+    numbers to the python type of their database column), and then zipped into the rows.
+    """
+    columns = list(frame.columns)
+    column_values = []
+    for column in columns:
+        try:
+            python_type = db_table.c[column].type.python_type
+        except NotImplementedError:
+            python_type = object
+
+        values = frame[column]
+        missing = values.isna().values
+        if pd.api.types.is_datetime64_any_dtype(values):
+            values = list(values.dt.to_pydatetime())
+        else:
+            values = values.tolist()
+            if python_type in (bool, int, float):
+                values = [python_type(value) if not is_missing else None for value, is_missing in zip(values, missing)]
+            elif frame[column].dtype == object:
+                values = [value.to_pydatetime() if isinstance(value, pd.Timestamp) else value for value in values]
+
+        column_values.append([value if not is_missing else None for value, is_missing in zip(values, missing)])
+
+    return [dict(zip(columns, row)) for row in zip(*column_values)]
+
+
 def create_event(engine, event, infoDate):
     """make an event to add to the database using an engine
 
@@ -843,7 +1121,236 @@ def update_feature(engine, feature):
     session.close()
 
 
-def pull_features(engine):
+def set_column_types(frame, types):
+    """function for converting the columns of a dataframe to compact types
+
+    Strings with few distinct values become categories, DECIMAL columns (read as Decimal objects) become float32, and
+    flags and small integers become int8/int16, which shrinks the frame several-fold and gives the models numeric
+    columns rather than objects.
+
+    Args:
+        frame (pandas DataFrame): the dataframe to convert
+        types (dict): the type of each column, e.g. FEATURE_TYPES or SCORE_TYPES, columns not in the frame are skipped
+
+    Returns:
+        frame (pandas DataFrame): a copy of the dataframe with the converted columns
+
+    """
+    frame = frame.copy()
+
+    for column, dtype in types.items():
+        if column not in frame.columns:
+            continue
+
+        if dtype == 'datetime64[ns]':
+            frame[column] = pd.to_datetime(frame[column])
+        else:
+            frame[column] = frame[column].astype(dtype)
+
+    return frame
+
+
+def history_source(engine, table, include_archive=True):
+    """function for getting the name to select a table's rows from, including its archived rows if requested
+
+    Once past events have been archived, the all_<table> view unions the hot table with its archive table.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        table (str): the name of the hot table, 'events', 'features' or 'scores'
+        include_archive (bool): whether the archived rows should be included
+
+    Returns:
+        source (str): the name of the table or view to select from
+
+    """
+    if include_archive and (table + '_archive') in engine.table_names():
+        return 'all_' + table
+
+    return table
+
+
+def add_sell_out_stats(engine, features, include_archive=True):
+    """function for adding the sell out statistics of each event's venue and presenter to its features
+
+    The statistics are looked up from the sell_out_stats table (maintained by the update of the events) as of the day
+    of each event's on sale date, so they only count events that ended on an earlier day. The number of events, the
+    share of them that sold out, and the mean soldOutLead of those that did are added for the venue and the presenter,
+    all 0 when there are no earlier events (or no sell_out_stats table).
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        features (pandas DataFrame): a dataframe containing the features columns for each event
+        include_archive (bool): whether the features may include archived events
+
+    Returns:
+        features (pandas DataFrame): a copy of the features with the SELL_OUT_STATS_COLUMNS added
+
+    """
+    features = features.copy()
+    for column in SELL_OUT_STATS_COLUMNS:
+        features[column] = 0.0
+
+    if 'sell_out_stats' not in engine.table_names() or features.shape[0] == 0:
+        logger.warning('No sell out statistics to add to the features')
+        return features
+
+    # the venue, presenter, and on sale day of each event, in the order of the rows of the features
+    events = read_sql_frame('SELECT id, venueId, presentedBy, onSaleDate FROM {}'.format(
+        history_source(engine, 'events', include_archive)), engine).drop_duplicates('id')
+    events = pd.merge(features[['id']], events, how='left', on='id')
+    onSaleDay = pd.to_datetime(events['onSaleDate']).dt.floor('D')
+    names = {'venue': events['venueId'].astype('Int64').astype(str).where(events['venueId'].notna()),
+             'presenter': events['presentedBy'].str.lower().str.strip()}
+
+    stats = read_sql_frame('SELECT * FROM sell_out_stats', engine)
+    stats['endDay'] = pd.to_datetime(stats['endDay'])
+
+    for kind, name in names.items():
+        # the running totals of each venue or presenter, by the day its events ended
+        cells = stats.loc[stats['kind'] == kind].sort_values('endDay')
+        totals = cells.groupby('name')[['numEvents', 'numSoldOut', 'sumSoldOutLead']].cumsum()
+        totals[['name', 'endDay']] = cells[['name', 'endDay']]
+
+        # the totals of the last day before each event's on sale day
+        lookup = pd.DataFrame({'row': np.arange(events.shape[0]), 'name': name, 'day': onSaleDay})
+        lookup = lookup.dropna().sort_values('day')
+        lookup = pd.merge_asof(lookup, totals, left_on='day', right_on='endDay', by='name',
+                               allow_exact_matches=False).fillna(0)
+
+        numEvents = np.zeros(events.shape[0])
+        numSoldOut = np.zeros(events.shape[0])
+        sumSoldOutLead = np.zeros(events.shape[0])
+        numEvents[lookup['row']] = lookup['numEvents']
+        numSoldOut[lookup['row']] = lookup['numSoldOut']
+        sumSoldOutLead[lookup['row']] = lookup['sumSoldOutLead']
+
+        features[kind + 'Events'] = numEvents
+        features[kind + 'SellOutRate'] = np.divide(numSoldOut, numEvents, out=np.zeros_like(numEvents),
+                                                   where=numEvents > 0)
+        features[kind + 'SoldOutLead'] = np.divide(sumSoldOutLead, numSoldOut, out=np.zeros_like(numSoldOut),
+                                                   where=numSoldOut > 0)
+
+    return features
+
+
+def lookup_as_of(engine, table, requests, batch_size=500):
+    """function for reading the rows of a set of events from a table of versions, each as it was at its own time
+
+    The versions of the requested events are read in batches of ids and matched to the requests with a single as-of
+    merge, which takes the latest version valid at or before each request's time.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        table (str): the name of the table of versions, keyed by id and validFrom
+        requests (pandas DataFrame): a dataframe with the id of each event and the time to read it as of (asOf)
+        batch_size (int): the number of ids to read the versions of at a time
+
+    Returns:
+        rows (pandas DataFrame): the row of each request, in the order of the requests, with a validFrom of NaT (and
+            missing values) for events that had no version at their time, so in the types of the database
+
+    """
+    query = text('SELECT * FROM {} WHERE id IN :ids AND validFrom <= :until'.format(table)).bindparams(
+        bindparam('ids', expanding=True))
+    ids = list(requests['id'].astype(str).unique())
+    until = pd.to_datetime(requests['asOf']).max().to_pydatetime() if requests.shape[0] > 0 else None
+    versions = [pd.read_sql(query, engine, params={'ids': ids[i:i + batch_size], 'until': until})
+                for i in range(0, len(ids), batch_size)]
+    versions = pd.concat(versions, ignore_index=True) if len(versions) > 0 else pd.read_sql(
+        'SELECT * FROM {} WHERE 1 = 0'.format(table), engine)
+    versions['validFrom'] = pd.to_datetime(versions['validFrom'])
+
+    # match each request to the latest version at its time, then put the requests back in their order
+    left = pd.DataFrame({'id': requests['id'].astype(str).values, 'asOf': pd.to_datetime(requests['asOf']).values,
+                         'order': range(requests.shape[0])}).sort_values('asOf', kind='mergesort')
+    matched = pd.merge_asof(left, versions.sort_values('validFrom', kind='mergesort'), left_on='asOf',
+                            right_on='validFrom', by='id', direction='backward')
+    return matched.sort_values('order').drop(columns=['asOf', 'order']).reset_index(drop=True)
+
+
+def add_velocity_features(engine, features, include_archive=True, as_of=None):
+    """function for adding the counters over the successive pulls of each event to its features
+
+    The counters are read from the event_velocity table (maintained by the update of the events): the number of pulls
+    of the event, the number of times its prices changed and its availability flipped between pulls, whether a wait
+    list has appeared, and the days it was on sale before one did. They stop at an event's sell out. All are 0 for
+    events without counters. When as_of times are given, the counters of each event are read from the
+    event_velocity_snapshots table as they were at its time instead, so they match its point in time inputs.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        features (pandas DataFrame): a dataframe containing the features columns for each event
+        include_archive (bool): whether the features may include archived events
+        as_of (pandas Series): the time to read the counters of each row of the features as of, or None for the latest
+
+    Returns:
+        features (pandas DataFrame): a copy of the features with the VELOCITY_COLUMNS added
+
+    """
+    tables = engine.table_names()
+    if 'event_velocity' not in tables:
+        logger.warning('No pull counters to add to the features')
+        features = features.copy()
+        for column in VELOCITY_COLUMNS:
+            features[column] = 0.0
+        return features
+
+    # read the counters of each row of the features, the latest or as of its time
+    if as_of is not None and 'event_velocity_snapshots' in tables:
+        counters = lookup_as_of(engine, 'event_velocity_snapshots',
+                                pd.DataFrame({'id': features['id'].values, 'asOf': pd.to_datetime(as_of).values}))
+    else:
+        if as_of is not None:
+            logger.warning('No pull counter snapshots to read as of a time, using the latest counters')
+        counters = read_sql_frame('SELECT id, numPulls, numPriceChanges, numAvailabilityFlips, firstWaitListDate '
+                                  'FROM event_velocity', engine)
+        counters = pd.merge(features[['id']], counters, how='left', on='id')
+
+    onSaleDate = read_sql_frame('SELECT id, onSaleDate FROM {}'.format(history_source(engine, 'events', include_archive)),
+                                engine).drop_duplicates('id')
+    onSaleDate = pd.merge(features[['id']], onSaleDate, how='left', on='id')['onSaleDate']
+
+    firstWaitListDate = pd.to_datetime(counters['firstWaitListDate'])
+    counters['hadWaitList'] = firstWaitListDate.notna().astype(float)
+    counters['waitListDays'] = (firstWaitListDate - pd.to_datetime(onSaleDate)).dt.days.clip(lower=0)
+
+    # the counters are in the order of the rows of the features
+    features = features.copy()
+    for column in VELOCITY_COLUMNS:
+        features[column] = counters[column].fillna(0).astype(float).values
+
+    return features
+
+
+def add_text_features(engine, features, include_archive=True):
+    """function for adding the free text of each event (its name and presenter) to its features
+
+    The text is kept whole, with missing text as empty strings, and is tokenized and hashed by the models, so no
+    vocabulary of it is kept.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        features (pandas DataFrame): a dataframe containing the features columns for each event
+        include_archive (bool): whether the features may include archived events
+
+    Returns:
+        features (pandas DataFrame): a copy of the features with the TEXT_COLUMNS added
+
+    """
+    text = read_sql_frame('SELECT id, name AS eventName, presentedBy FROM {}'.format(
+        history_source(engine, 'events', include_archive)), engine).drop_duplicates('id')
+
+    # merge the text onto the rows of the features, keeping their order
+    text = pd.merge(features[['id']], text, how='left', on='id')
+    features = features.copy()
+    for column in TEXT_COLUMNS:
+        features[column] = text[column].fillna('').astype(str).values
+
+    return features
+
+
+def pull_features(engine, include_archive=True):
     """function for pulling features from a populated and updated database for training a model
 
     Given a database connection engine, access the database and pull the requested
@@ -851,15 +1358,20 @@ def pull_features(engine):
 
     Args:
         engine (SQLAlchemy engine): the engine for working with a database
+        include_archive (bool): whether the features of archived events should be included
 
     Returns:
-        features (pandas DataFrame): a dataframe containing the features columns for each event
+        features (pandas DataFrame): a dataframe containing the features columns for each event, along with the
+            SELL_OUT_STATS_COLUMNS, VELOCITY_COLUMNS and TEXT_COLUMNS, in the types of FEATURE_TYPES
 
     """
     logger.debug('Start of pull features function')
 
-    features = pd.read_sql('SELECT * FROM features', engine)
-    features['startDate'] = features['startDate'].apply(lambda x: datetime.fromisoformat(x) if type(x) == str else x.to_pydatetime())
+    features = read_sql_frame('SELECT * FROM {}'.format(history_source(engine, 'features', include_archive)), engine)
+    features = add_sell_out_stats(engine, features, include_archive)
+    features = add_velocity_features(engine, features, include_archive)
+    features = add_text_features(engine, features, include_archive)
+    features = set_column_types(features, FEATURE_TYPES)
 
     logger.debug('%s', features.head())
 
@@ -957,26 +1469,60 @@ def update_score(engine, score):
     session.close()
 
 
-def pull_scores(engine):
+def pull_scores(engine, include_archive=True):
     """function for pulling scores from a database for evaluating a model
 
     Given a database connection engine, access the database and pull the requested
-    data as a Pandas dataframe.
+    data as a Pandas dataframe. The daily scores are combined with the predictions kept in the score_rollups table
+    for scores that have been compacted, so the result covers both tiers.
 
     Args:
         engine (SQLAlchemy engine): the engine for working with a database
+        include_archive (bool): whether the scores of archived events should be included
 
     Returns:
-        scores (pandas DataFrame): a dataframe containing the scores columns for each event
+        scores (pandas DataFrame): a dataframe containing the scores columns for each event, in the types of
+            SCORE_TYPES
 
     """
     logger.debug('Start of pull scores function')
 
-    scores = pd.read_sql('SELECT * FROM scores', engine)
-    scores['startDate'] = scores['startDate'].apply(lambda x: datetime.fromisoformat(x) if type(x) == str else x.to_pydatetime())
-    scores['predictionDate'] = scores['predictionDate'].apply(
-        lambda x: datetime.fromisoformat(x) if type(x) == str else x.to_pydatetime())
+    scores = read_sql_frame('SELECT * FROM {}'.format(history_source(engine, 'scores', include_archive)), engine)
+
+    # add the compacted predictions, rebuilding their prediction ids from the event and prediction date
+    if 'score_rollups' in engine.table_names():
+        rollups = read_sql_frame('SELECT event_id, startDate, predictionDate, willSellOut, confidence, howFarOut '
+                                 'FROM score_rollups', engine)
+        rollups['pred_id'] = rollups['event_id'] + "-" + pd.to_datetime(rollups['predictionDate']).dt.strftime('%y-%m-%d')
+        scores = pd.concat([scores, rollups[scores.columns]], ignore_index=True)
+
+    scores = set_column_types(scores, SCORE_TYPES)
 
     logger.debug('%s', scores.head())
 
-    return scores
\ No newline at end of file
+    return scores
+
+
+def pull_model_scores(engine, include_archive=True):
+    """function for pulling the scores of every scored model version, for comparing the versions head to head
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        include_archive (bool): whether the scores of archived events should be included
+
+    Returns:
+        model_scores (pandas DataFrame): a dataframe containing the scores columns and modelVersion of each event and
+            version, empty if no versions have been scored side by side yet
+
+    """
+    logger.debug('Start of pull model scores function')
+
+    if 'model_scores' not in engine.table_names():
+        return pd.DataFrame(columns=['pred_id', 'modelVersion'] + list(SCORE_TYPES))
+
+    model_scores = read_sql_frame('SELECT * FROM {}'.format(history_source(engine, 'model_scores', include_archive)),
+                                  engine)
+    model_scores = set_column_types(model_scores, SCORE_TYPES)
+    model_scores['modelVersion'] = model_scores['modelVersion'].astype('int64')
+
+    return model_scores
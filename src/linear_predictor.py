@@ -0,0 +1,145 @@
+import io  # import io for reading the artifact from bytes
+import re  # import re for tokenizing the text columns
+from functools import lru_cache  # import lru_cache for hashing each token once across batches
+
+import numpy as np
+
+# the models compiled into a linear artifact, as the prefixes of their arrays
+MODELS = ['classifier', 'regressor']
+
+# the pattern of the tokens of the text columns, as used by the HashingVectorizers of the models (words of 2+ characters)
+TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+
+# the mask of an unsigned 32 bit integer, for the murmurhash of the tokens
+MASK_32 = 0xffffffff
+
+
+def murmurhash3_32(data, seed=0):
+    """function for the signed 32 bit MurmurHash3 (x86) of some bytes, as sklearn hashes the tokens of the text
+
+    Args:
+        data (bytes): the bytes to hash
+        seed (int): the seed of the hash
+
+    Returns:
+        h (int): the signed hash
+
+    """
+    def rotl(x, r):
+        return ((x << r) | (x >> (32 - r))) & MASK_32
+
+    def mix(k):
+        return (rotl((k * 0xcc9e2d51) & MASK_32, 15) * 0x1b873593) & MASK_32
+
+    h = seed & MASK_32
+    num_blocks = len(data) // 4
+    for i in range(num_blocks):
+        h = (rotl(h ^ mix(int.from_bytes(data[4 * i:4 * i + 4], 'little')), 13) * 5 + 0xe6546b64) & MASK_32
+
+    # the remaining 1 to 3 bytes
+    tail = data[4 * num_blocks:]
+    if len(tail) > 0:
+        h ^= mix(int.from_bytes(tail, 'little'))
+
+    # the finalization
+    h ^= len(data)
+    h ^= h >> 16
+    h = (h * 0x85ebca6b) & MASK_32
+    h ^= h >> 13
+    h = (h * 0xc2b2ae35) & MASK_32
+    h ^= h >> 16
+
+    return h - (1 << 32) if h >= (1 << 31) else h
+
+
+@lru_cache(maxsize=2 ** 16)
+def hashed_index(token, n_features):
+    """function for the column a token is hashed into, as by sklearn's HashingVectorizer"""
+    h = murmurhash3_32(token.encode('utf-8'))
+    if h == -(1 << 31):
+        return (2147483647 - (n_features - 1)) % n_features
+    return abs(h) % n_features
+
+
+class LinearPredictor(object):
+    """A linear model compiled from a fitted pipeline (see train_model.compile_linear_model), predicting with numpy alone
+
+    The one hot encoding is applied as a lookup of the coefficient of each category (unknown categories add nothing,
+    as with handle_unknown='ignore'), the standard scaling and dot product of the numerical columns as a single
+    matrix product, and the hashed tokens of the text columns as a lookup of the coefficient of the column each
+    distinct token of a row hashes to (summed once per distinct text), so no design matrix is built. Inputs are
+    anything indexable by column name (a pandas DataFrame or a dict of arrays), and every method is vectorized over
+    the rows.
+    """
+
+    def __init__(self, arrays):
+        self.cat_columns = [str(column) for column in arrays['cat_columns']]
+        self.cat_values = [arrays['cat_values_{}'.format(i)] for i in range(len(self.cat_columns))]
+        self.cat_coef = [arrays['cat_coef_{}'.format(i)] for i in range(len(self.cat_columns))]
+        self.num_columns = [str(column) for column in arrays['num_columns']]
+        self.num_mean = arrays.get('num_mean', np.array([]))
+        self.num_scale = arrays.get('num_scale', np.array([]))
+        self.num_coef = arrays.get('num_coef', np.array([]))
+        self.text_columns = [str(column) for column in arrays.get('text_columns', [])]
+        self.text_coef = [arrays['text_coef_{}'.format(i)] for i in range(len(self.text_columns))]
+        self.intercept = float(arrays['intercept'])
+        self.classes_ = arrays['classes'] if 'classes' in arrays and len(arrays['classes']) > 0 else None
+
+    def decision_function(self, frame):
+        """function for the linear score of each row (the log odds of the second class for a classifier)"""
+        z = np.full(len(frame[(self.num_columns + self.cat_columns + self.text_columns)[0]]), self.intercept)
+
+        # look up the coefficient of the category of each row, the categories being sorted as strings
+        for column, values, coef in zip(self.cat_columns, self.cat_values, self.cat_coef):
+            if len(values) == 0:
+                continue
+            given = np.asarray(frame[column]).astype(str)
+            position = np.minimum(np.searchsorted(values, given), len(values) - 1)
+            z += np.where(values[position] == given, coef[position], 0.0)
+
+        if self.num_columns:
+            X = np.column_stack([np.asarray(frame[column], dtype=np.float64) for column in self.num_columns])
+            z += ((X - self.num_mean) / self.num_scale) @ self.num_coef
+
+        # sum the coefficients of the distinct hashed columns of the tokens of each row (tokens that collide counting
+        # once, as the vectorizer is binary), tokenizing each distinct text once
+        pattern = re.compile(TOKEN_PATTERN)
+        for column, coef in zip(self.text_columns, self.text_coef):
+            texts, codes = np.unique(np.asarray(frame[column]).astype(str), return_inverse=True)
+            text_coef = np.zeros(len(texts))
+            for i, text in enumerate(texts):
+                hashed = set(hashed_index(token, len(coef)) for token in pattern.findall(text.lower()))
+                text_coef[i] = coef[np.array(list(hashed), dtype=np.intp)].sum()
+            z += text_coef[codes.ravel()]
+
+        return z
+
+    def predict_proba(self, frame):
+        """function for the probability of each class of each row, as in LogisticRegression.predict_proba"""
+        p = 1.0 / (1.0 + np.exp(-self.decision_function(frame)))
+        return np.column_stack([1.0 - p, p])
+
+    def predict(self, frame):
+        """function for the predicted class (for a classifier) or value (for a regressor) of each row"""
+        z = self.decision_function(frame)
+        if self.classes_ is None:
+            return z
+        return self.classes_[(z > 0).astype(int)]
+
+
+def load_linear_models(source):
+    """function for loading the classifier and regressor of a linear artifact
+
+    Args:
+        source (str or bytes): the path of the artifact, or its bytes
+
+    Returns:
+        classifier (LinearPredictor): the compiled classification model
+        regressor (LinearPredictor): the compiled regression model
+
+    """
+    with np.load(io.BytesIO(source) if isinstance(source, bytes) else source) as artifact:
+        arrays = {key: artifact[key] for key in artifact.files}
+
+    return tuple(LinearPredictor({key.split('.', 1)[1]: value for key, value in arrays.items()
+                                  if key.startswith(model + '.')}) for model in MODELS)
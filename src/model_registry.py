@@ -0,0 +1,516 @@
+import os
+import sys  # import sys for getting arguments from the command line call
+sys.path.append(os.environ.get('PYTHONPATH'))
+import argparse  # import argparse for getting arguments from the command line
+import yaml  # import yaml for pulling config file
+from datetime import datetime  # import datetime for the dates of the versions
+import io  # import io for handing the artifacts to and from s3
+import json  # import json for the metrics of the versions
+import shutil  # import shutil for clearing a partially written version
+import hashlib  # import hashlib for the content hash of the artifacts
+import logging.config  # import logging config
+
+import pandas as pd
+import joblib  # import joblib for storing the models with their arrays memory-mappable
+import boto3
+from sqlalchemy import Column, String, Integer, DATETIME, Text  # import needed sqlalchemy libraries for db
+from sqlalchemy.ext.declarative import declarative_base  # import for declaring classes
+from sqlalchemy import text, bindparam, inspect  # import for updating the status of the versions and selecting them
+
+configPath = os.path.join("config", "logging", "local.conf")
+logging.config.fileConfig(configPath)
+logger = logging.getLogger("model_registry_log")
+
+from src.helpers.helpers import get_engine_from_config  # import helper for creating an engine
+from src.run_state import table_hash  # import helper for the watermark of the training data
+from src.linear_predictor import load_linear_models  # import for loading the numpy artifact of linear models
+
+# the artifacts saved for each version of the models, and the optional numpy artifact of linear models
+ARTIFACTS = ['classifier', 'regressor']
+LINEAR_ARTIFACT = 'linear'
+
+# the models already loaded in this process, by version and content hash, so each version (the current one and the
+# challengers scored next to it) is only read once
+_loaded_models = {}
+
+
+def create_registry_table(engine):
+    """function for creating a model_registry table in a database
+
+    Given a database connection engine, access the database and create a model_registry table, which holds a record
+    of each version of the models: where its artifacts are, what it was trained on, its metrics, the hash of its
+    artifacts, whether it is the current version, and the version it replaced as current (which rollbacks walk back).
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        None
+
+    """
+    # check if the model_registry table already exists, stop execution if it does
+    if 'model_registry' in engine.table_names():
+        logger.debug('model_registry table already exists')
+        add_previous_versions(engine)
+
+    else:
+        logger.debug("Creating a model_registry table at %s", engine.url)
+
+        Base = declarative_base()
+
+        # create a model version class, one row per version of the models
+        class ModelVersion(Base):
+            """Create a data model for the model_registry table """
+            __tablename__ = 'model_registry'
+            version = Column(Integer(), primary_key=True)
+            createdDate = Column(DATETIME(), unique=False, nullable=False)
+            status = Column(String(10), unique=False, nullable=False)
+            promotedDate = Column(DATETIME(), unique=False, nullable=True)
+            previousVersion = Column(Integer(), unique=False, nullable=True)
+            modelType = Column(String(20), unique=False, nullable=False)
+            location = Column(String(255), unique=False, nullable=False)
+            locationType = Column(String(10), unique=False, nullable=False)
+            dataWatermark = Column(String(64), unique=False, nullable=True)
+            vocabularyVersion = Column(Integer(), unique=False, nullable=True)
+            metrics = Column(Text(), unique=False, nullable=True)
+            contentHash = Column(String(64), unique=False, nullable=False)
+
+            def __repr__(self):
+                return '<ModelVersion %r>' % self.version
+
+        try:
+            # create the table
+            Base.metadata.create_all(engine)
+            logger.info("Created table model_registry")
+        except Exception as e:
+            logger.error("Could not create the model_registry table: %s", e)
+
+
+def add_previous_versions(engine):
+    """function for adding the previousVersion column to a model_registry table created without it
+
+    The previous version of each promoted version is backfilled from the order of the promotions, which is the chain
+    of promotions as long as no version was rolled back to.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        None
+
+    """
+    if 'previousVersion' in [column['name'] for column in inspect(engine).get_columns('model_registry')]:
+        return
+
+    with engine.begin() as connection:
+        connection.execute('ALTER TABLE model_registry ADD COLUMN previousVersion INTEGER')
+        promoted = [row[0] for row in connection.execute(
+            'SELECT version FROM model_registry WHERE promotedDate IS NOT NULL ORDER BY promotedDate')]
+        for previous, version in zip(promoted[:-1], promoted[1:]):
+            connection.execute(text('UPDATE model_registry SET previousVersion = :previous WHERE version = :version'),
+                               previous=previous, version=version)
+
+    logger.info('Added the previousVersion column to model_registry')
+
+
+def artifact_bytes(model, compress):
+    """helper function for serializing a model with joblib, which stores its numpy arrays so they can be memory-mapped"""
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer, compress=compress)
+    return buffer.getvalue()
+
+
+def content_hash(artifacts):
+    """helper function for hashing the bytes of the artifacts of a version, in the order of ARTIFACTS (then the linear
+    artifact, if the version has one)"""
+    digest = hashlib.sha256()
+    for name in ARTIFACTS + ([LINEAR_ARTIFACT] if LINEAR_ARTIFACT in artifacts else []):
+        digest.update(artifacts[name])
+    return digest.hexdigest()
+
+
+def artifact_file(name):
+    """helper function for the file name of an artifact"""
+    return name + ('.npz' if name == LINEAR_ARTIFACT else '.joblib')
+
+
+def register_models(engine, classifier, regressor, model_location, location_type, model_type, metrics=None,
+                    linear_artifact=None, promote=True):
+    """function for saving a new version of the models and recording it in the registry
+
+    Locally the artifacts are stored uncompressed, so their arrays can be memory-mapped when loaded, and are written
+    to a temporary folder that is renamed into place, so a version is never seen half written. In s3, where the
+    artifacts are downloaded whole, they are compressed. The version is recorded with the watermark of the features
+    and the version of the vocabulary it was trained with, its metrics, and the hash of its artifacts.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        classifier (Model object): a trained classification model
+        regressor (Model object): a trained regression model
+        model_location (str): the local folder or s3 bucket of the models
+        location_type (str): 'local' or 's3'
+        model_type (str): the type of the models
+        metrics (dict): the metrics of the models
+        linear_artifact (bytes): the numpy artifact of the models (from train_model.export_linear_models), if they
+            are linear
+        promote (bool): whether to make the new version the current one
+
+    Returns:
+        version (int): the version of the models
+
+    """
+    create_registry_table(engine)
+
+    with engine.connect() as connection:
+        version = (connection.execute('SELECT MAX(version) FROM model_registry').scalar() or 0) + 1
+
+    compress = 0 if location_type == 'local' else 3
+    artifacts = {'classifier': artifact_bytes(classifier, compress), 'regressor': artifact_bytes(regressor, compress)}
+    if linear_artifact is not None:
+        artifacts[LINEAR_ARTIFACT] = linear_artifact
+    digest = content_hash(artifacts)
+
+    if location_type == 'local':
+        location = os.path.join(model_location, 'registry', 'v{}'.format(version))
+        partial = location + '.partial'
+        shutil.rmtree(partial, ignore_errors=True)
+        os.makedirs(partial)
+        for name in artifacts:
+            with open(os.path.join(partial, artifact_file(name)), 'wb') as f:
+                f.write(artifacts[name])
+        os.replace(partial, location)
+
+    else:
+        location = 'models/registry/v{}'.format(version)
+        s3 = boto3.resource('s3')
+        for name in artifacts:
+            response = s3.Object(model_location, '{}/{}'.format(location, artifact_file(name))).put(Body=artifacts[name])
+            logger.debug("%s of version %s uploaded as %s", name, version, response["ETag"])
+        location = '{}/{}'.format(model_location, location)
+
+    vocabulary_version = None
+    if 'feature_vocabulary' in engine.table_names():
+        with engine.connect() as connection:
+            vocabulary_version = connection.execute('SELECT MAX(version) FROM feature_vocabulary').scalar()
+
+    with engine.begin() as connection:
+        connection.execute(text('INSERT INTO model_registry (version, createdDate, status, modelType, location, '
+                                'locationType, dataWatermark, vocabularyVersion, metrics, contentHash) VALUES '
+                                '(:version, :createdDate, :status, :modelType, :location, :locationType, '
+                                ':dataWatermark, :vocabularyVersion, :metrics, :contentHash)'),
+                           version=version, createdDate=datetime.now(), status='candidate', modelType=model_type,
+                           location=location, locationType=location_type,
+                           dataWatermark=table_hash(engine, 'features', 'id'), vocabularyVersion=vocabulary_version,
+                           metrics=json.dumps(metrics) if metrics is not None else None, contentHash=digest)
+
+    logger.info('Registered version %s of the %s models at %s', version, model_type, location)
+
+    if promote:
+        promote_version(engine, version)
+
+    return version
+
+
+def promote_version(engine, version, rollback=False):
+    """function for making a version of the models the current one
+
+    The previous current version is retired and the new one made current in a single transaction, so there is always
+    exactly one current version. The version replaced is recorded as the previous version of the new one, except on a
+    rollback, where the version rolled back to keeps its own previous version, so a further rollback goes further back.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        version (int): the version to promote
+        rollback (bool): whether the version is promoted by a rollback
+
+    Returns:
+        None
+
+    """
+    with engine.begin() as connection:
+        if connection.execute(text('SELECT COUNT(*) FROM model_registry WHERE version = :version'),
+                              version=version).scalar() == 0:
+            logger.error('There is no version %s of the models to promote', version)
+            sys.exit()
+
+        current = connection.execute("SELECT version FROM model_registry WHERE status = 'current'").scalar()
+        connection.execute("UPDATE model_registry SET status = 'retired' WHERE status = 'current'")
+        connection.execute(text("UPDATE model_registry SET status = 'current', promotedDate = :promotedDate "
+                                "WHERE version = :version"), promotedDate=datetime.now(), version=version)
+        if not rollback and current is not None and current != version:
+            connection.execute(text('UPDATE model_registry SET previousVersion = :previous WHERE version = :version'),
+                               previous=current, version=version)
+
+    logger.info('Promoted version %s of the models to current', version)
+
+
+def rollback_version(engine):
+    """function for making the version of the models that was current before the current one current again
+
+    The rollback follows the previous versions recorded by promote_version, so rolling back again keeps walking back
+    along the promotions rather than returning to the version just rolled back from.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        version (int): the version rolled back to
+
+    """
+    with engine.connect() as connection:
+        previous = connection.execute("SELECT previousVersion FROM model_registry WHERE status = 'current'").scalar()
+
+    if previous is None:
+        logger.error('There is no previously promoted version of the models to roll back to')
+        sys.exit()
+
+    promote_version(engine, previous, rollback=True)
+    return previous
+
+
+def get_current_version(engine):
+    """function for getting the record of the current version of the models
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        record (dict): the columns of the model_registry row of the current version, or None if there is none
+
+    """
+    if 'model_registry' not in engine.table_names():
+        return None
+
+    with engine.connect() as connection:
+        row = connection.execute("SELECT * FROM model_registry WHERE status = 'current'").first()
+
+    return dict(row) if row is not None else None
+
+
+def list_versions(engine):
+    """function for listing every version of the models in the registry, newest first"""
+    if 'model_registry' not in engine.table_names():
+        return pd.DataFrame()
+
+    return pd.read_sql('SELECT * FROM model_registry ORDER BY version DESC', engine)
+
+
+def read_artifacts(record):
+    """function for reading the bytes of the artifacts of a version, checking them against the hash of the version
+
+    Args:
+        record (dict): the model_registry row of the version
+
+    Returns:
+        artifacts (dict): the bytes of each artifact of the version, by name
+
+    """
+    artifacts = {}
+    if record['locationType'] == 'local':
+        for name in ARTIFACTS + [LINEAR_ARTIFACT]:
+            path = os.path.join(record['location'], artifact_file(name))
+            if name in ARTIFACTS or os.path.exists(path):
+                with open(path, 'rb') as f:
+                    artifacts[name] = f.read()
+    else:
+        bucket, prefix = record['location'].split('/', 1)
+        s3 = boto3.resource('s3')
+        for name in ARTIFACTS + [LINEAR_ARTIFACT]:
+            try:
+                artifacts[name] = s3.Object(bucket, '{}/{}'.format(prefix, artifact_file(name))).get()['Body'].read()
+            except s3.meta.client.exceptions.NoSuchKey:
+                if name in ARTIFACTS:
+                    raise
+
+    if content_hash(artifacts) != record['contentHash']:
+        logger.error('The artifacts of version %s of the models do not match its hash', record['version'])
+        sys.exit()
+
+    return artifacts
+
+
+def check_local_artifacts(record, chunk_size=1 << 20):
+    """function for checking the local artifacts of a version against the hash of the version without reading them
+    into memory
+
+    The files are hashed in chunks, so checking a version before memory-mapping its artifacts doesn't hold a copy of
+    them.
+
+    Args:
+        record (dict): the model_registry row of a version stored locally
+        chunk_size (int): the number of bytes of the files to hash at a time
+
+    Returns:
+        names (list): the names of the artifacts of the version
+
+    """
+    names = [name for name in ARTIFACTS + [LINEAR_ARTIFACT]
+             if name in ARTIFACTS or os.path.exists(os.path.join(record['location'], artifact_file(name)))]
+
+    # hashed in the same order as content_hash
+    digest = hashlib.sha256()
+    for name in names:
+        with open(os.path.join(record['location'], artifact_file(name)), 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+
+    if digest.hexdigest() != record['contentHash']:
+        logger.error('The artifacts of version %s of the models do not match its hash', record['version'])
+        sys.exit()
+
+    return names
+
+
+def load_version(record, mmap=True):
+    """function for loading the models of a version, checking their artifacts against the hash of the version
+
+    Local artifacts are memory-mapped unless mmap is False (memory-mapped arrays are read only, so models that are
+    updated in place should be loaded without it). The models of each version are cached in the process, so loading
+    the same version again doesn't read it again.
+
+    Args:
+        record (dict): the model_registry row of the version
+        mmap (bool): whether to memory-map the arrays of local artifacts
+
+    Returns:
+        classifier (Model object): the trained classification model
+        regressor (Model object): the trained regression model
+
+    """
+    key = (record['version'], record['contentHash'], mmap)
+    if key in _loaded_models:
+        return _loaded_models[key]
+
+    # memory-mapped artifacts are checked in chunks and then mapped from their files, the others are read (and
+    # checked) whole and loaded from their bytes
+    if record['locationType'] == 'local' and mmap:
+        check_local_artifacts(record)
+        models = tuple(joblib.load(os.path.join(record['location'], artifact_file(name)), mmap_mode='r')
+                       for name in ARTIFACTS)
+    else:
+        artifacts = read_artifacts(record)
+        models = tuple(joblib.load(io.BytesIO(artifacts[name])) for name in ARTIFACTS)
+
+    logger.info('Loaded version %s of the models from %s', record['version'], record['location'])
+    _loaded_models[key] = models
+
+    return models
+
+
+def load_current_models(engine, mmap=True):
+    """function for loading the current version of the models
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        mmap (bool): whether to memory-map the arrays of local artifacts
+
+    Returns:
+        models (tuple): the trained classification and regression models, or None if there is no current version
+
+    """
+    record = get_current_version(engine)
+    if record is None:
+        return None
+
+    return load_version(record, mmap)
+
+
+def load_candidate_models(engine, versions, mmap=True):
+    """function for loading a set of versions of the models, to score as challengers next to the current one
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        versions (list): the versions of the models to load, versions missing from the registry are skipped
+        mmap (bool): whether to memory-map the arrays of local artifacts
+
+    Returns:
+        models (dict): the trained classification and regression models of each of the versions, by version
+
+    """
+    if 'model_registry' not in engine.table_names() or len(versions) == 0:
+        return {}
+
+    query = text("SELECT * FROM model_registry WHERE version IN :versions ORDER BY version").bindparams(
+        bindparam('versions', expanding=True))
+    with engine.connect() as connection:
+        records = [dict(row) for row in connection.execute(query, versions=[int(version) for version in versions])]
+
+    missing = set(int(version) for version in versions) - set(record['version'] for record in records)
+    if len(missing) > 0:
+        logger.warning('Versions %s of the models are not in the registry, not loading them', sorted(missing))
+
+    return {record['version']: load_version(record, mmap) for record in records}
+
+
+def load_current_linear_models(engine):
+    """function for loading the numpy artifact of the current version of the models, if it has one
+
+    The compiled models only need numpy to predict, so they load in milliseconds without importing sklearn.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        models (tuple): the classification and regression LinearPredictors, or None if the current version has no
+            linear artifact (or there is no current version)
+
+    """
+    record = get_current_version(engine)
+    if record is None:
+        return None
+
+    key = (record['version'], record['contentHash'], LINEAR_ARTIFACT)
+    if key not in _loaded_models:
+        # locally only the linear artifact is read, the others being hashed in chunks
+        if record['locationType'] == 'local':
+            if LINEAR_ARTIFACT not in check_local_artifacts(record):
+                return None
+            with open(os.path.join(record['location'], artifact_file(LINEAR_ARTIFACT)), 'rb') as f:
+                artifacts = {LINEAR_ARTIFACT: f.read()}
+        else:
+            artifacts = read_artifacts(record)
+        if LINEAR_ARTIFACT not in artifacts:
+            return None
+        _loaded_models[key] = load_linear_models(artifacts[LINEAR_ARTIFACT])
+        logger.info('Loaded the linear artifact of version %s of the models', record['version'])
+
+    return _loaded_models[key]
+
+
+def run_registry(args):
+    """runs the listing, promotion, or rollback of the versions of the models"""
+    try:  # opens the specified config file
+        with open(args.config, "r") as f:
+            config = yaml.load(f, Loader=yaml.Loader)
+    except Exception as e:
+        logger.error('Error loading the config file: %s, be sure you specified a config.yml file', e)
+        sys.exit()
+
+    # create the engine for the database and type
+    engine = get_engine_from_config(config, args.type, args.database_name)
+    create_registry_table(engine)
+
+    if args.promote is not None:
+        promote_version(engine, int(args.promote))
+    elif args.rollback:
+        rollback_version(engine)
+
+    versions = list_versions(engine).drop(columns=['metrics'], errors='ignore')
+    logger.info('Model versions:\n%s', versions.to_string(index=False))
+
+
+if __name__ == '__main__':
+    logger.debug('Start of model_registry script')
+
+    # if this code is run as a script, then parse arguments for the location of the config and, optionally, the type and location of the db
+    parser = argparse.ArgumentParser(description="manage the versions of the models")
+    parser.add_argument('--config', help='path to yaml file with configurations')
+    parser.add_argument('--type', default=None, help="type of database, 'sqlite' or 'mysql+pymysql'")
+    parser.add_argument('--database_name', default=None, help="location of the database (including name.db)")
+    parser.add_argument('--promote', default=None, help='version of the models to make current')
+    parser.add_argument('--rollback', action='store_true', help='make the previously current version current again')
+
+    args = parser.parse_args()
+
+    # run the registry command based on the parsed arguments
+    run_registry(args)
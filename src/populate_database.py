@@ -16,8 +16,9 @@ configPath = os.path.join("config","logging","local.conf")
 logging.config.fileConfig(configPath)
 logger = logging.getLogger("populate_database_log")
 
-from src.helpers.helpers import API_request, set_headers, create_db_engine  # import helper functions for API requests, headers setting, and creating a DB engine
+from src.helpers.helpers import API_request, set_headers, create_db_engine, get_engine_options  # import helper functions for API requests, headers setting, and creating a DB engine
 from src.helpers.helpers import create_event, create_venue, create_frmat, create_category  # import helper functions for DB creation
+from src.event_velocity import update_event_velocity  # import the upkeep of the pull counters
 
 
 def initial_populate_format_categories(engine, frmats_URL, categories_URL, headers=None):
@@ -209,6 +210,9 @@ def initial_populate_events_venues(engine, raw_data_location, location_type):
                     # load the output of the body as a dictionary
                     output = json.loads(body)
 
+                    # count this pull in the counters of its events
+                    update_event_velocity(engine, output['events'], output['PullTime'])
+
                     # for each event in the events list of the output, create an event and venue and add to the list of objects to add
                     for event in output['events']:
                         # if the event id isn't in the current list, add it
@@ -265,6 +269,9 @@ def initial_populate_events_venues(engine, raw_data_location, location_type):
                     # load the output of the body as a dictionary
                     output = json.loads(body)
 
+                    # count this pull in the counters of its events
+                    update_event_velocity(engine, output['events'], output['PullTime'])
+
                     # for each event in the events list of the output, create an event and venue and add to the list of objects to add
                     for event in output['events']:
                         # if the event id isn't in the current list, add it
@@ -342,7 +349,7 @@ def run_populate(args):
             sys.exit()
 
         # create the engine for the database and type
-        engine = create_db_engine(db_name, type)
+        engine = create_db_engine(db_name, type, **get_engine_options(config))
 
         # if no database_name argument was passed, then look for it in the config file
         if "populate_database" in config and "initial_populate_format_categories" in config["populate_database"]:
@@ -388,7 +395,7 @@ def run_populate(args):
             sys.exit()
 
         # create the engine for the database and type
-        engine = create_db_engine(db_name, type)
+        engine = create_db_engine(db_name, type, **get_engine_options(config))
 
 
         if "populate_database" in config and "initial_populate_format_categories" in config["populate_database"]:
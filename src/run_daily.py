@@ -0,0 +1,298 @@
+import os
+import sys  # import sys for getting arguments from the command line call
+sys.path.append(os.environ.get('PYTHONPATH'))
+import argparse  # import argparse for getting arguments from the command line
+import yaml  # import yaml for pulling config file
+import time  # import time for timing each of the stages
+from datetime import datetime  # import datetime for the run dates
+import logging.config  # import logging config
+
+# the stage modules are imported before this module's logger is created, as each of them reloads the logging config
+from src.helpers.helpers import get_engine_from_config, set_headers, pull_features, pull_scores, \
+    pull_model_scores  # import helpers for the engine, API headers, and pulling features and scores
+from src.helpers.helpers import set_column_types, add_sell_out_stats, add_velocity_features, add_text_features, FEATURE_TYPES  # import helpers for the sell out statistics, pull counters, text, and compact types of the features
+from src.update_database import update_format_categories, update_events_venues  # import the update stage
+from src.generate_features import generate_features  # import the features stage
+from src.feature_snapshots import point_in_time_features  # import the point in time inputs of the training stage
+from src.train_model import train_or_update_models, load_saved_models, export_linear_models  # import the training stage
+from src.model_registry import register_models  # import the registry the trained models are saved in
+from src.score_model import create_scores_table, score_champion_challengers, challenger_versions, get_models  # import the scoring stage
+from src.archive_data import archive_events  # import the archiving stage
+from src.compact_scores import compact_scores  # import the scores compaction stage
+from src.evaluate_model import evaluate_models, compare_models, save_results_local, \
+    save_results_s3  # import the evaluation stage
+from src.run_state import create_runs_table, code_version, last_fingerprint, record_run  # import the run-state tracking
+from src.run_state import hash_parts, table_hash, raw_data_watermark, events_watermark  # import the stage fingerprints
+
+configPath = os.path.join("config", "logging", "local.conf")
+logging.config.fileConfig(configPath)
+logger = logging.getLogger("run_daily_log")
+
+
+def run_stage(name, timings, engine, fingerprint, force, function, *args, **kwargs):
+    """helper function for running a single stage of the daily pipeline and recording how long it took
+
+    The stage is skipped when the last successful run of it had the same input fingerprint and code version, unless
+    force is set. Every run, skipped or not, is recorded in the pipeline_runs table.
+
+    Args:
+        name (str): the name of the stage, used for logging and as the key of the timings
+        timings (dict): a dictionary of stage names to seconds taken, which the stage's time is added to
+        engine (SQLAlchemy engine): the engine for working with the database holding the pipeline_runs table
+        fingerprint (str): the fingerprint of the inputs of the stage
+        force (bool): whether to run the stage even if its inputs and code are unchanged
+        function (function): the stage function to run
+        *args, **kwargs: the arguments to pass to the stage function
+
+    Returns:
+        ran (bool): whether the stage was run (False if it was skipped)
+        result: whatever the stage function returns, or None if it was skipped
+
+    """
+    version = code_version(name)
+    start_date = datetime.now()
+
+    # skip the stage if nothing it depends on has changed since it last succeeded
+    if not force and last_fingerprint(engine, name) == (fingerprint, version):
+        logger.info('Skipping the %s stage, its inputs and code are unchanged', name)
+        record_run(engine, name, fingerprint, version, 'skipped', start_date)
+        timings[name] = 0.0
+        return False, None
+
+    logger.info('Starting the %s stage', name)
+    start = time.perf_counter()
+
+    try:
+        result = function(*args, **kwargs)
+    except BaseException:
+        # record the failure (including a sys.exit within the stage) before passing it on
+        record_run(engine, name, fingerprint, version, 'failed', start_date)
+        raise
+
+    timings[name] = time.perf_counter() - start
+    record_run(engine, name, fingerprint, version, 'success', start_date)
+    logger.info('Finished the %s stage in %.2f seconds', name, timings[name])
+
+    return True, result
+
+
+def update_stage(engine, config, headers=None):
+    """runs the update of the formats and categories (if headers are given) and the events and venues"""
+    # if headers were built, then also update the formats and categories
+    if headers is not None:
+        update_format_categories(engine, headers=headers, **config['update_database']['update_format_categories'])
+
+    update_events_venues(engine, **config['update_database']['update_events_venues'])
+
+
+def features_stage(engine, full_rebuild=False, sql_pushdown=False, chunk_size=None, refresh_vocabulary=False,
+                   min_events=10):
+    """runs the features generation and saving, returning the features in the form pulled for training"""
+    features, full = generate_features(engine, full_rebuild, sql_pushdown, chunk_size, refresh_vocabulary,
+                                       min_events)
+
+    # an incremental or chunked generation doesn't return every feature, and once events have been archived the
+    # following stages need the archived features as well, so in any of those cases the full set is pulled
+    if features is None or not full or 'features_archive' in engine.table_names():
+        return pull_features(engine)
+
+    # match the columns and types of those returned by pull_features, so the next stages don't need to re-read the table
+    return set_column_types(add_text_features(engine, add_velocity_features(engine, add_sell_out_stats(engine, features))),
+                            FEATURE_TYPES)
+
+
+def train_stage(engine, features, model_type, model_location, location_type, as_of_days, incremental=False,
+                full_retrain_days=None, cache_location=None):
+    """runs the model training (or incremental update of the current models) and registering, returning the fit models"""
+    if as_of_days is not None:
+        features = point_in_time_features(engine, features, as_of_days)
+
+    models = load_saved_models(engine, model_location, location_type) if incremental else None
+    classifier, regressor, mode, metrics = train_or_update_models(engine, model_type, features, models,
+                                                                  full_retrain_days, cache_location=cache_location)
+
+    register_models(engine, classifier, regressor, os.path.join(model_location), location_type, model_type, metrics,
+                    export_linear_models(classifier, regressor))
+
+    return classifier, regressor
+
+
+def score_stage(engine, classifier, regressor, features, cache_location=None, challengers=None):
+    """runs the scoring of future events with the fit models (and the challengers) and saves the scores"""
+    create_scores_table(engine)
+
+    return score_champion_challengers(engine, classifier, regressor, features, cache_location, challengers)
+
+
+def evaluate_stage(engine, features, save_location, location_type):
+    """runs the evaluation of all saved scores (and the comparison of any model versions scored side by side) against
+    the current features and saves the results"""
+    # the full history of scores is needed for the evaluation, not only today's
+    scores = pull_scores(engine)
+
+    # nothing to evaluate before any events are scored
+    if scores.shape[0] == 0:
+        logger.info('No scores to evaluate yet')
+        return None
+
+    results = evaluate_models(features, scores)
+
+    # compare the model versions scored side by side, if there are any
+    comparison = compare_models(features, pull_model_scores(engine))
+
+    if location_type == 'local':
+        save_results_local(results, os.path.join(save_location))
+        if comparison.shape[0] > 0:
+            save_results_local(comparison, os.path.join(save_location), 'comparison.csv')
+    else:
+        save_results_s3(results, save_location)
+        if comparison.shape[0] > 0:
+            save_results_s3(comparison, save_location, 'comparison.csv')
+
+    return results
+
+
+def run_daily(args):
+    """runs the update, features, training, archiving, scoring, compaction, and evaluation stages in a single process
+
+    The engine is built once, and the features and fit models are handed directly from each stage to the next
+    rather than re-read from the database or model location. Each stage still persists its outputs. A stage whose
+    input fingerprint and code version match its last successful run is skipped, unless args.force is set.
+    """
+    try:  # opens the specified config file
+        with open(args.config, "r") as f:
+            config = yaml.load(f, Loader=yaml.Loader)
+    except Exception as e:
+        logger.error('Error loading the config file: %s, be sure you specified a config.yml file', e)
+        sys.exit()
+
+    # check that the sections needed by each stage are in the config before anything is run
+    for section, key in [("update_database", "update_events_venues"), ("model_info", "model_type"),
+                         ("model_info", "model_location"), ("model_info", "location_type"),
+                         ("archive_data", "archive_days"), ("compact_scores", "retention_days"), ("compact_scores", "lead_times"),
+                         ("evaluate_model", "save_location"), ("evaluate_model", "location_type")]:
+        if section not in config or key not in config[section]:
+            logger.error('%s must be set under %s in the config file', key, section)
+            sys.exit()
+
+    for section in ["model_info", "evaluate_model"]:
+        if config[section]["location_type"] not in ['local', 's3']:
+            logger.error('location type must be "s3" or "local"')
+            sys.exit()
+
+    # the API headers are only needed when the formats and categories are also being updated
+    headers = None
+    if args.formats_cats:
+        if "update_database" not in config or "update_format_categories" not in config["update_database"]:
+            logger.error('update_format_categories must be passed in the config file')
+            sys.exit()
+
+        if args.API_token is not None:
+            headers = set_headers(args.API_token)
+        elif "ingest_data" in config and "API_token" in config["ingest_data"]:
+            headers = set_headers(config["ingest_data"]["API_token"])
+        else:
+            headers = set_headers()
+
+    # create the engine once for all of the stages, along with the table recording their runs
+    engine = get_engine_from_config(config, args.type, args.database_name)
+    create_runs_table(engine)
+
+    model_info = config["model_info"]
+    model_type = args.model_type if args.model_type is not None else model_info["model_type"]
+
+    timings = {}
+    start = time.perf_counter()
+
+    # the update depends on the raw data that has landed
+    update_fingerprint = raw_data_watermark(**config['update_database']['update_events_venues'])
+    run_stage('update', timings, engine, update_fingerprint, args.force, update_stage, engine, config, headers)
+
+    # the features depend on the state of the events and venues, and on a refresh of the vocabulary
+    features_info = config.get("generate_features", {})
+    watermark = hash_parts(events_watermark(engine), args.refresh_vocabulary)
+    ran, features = run_stage('features', timings, engine, watermark, args.force, features_stage, engine,
+                              args.full_rebuild, features_info.get("sql_pushdown", False),
+                              features_info.get("chunk_size", None), args.refresh_vocabulary,
+                              features_info.get("vocabulary_min_events", 10))
+    if not ran:
+        features = pull_features(engine)
+
+    # the models depend on the features (along with the sell out statistics and pull counters added to them when they
+    # are loaded), the set of events already in the past, the type of model, and the point in time of their inputs
+    features_fingerprint = table_hash(engine, 'features', 'id')
+    loaded_fingerprint = hash_parts(table_hash(engine, 'sell_out_stats', 'kind, name, endDay'),
+                                    table_hash(engine, 'event_velocity', 'id'))
+    num_past_events = int((features['startDate'] < datetime.today()).sum())
+    as_of_days = model_info.get("as_of_days", None)
+    train_fingerprint = hash_parts(features_fingerprint, loaded_fingerprint, num_past_events, model_type, as_of_days,
+                                   args.incremental)
+    ran, models = run_stage('train', timings, engine, train_fingerprint, args.force, train_stage, engine, features,
+                            model_type, model_info["model_location"], model_info["location_type"], as_of_days,
+                            args.incremental, model_info.get("incremental", {}).get("full_retrain_days", None),
+                            model_info.get("design_cache", None))
+    if not ran:
+        models = get_models(engine, model_info["model_location"], model_info["location_type"],
+                            linear=model_info.get("linear_inference", False))
+    classifier, regressor = models
+
+    # the archiving runs once the events have their features and the models are trained on them, and depends on the
+    # day (which events have expired) and the features generated
+    archive_days = config["archive_data"]["archive_days"]
+    archive_fingerprint = hash_parts(datetime.today().date(), features_fingerprint, archive_days)
+    run_stage('archive', timings, engine, archive_fingerprint, args.force, archive_events, engine, archive_days)
+
+    # the scores depend on the day (scores are kept per day), the features and the models, and the versions of the
+    # models scored as challengers
+    challengers = challenger_versions(model_info)
+    score_fingerprint = hash_parts(datetime.today().date(), features_fingerprint, train_fingerprint, challengers)
+    run_stage('score', timings, engine, score_fingerprint, args.force, score_stage, engine, classifier, regressor,
+              features, model_info.get("design_cache", None), challengers)
+
+    # the compaction depends on the day (which scores have expired) and the scores written
+    compact_info = config["compact_scores"]
+    compact_fingerprint = hash_parts(datetime.today().date(), score_fingerprint, compact_info["retention_days"],
+                                     compact_info["lead_times"])
+    run_stage('compact', timings, engine, compact_fingerprint, args.force, compact_scores, engine,
+              compact_info["retention_days"], compact_info["lead_times"])
+
+    # the evaluation depends on the features and the full set of scores
+    with engine.connect() as connection:
+        num_scores, last_prediction = connection.execute('SELECT COUNT(*), MAX(predictionDate) FROM scores').first()
+    evaluate_fingerprint = hash_parts(features_fingerprint, score_fingerprint, num_scores, last_prediction)
+    run_stage('evaluate', timings, engine, evaluate_fingerprint, args.force, evaluate_stage, engine, features,
+              config["evaluate_model"]["save_location"], config["evaluate_model"]["location_type"])
+
+    # report the time taken by each stage
+    total = time.perf_counter() - start
+    for name, seconds in timings.items():
+        logger.info('%-10s %8.2f seconds (%4.1f%%)', name, seconds, 100 * seconds / total if total > 0 else 0)
+    logger.info('%-10s %8.2f seconds', 'total', total)
+
+    return timings
+
+
+if __name__ == '__main__':
+    logger.debug('Start of run_daily script')
+
+    # if this code is run as a script, then parse arguments for the location of the config and, optionally, the type and location of the db
+    parser = argparse.ArgumentParser(description="run the daily pipeline in a single process")
+    parser.add_argument('--config', help='path to yaml file with configurations')
+    parser.add_argument('--type', default=None, help="type of database, 'sqlite' or 'mysql+pymysql'")
+    parser.add_argument('--database_name', default=None, help="location of the database (including name.db)")
+    parser.add_argument('--API_token', default=None, help="API OAuth Token for API calls")
+    parser.add_argument('--formats_cats', default=False, help="Whether to update formats and categories or not")
+    parser.add_argument('--model_type', default=None,
+                        help='type of models to train, should be "linear", "tree", "forest", "boosted", or "sgd" '
+                             '(the only type --incremental can update)')
+    parser.add_argument('--force', action='store_true', help='run every stage even if its inputs are unchanged')
+    parser.add_argument('--full_rebuild', action='store_true', help='rebuild the features of every event')
+    parser.add_argument('--refresh_vocabulary', action='store_true',
+                        help='add the venues and presenters that now have enough events to the vocabulary')
+    parser.add_argument('--incremental', action='store_true',
+                        help='update the saved models with only the events labeled since they were trained')
+
+    args = parser.parse_args()
+
+    # run the daily pipeline based on the parsed arguments
+    run_daily(args)
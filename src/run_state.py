@@ -0,0 +1,215 @@
+import os
+import sys  # import sys for getting arguments from the command line call
+sys.path.append(os.environ.get('PYTHONPATH'))
+import hashlib  # import hashlib for fingerprinting the inputs of each stage
+import json  # import json for serializing the parts of a fingerprint
+from datetime import datetime  # import datetime for formatting of timestamps
+import logging.config  # import logging config
+
+import pandas as pd
+import boto3  # import boto3 for listing the raw data in s3
+from sqlalchemy import Column, String, Integer, DATETIME  # import needed sqlalchemy libraries for db
+from sqlalchemy.ext.declarative import declarative_base  # import for declaring classes
+from sqlalchemy import text  # import text for parameterized queries
+
+configPath = os.path.join("config", "logging", "local.conf")
+logging.config.fileConfig(configPath)
+logger = logging.getLogger("run_state_log")
+
+from src.helpers.helpers import read_sql_frame  # import helper for reading tables through a server-side cursor
+
+# the source files whose contents make up the code version of each stage of the daily pipeline
+STAGE_SOURCES = {
+    'update': ['src/update_database.py', 'src/event_velocity.py', 'src/sell_out_stats.py', 'src/helpers/helpers.py'],
+    'archive': ['src/archive_data.py', 'src/helpers/helpers.py'],
+    'features': ['src/generate_features.py', 'src/feature_snapshots.py', 'src/helpers/helpers.py'],
+    'train': ['src/train_model.py', 'src/feature_snapshots.py', 'src/model_registry.py', 'src/design_cache.py',
+              'src/helpers/helpers.py'],
+    'score': ['src/score_model.py', 'src/model_registry.py', 'src/design_cache.py', 'src/linear_predictor.py',
+              'src/helpers/helpers.py'],
+    'compact': ['src/compact_scores.py', 'src/helpers/helpers.py'],
+    'evaluate': ['src/evaluate_model.py', 'src/helpers/helpers.py'],
+}
+
+
+def create_runs_table(engine):
+    """function for creating a pipeline_runs table in a database
+
+    Given a database connection engine, access the database and create a table recording each run of each stage of
+    the daily pipeline, along with the fingerprint of its inputs and the version of its code.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        None
+
+    """
+    # check if the pipeline_runs table already exists, stop execution if it does
+    if 'pipeline_runs' in engine.table_names():
+        logger.debug('pipeline_runs table already exists')
+
+    else:
+        logger.debug("Creating a pipeline_runs table at %s", engine.url)
+
+        Base = declarative_base()
+
+        # create a run class
+        class Run(Base):
+            """Create a data model for the pipeline_runs table """
+            __tablename__ = 'pipeline_runs'
+            id = Column(Integer(), primary_key=True, autoincrement=True)
+            stage = Column(String(20), unique=False, nullable=False, index=True)
+            fingerprint = Column(String(64), unique=False, nullable=False)
+            codeVersion = Column(String(64), unique=False, nullable=False)
+            status = Column(String(10), unique=False, nullable=False)
+            startDate = Column(DATETIME(), unique=False, nullable=False)
+            endDate = Column(DATETIME(), unique=False, nullable=True)
+
+            def __repr__(self):
+                return '<Run %r>' % self.id
+
+        try:
+            # create the table
+            Base.metadata.create_all(engine)
+            logger.info("Created table pipeline_runs")
+        except Exception as e:
+            logger.error("Could not create the pipeline_runs table: %s", e)
+
+
+def hash_parts(*parts):
+    """helper function for combining the parts of a fingerprint into a single sha256 hex digest"""
+    return hashlib.sha256(json.dumps(parts, default=str, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def code_version(stage):
+    """helper function for hashing the source files of a stage, so that code changes force the stage to re-run"""
+    digest = hashlib.sha256()
+    for source in STAGE_SOURCES[stage]:
+        with open(source, 'rb') as f:
+            digest.update(f.read())
+
+    return digest.hexdigest()
+
+
+def frame_hash(frame):
+    """helper function for hashing the content of a dataframe, independent of its index"""
+    digest = hashlib.sha256(','.join(frame.columns).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(frame, index=False).values.tobytes())
+
+    return digest.hexdigest()
+
+
+def table_hash(engine, table, order_by):
+    """helper function for hashing the content of a database table
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        table (str): the name of the table to hash
+        order_by (str): the column to order the rows by, so the hash doesn't depend on the storage order
+
+    Returns:
+        digest (str): the sha256 hex digest of the table content
+
+    """
+    if table not in engine.table_names():
+        return None
+
+    frame = read_sql_frame('SELECT * FROM {} ORDER BY {}'.format(table, order_by), engine)
+
+    # convert every column to strings, so the hash is the same whether values come back as Decimals or floats
+    return frame_hash(frame.astype(str))
+
+
+def raw_data_watermark(raw_data_location, location_type):
+    """function for building a watermark of the raw data available to the update stage
+
+    The watermark covers the name and size of every landed JSON, so it only changes when new raw data lands. The last
+    update date is left out, as the update stage itself moves it forward (which would make the stage run once more
+    after every landing), so processing the data again after resetting it needs a forced run.
+
+    Args:
+        raw_data_location (str): the location of where the raw events and venues data resides
+        location_type (str): a flag for the type of location, should be 'local' or 's3'
+
+    Returns:
+        watermark (str): the sha256 hex digest of the raw data listing
+
+    """
+    listing = []
+
+    if location_type == 's3':
+        bucket = boto3.resource("s3").Bucket(raw_data_location)
+        listing = [(obj.key, obj.size) for obj in bucket.objects.all() if obj.key[-5:] == '.json']
+
+    elif location_type == 'local':
+        for parent, directory, files in os.walk(os.path.join(os.getcwd(), raw_data_location)):
+            listing = listing + [(os.path.relpath(os.path.join(parent, file), raw_data_location),
+                                  os.path.getsize(os.path.join(parent, file))) for file in files if file[-5:] == '.json']
+
+    logger.debug('%s raw data files found', len(listing))
+
+    return hash_parts(sorted(listing))
+
+
+def events_watermark(engine):
+    """function for building a watermark of the events and venues that the features are generated from
+
+    Events carry a lastInfoDate which moves whenever the update stage changes them, while venues have no timestamp
+    so their (small) table is hashed instead.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        watermark (str): the sha256 hex digest of the events and venues state
+
+    """
+    with engine.connect() as connection:
+        num_events, last_info = connection.execute('SELECT COUNT(*), MAX(lastInfoDate) FROM events').first()
+
+    return hash_parts(num_events, last_info, table_hash(engine, 'venues', 'id'))
+
+
+def last_fingerprint(engine, stage):
+    """function for looking up the fingerprint and code version of the last successful run of a stage
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        stage (str): the name of the stage
+
+    Returns:
+        fingerprint (tuple): the (fingerprint, codeVersion) of the last successful run, or None if there wasn't one
+
+    """
+    query = text("SELECT fingerprint, codeVersion FROM pipeline_runs WHERE stage = :stage AND status = 'success' "
+                 "ORDER BY id DESC LIMIT 1")
+    with engine.connect() as connection:
+        row = connection.execute(query, stage=stage).first()
+
+    return None if row is None else (row[0], row[1])
+
+
+def record_run(engine, stage, fingerprint, version, status, startDate, endDate=None):
+    """function for recording a run of a stage in the pipeline_runs table
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        stage (str): the name of the stage
+        fingerprint (str): the fingerprint of the inputs of the stage
+        version (str): the code version of the stage
+        status (str): the outcome of the run, 'success', 'skipped' or 'failed'
+        startDate (datetime): when the run started
+        endDate (datetime): when the run finished
+
+    Returns:
+        None
+
+    """
+    query = text("INSERT INTO pipeline_runs (stage, fingerprint, codeVersion, status, startDate, endDate) "
+                 "VALUES (:stage, :fingerprint, :codeVersion, :status, :startDate, :endDate)")
+    with engine.begin() as connection:
+        connection.execute(query, stage=stage, fingerprint=fingerprint, codeVersion=version, status=status,
+                           startDate=startDate, endDate=endDate if endDate is not None else datetime.now())
+
+    logger.debug('Recorded %s run of %s with fingerprint %s', status, stage, fingerprint)
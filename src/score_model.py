@@ -8,8 +8,6 @@ import pickle
 import logging.config  # import logging config
 
 import pandas as pd
-from sqlalchemy.orm import sessionmaker  # import the sessionmaker for adding data to the database
-from sqlalchemy.ext.automap import automap_base # import for declaring classes
 from sqlalchemy import Column, String, Integer, Boolean, DATETIME, DECIMAL  # import needed sqlalchemy libraries for db
 from sqlalchemy.ext.declarative import declarative_base  # import for declaring classes
 import numpy as np
@@ -19,8 +17,11 @@ configPath = os.path.join("config", "logging", "local.conf")
 logging.config.fileConfig(configPath)
 logger = logging.getLogger("score_model_log")
 
-from src.helpers.helpers import create_db_engine, pull_features  # import helpers for creating an engine and pulling features
-from src.helpers.helpers import create_score, update_score  # import helpers for creating and updating scores
+from src.helpers.helpers import create_db_engine, get_engine_options, pull_features  # import helpers for creating an engine and pulling features
+from src.helpers.helpers import upsert_frame  # import helper for writing the scores
+from src.model_registry import load_current_models, load_current_linear_models  # import for resolving the current version of the models
+from src.model_registry import get_current_version, load_candidate_models  # import for the versions scored as champion and challengers
+from src.design_cache import design_matrix, encoder_version  # import for encoding the inputs once per transformer
 
 def get_models_local(location):
     """function for opening loading saved models from a local folder
@@ -87,6 +88,40 @@ def get_models_s3(location):
     return classifier, regressor
 
 
+def get_models(engine, location, location_type, mmap=True, linear=False):
+    """function for loading the current models, resolved through the model registry
+
+    With linear, the numpy artifact of the current version is loaded instead of its pipelines when it has one, which
+    starts without sklearn and predicts faster. Models saved before the registry existed are loaded from their pickles
+    when the registry has no current version.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        location (path): the local folder or s3 bucket of the models
+        location_type (str): 'local' or 's3'
+        mmap (bool): whether to memory-map the arrays of local models
+        linear (bool): whether to prefer the numpy artifact of linear models
+
+    Returns:
+        classifier (Model object): a trained classification model
+        regressor (Model object): a trained regression model
+
+    """
+    if linear:
+        models = load_current_linear_models(engine)
+        if models is not None:
+            return models
+
+    models = load_current_models(engine, mmap)
+    if models is not None:
+        return models
+
+    logger.warning('No current version of the models in the registry, loading the saved pickles')
+    if location_type == 'local':
+        return get_models_local(os.path.join(location))
+    return get_models_s3(location)
+
+
 def create_scores_table(engine):
     """function for creating a scores table in a database
 
@@ -136,13 +171,125 @@ def create_scores_table(engine):
             logger.error("Could not create the database: %s", e)
 
 
-def score_models(classifier, regressor, features):
+def create_model_scores_table(engine):
+    """function for creating a model_scores table in a database
+
+    Given a database connection engine, access the database and create a model_scores table, which holds the
+    predictions of every version of the models scored side by side (the current one and its challengers), tagged by
+    the version, for comparing them head to head.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        None
+
+    """
+    # check if the model_scores table already exists, stop execution if it does
+    if 'model_scores' in engine.table_names():
+        logger.debug('model_scores table already exists')
+
+    else:
+        logger.debug("Creating a model_scores table at %s", engine.url)
+
+        Base = declarative_base()
+
+        # create a model score class, one row per prediction of a version of the models
+        class ModelScore(Base):
+            """Create a data model for the model_scores table """
+            __tablename__ = 'model_scores'
+            score_id = Column(String(36), primary_key=True)
+            pred_id = Column(String(24), unique=False, nullable=False)
+            modelVersion = Column(Integer(), unique=False, nullable=False, index=True)
+            event_id = Column(String(12), unique=False, nullable=False)
+            startDate = Column(DATETIME(), unique=False, nullable=False)
+            predictionDate = Column(DATETIME(), unique=False, nullable=False)
+            willSellOut = Column(Boolean(), unique=False, nullable=False)
+            confidence = Column(DECIMAL(), unique=False, nullable=False)
+            howFarOut = Column(DECIMAL(), unique=False, nullable=False)
+
+            def __repr__(self):
+                return '<ModelScore %r>' % self.score_id
+
+        try:
+            # create the table
+            Base.metadata.create_all(engine)
+            logger.info("Created table model_scores")
+        except Exception as e:
+            logger.error("Could not create the model_scores table: %s", e)
+
+
+def future_events(features):
+    """helper function for the features of the events to score, the future events that are not already sold out"""
+    future_data = features.loc[(features['startDate'] >= datetime.today()) & (features['isSoldOut'] == 0)]
+    future_data = future_data.reset_index(drop=True)
+    logger.debug('Shape of future data: %s', future_data.shape)
+    return future_data
+
+
+def score_model_versions(models, features, cache_location=None):
+    """function for scoring several versions of the models on the same events in a single pass
+
+    The inputs are encoded once per distinct transformer (the classifier and regressor of a version share theirs, as
+    can versions updated incrementally), through the design matrix cache when a cache_location is given, and every
+    estimator is scored on the shared matrix. Models without a transformer (such as the numpy linear predictors)
+    score the features directly.
+
+    Args:
+        models (dict): the trained classification and regression models of each version, by version
+        features (Pandas DataFrame): a dataframe containing all the features data in the database
+        cache_location (str): the local folder of the design matrix caches, or None to not cache the encoded inputs
+
+    Returns:
+        scores (Pandas DataFrame): a dataframe containing the events, start dates, and the predictions (scores) of
+            each version, with the version in modelVersion
+
+    """
+    logger.debug('Start of score model versions function')
+
+    future_data = future_events(features)
+    if future_data.shape[0] == 0:
+        logger.warning('No future events to score')
+        return pd.DataFrame(columns=['id', 'startDate', 'pred_id', 'willSellOut', 'confidence', 'howFarOut',
+                                     'modelVersion'])
+
+    # encode the inputs once per transformer
+    matrices = {}
+
+    def inputs(model):
+        if not hasattr(model, 'steps'):
+            return future_data, model
+        key = encoder_version(model.steps[0][1])
+        if key not in matrices:
+            matrices[key] = design_matrix(model.steps[0][1], future_data, cache_location)
+        return matrices[key], model.steps[-1][1]
+
+    scores = []
+    for version, (classifier, regressor) in models.items():
+        class_inputs, class_estimator = inputs(classifier)
+        regress_inputs, regress_estimator = inputs(regressor)
+        version_scores = build_scores(future_data, class_estimator.predict_proba(class_inputs), class_estimator.classes_,
+                                      regress_estimator.predict(regress_inputs))
+        version_scores['modelVersion'] = version
+        scores.append(version_scores)
+
+    logger.info('Scored %s versions of the models on %s events, encoding the inputs %s times', len(models),
+                future_data.shape[0], len(matrices))
+
+    return pd.concat(scores, ignore_index=True)
+
+
+def score_models(classifier, regressor, features, cache_location=None):
     """function for training a model of specified type using a set of passed features
 
+    With a cache_location, pipeline models read the encoded inputs from the design matrix cache of their transformer,
+    so only the events that are new or changed since the inputs were last encoded are encoded.
+
     Args:
         classifier (Model object): the trained classification model
         regressor (Model object): the trained regression model
         features (Pandas DataFrame): a dataframe containing all the features data in the database
+        cache_location (str): the local folder of the design matrix caches, or None to not cache the encoded inputs
 
     Returns:
         scores (Pandas DataFrame): a dataframe containing the events, start dates, and their predictions (scores)
@@ -150,26 +297,39 @@ def score_models(classifier, regressor, features):
     """
     logger.debug('Start of score models function')
 
-    # filter the data to only use future events and events that are not already sold out
-    future_data1 = features.loc[features['startDate'] >= datetime.today()]
-    future_data2 = features.loc[features['isSoldOut'] == 0]
-    future_data = pd.merge(future_data1, future_data2, how='inner')
-    logger.debug('Shape of future data: %s', future_data.shape)
+    return score_model_versions({0: (classifier, regressor)}, features, cache_location).drop(columns=['modelVersion'])
 
-    # score the models
-    class_preds = classifier.predict(future_data)
-    class_preds_probs = classifier.predict_proba(future_data)
-    class_preds_confidence = np.amax(class_preds_probs, axis=1)
-    regress_preds = regressor.predict(future_data)
+
+def build_scores(future_data, class_preds_probs, classes, regress_preds):
+    """function for building the scores of a set of events from the predictions of a classifier and a regressor
+
+    The scores are built in a single vectorized pass: the predicted class of each event is the class of its highest
+    probability (as the classifier's predict would give), and the predicted lead is clipped to between 0 and the days
+    until the event starts.
+
+    Args:
+        future_data (Pandas DataFrame): the features of the scored events
+        class_preds_probs (numpy array): the probability of each class of each event
+        classes (numpy array): the classes of the classifier, in the order of the probabilities
+        regress_preds (numpy array): the predicted soldOutLead of each event
+
+    Returns:
+        scores (Pandas DataFrame): a dataframe containing the events, start dates, and their predictions (scores)
+
+    """
+    today = datetime.today()
+    best = np.argmax(class_preds_probs, axis=1)
+
+    # the whole days until each event starts, as the days of their difference (rounded down, none for started events)
+    days_to_start = ((pd.to_datetime(future_data['startDate']) - today) // pd.Timedelta(days=1)).values
+    days_to_start = np.maximum(days_to_start, 0)
 
     # build the scores table
-    scores = future_data[['id','startDate']]
-    scores['pred_id'] = scores['id'] + "-" + datetime.today().strftime('%y-%m-%d')
-    scores['willSellOut'] = class_preds
-    scores['confidence'] = class_preds_confidence
-    scores['confidence'] = scores['confidence'].apply(lambda x: round(x, 2) * 100)
-    scores['howFarOut'] = regress_preds
-    scores['howFarOut'] = scores.apply(lambda x: 0 if x['howFarOut'] < 0 else (x['howFarOut'] if x['howFarOut'] <= (x['startDate'] - datetime.today()).days else ((x['startDate'] - datetime.today()).days if (x['startDate'] - datetime.today()).days >= 0 else 0)), axis=1)
+    scores = future_data[['id','startDate']].copy()
+    scores['pred_id'] = scores['id'] + "-" + today.strftime('%y-%m-%d')
+    scores['willSellOut'] = np.asarray(classes)[best]
+    scores['confidence'] = np.round(class_preds_probs[np.arange(len(best)), best], 2) * 100
+    scores['howFarOut'] = np.clip(regress_preds, 0, days_to_start)
 
     logger.debug('Shape of scores: %s', scores.shape)
 
@@ -180,7 +340,8 @@ def score_models(classifier, regressor, features):
 def save_scores(engine, scores):
     """function for loading a scores dataset into a database
 
-    Given a database connection engine, access the database and push the scores data into the scores table
+    Given a database connection engine, access the database and push the scores data into the scores table,
+    adding the new scores and updating the predictions of the changed ones in a single transaction
 
     Args:
         engine (SQLAlchemy engine): the engine for working with a database
@@ -192,64 +353,114 @@ def save_scores(engine, scores):
     """
     logger.info('Saving scores')
 
-    # use the engine to build a reflection of the database
-    Base = automap_base()
-    Base.prepare(engine, reflect=True)
-
-    # build the scores class from the scores table in the database
-    Score = Base.classes.scores
-
-    # create a session from the engine
-    session_mk = sessionmaker()
-    session_mk.configure(bind=engine)
-    session = session_mk()
-
-    # initialize counters for the number of scores added and updated
-    num_scores_added = 0
-    num_scores_updated = 0
-
-    # initialize a list of objects to add to the database
-    objects_to_add = []
-
-    # convert the dataframe into a dictionary of rows
-    scores_dict = scores.to_dict('index')
-
-    # query the scores table for all ids, creating a dictionary of keys (for fast lookup)
-    scores_ids = session.query(Score.pred_id).all()
-    scores_ids = {entity[0]: "" for entity in scores_ids}
-    logger.debug('%s score ids retrieved', len(scores_ids))
-
-    # pull the current scores dataframe
-    current_scores = pd.read_sql('SELECT * FROM scores', engine)
-
-    # for each score in the scores dict, check the score
-    for score in scores_dict.values():
-        # if the score id is in the current list, check against the pandas dataframe
-        if score['pred_id'] in scores_ids.keys():
-            # compare the score row to the corresponding row in the current scores dataframe from the database
-            if list(current_scores[current_scores['pred_id'] == score['pred_id']].to_dict('index').values())[0] != score:
-                # if the entries are different, then update the score
-                update_score(engine, score)
-                num_scores_updated += 1
-            else:
-                logger.debug('Score %s is the same', score['pred_id'])
-        # otherwise, create the score and add it to the list of objects to add
-        else:
-            objects_to_add.append(create_score(engine, score))
-            num_scores_added += 1
-
-    # for each object to add, add it using the session
-    num_added = 0
-    for object in objects_to_add:
-        session.add(object)
-        logger.debug("Object %s added", object)
-        num_added += 1
-
-    session.commit()
-    logger.info("%s objects added", num_added)
-
-    logger.info("%s scores added, %s scores updated", num_scores_added, num_scores_updated)
-    session.close()
+    # match the columns of the scores table, the prediction date is only set when a score is added
+    scores = scores.rename(columns={'id': 'event_id'})[['pred_id', 'event_id', 'startDate', 'willSellOut', 'confidence',
+                                                         'howFarOut']].copy()
+    scores['predictionDate'] = datetime.today()
+
+    num_scores_added, num_scores_updated, num_scores_unchanged = upsert_frame(
+        engine, scores, 'scores', 'pred_id', update_columns=['willSellOut', 'confidence', 'howFarOut'])
+
+    logger.info("%s scores added, %s scores updated, %s scores unchanged", num_scores_added, num_scores_updated,
+                num_scores_unchanged)
+
+
+def save_model_scores(engine, scores):
+    """function for loading the scores of several versions of the models into a database
+
+    Given a database connection engine, access the database and push the scores into the model_scores table, keyed by
+    the prediction and the version, adding the new scores and updating the predictions of the changed ones in a single
+    transaction
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        scores (pandas DataFrame): a dataframe containing the scores columns for each event and version (modelVersion)
+
+    Returns:
+        None
+
+    """
+    logger.info('Saving the scores of %s versions of the models', scores['modelVersion'].nunique())
+
+    # match the columns of the model_scores table, the prediction date is only set when a score is added
+    scores = scores.rename(columns={'id': 'event_id'})[['pred_id', 'modelVersion', 'event_id', 'startDate',
+                                                         'willSellOut', 'confidence', 'howFarOut']].copy()
+    scores['score_id'] = scores['pred_id'] + "-v" + scores['modelVersion'].astype(str)
+    scores['predictionDate'] = datetime.today()
+
+    num_scores_added, num_scores_updated, num_scores_unchanged = upsert_frame(
+        engine, scores, 'model_scores', 'score_id', update_columns=['willSellOut', 'confidence', 'howFarOut'])
+
+    logger.info("%s model scores added, %s model scores updated, %s model scores unchanged", num_scores_added,
+                num_scores_updated, num_scores_unchanged)
+
+
+def challenger_versions(model_info):
+    """function for reading the versions of the models to score as challengers from the model_info of the config
+
+    Args:
+        model_info (dict): the model_info settings of the config file
+
+    Returns:
+        versions (list): the versions of the models to score next to the current one, sorted
+
+    """
+    challengers = model_info.get("challengers", None)
+    if challengers is None:
+        return []
+
+    # the challengers are named by version, so the versions scored (and the model_scores written) don't grow with
+    # every candidate ever registered
+    if not isinstance(challengers, list):
+        logger.error('challengers in model_info must be a list of versions of the models, e.g. [12, 14]')
+        sys.exit()
+
+    return sorted(set(int(version) for version in challengers))
+
+
+def score_champion_challengers(engine, classifier, regressor, features, cache_location=None, challengers=None):
+    """function for scoring the current models (the champion) and, if asked to, a set of other versions (the
+    challengers) in a single pass, and saving their scores
+
+    The champion's scores are saved to the scores table (which must exist). When there are challengers, the scores of
+    every version, champion included, are also saved to the model_scores table, for comparing them head to head.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        classifier (Model object): the current classification model
+        regressor (Model object): the current regression model
+        features (Pandas DataFrame): a dataframe containing all the features data in the database
+        cache_location (str): the local folder of the design matrix caches, or None to not cache the encoded inputs
+        challengers (list): the versions of the registry to also score, or None to only score the champion
+
+    Returns:
+        scores (Pandas DataFrame): the scores of the champion
+
+    """
+    # the champion is the current version of the registry (0 for models saved before the registry)
+    record = get_current_version(engine)
+    champion = record['version'] if record is not None else 0
+
+    models = {champion: (classifier, regressor)}
+    if challengers:
+        models.update({version: candidate for version, candidate in load_candidate_models(
+            engine, [version for version in challengers if version != champion]).items()})
+        logger.info('Scoring version %s of the models against the challengers %s', champion,
+                    [version for version in models if version != champion])
+
+    scores = score_model_versions(models, features, cache_location)
+    champion_scores = scores.loc[scores['modelVersion'] == champion].drop(columns=['modelVersion'])
+
+    if scores.shape[0] == 0:
+        return champion_scores
+
+    save_scores(engine, champion_scores)
+
+    if len(models) > 1:
+        create_model_scores_table(engine)
+        save_model_scores(engine, scores)
+
+    return champion_scores
 
 
 def run_scoring(args):
@@ -287,7 +498,7 @@ def run_scoring(args):
             sys.exit()
 
         # create the engine for the database and type
-        engine = create_db_engine(db_name, type)
+        engine = create_db_engine(db_name, type, **get_engine_options(config))
 
     elif config["database_info"]["how"] == "local":
         # if a type argument was passed, then use it for calling the appropriate database type
@@ -316,7 +527,7 @@ def run_scoring(args):
             sys.exit()
 
         # create the engine for the database and type
-        engine = create_db_engine(db_name, type)
+        engine = create_db_engine(db_name, type, **get_engine_options(config))
 
     else:
         logger.error('Method of database storage (should be "rds" or "local") in config file not supported')
@@ -348,25 +559,22 @@ def run_scoring(args):
         logger.error('location type must be pass in arguments or in the config file')
         sys.exit()
 
-    # get the models
-    if save_type == 'local':
-        models_path = os.path.join(model_location)
-        classifier, regressor = get_models_local(models_path)
-
-    elif save_type == 's3':
-        classifier, regressor = get_models_s3(model_location)
+    # get the current models
+    if save_type in ['local', 's3']:
+        classifier, regressor = get_models(engine, model_location, save_type,
+                                           linear=config.get("model_info", {}).get("linear_inference", False))
 
     else:
         logger.error('location type must be pass in arguments or in the config file as "s3" or "local"')
         sys.exit()
 
-    # get the features
-    features = pull_features(engine)
-
-    # score the events
-    scores = score_models(classifier, regressor, features)
+    # get the features, only the hot features are needed as archived events are already in the past
+    features = pull_features(engine, include_archive=False)
 
-    save_scores(engine, scores)
+    # score the events with the current models, and the candidate versions if set in the config file, and save them
+    model_info = config.get("model_info", {})
+    score_champion_challengers(engine, classifier, regressor, features, model_info.get("design_cache", None),
+                               challenger_versions(model_info))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,313 @@
+import os
+import sys  # import sys for getting arguments from the command line call
+sys.path.append(os.environ.get('PYTHONPATH'))
+import argparse  # import argparse for getting arguments from the command line
+import yaml  # import yaml for pulling config file
+import logging.config  # import logging config
+
+import pandas as pd
+import numpy as np
+from sqlalchemy import Column, String, Integer, DATETIME  # import needed sqlalchemy libraries for db
+from sqlalchemy.ext.declarative import declarative_base  # import for declaring classes
+from sqlalchemy import MetaData, Table, and_, bindparam, text  # import for working with the reflected stats table
+
+configPath = os.path.join("config", "logging", "local.conf")
+logging.config.fileConfig(configPath)
+logger = logging.getLogger("sell_out_stats_log")
+
+from src.helpers.helpers import get_engine_from_config, read_sql_stream  # import helpers for creating an engine and reading the events
+
+# the columns of the events the statistics are built from
+EVENT_COLUMNS = 'id, venueId, presentedBy, startDate, endDate, soldOutDate, isSoldOut'
+
+# the columns of the statistics summed over the events of each venue or presenter and day
+COUNT_COLUMNS = ['numEvents', 'numSoldOut', 'sumSoldOutLead']
+
+
+def create_sell_out_stats_table(engine):
+    """function for creating a sell_out_stats table in a database
+
+    Given a database connection engine, access the database and create a sell_out_stats table, which holds the number
+    of events, the number that sold out, and the sum of their soldOutLead for each venue and presenter, by the day
+    the events ended.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        None
+
+    """
+    # check if the sell_out_stats table already exists, stop execution if it does
+    if 'sell_out_stats' in engine.table_names():
+        logger.debug('sell_out_stats table already exists')
+
+    else:
+        logger.debug("Creating a sell_out_stats table at %s", engine.url)
+
+        Base = declarative_base()
+
+        # create a sell out stats class, one row per venue or presenter and day
+        class SellOutStats(Base):
+            """Create a data model for the sell_out_stats table """
+            __tablename__ = 'sell_out_stats'
+            kind = Column(String(10), primary_key=True)
+            name = Column(String(255), primary_key=True)
+            endDay = Column(DATETIME(), primary_key=True)
+            numEvents = Column(Integer(), unique=False, nullable=False)
+            numSoldOut = Column(Integer(), unique=False, nullable=False)
+            sumSoldOutLead = Column(Integer(), unique=False, nullable=False)
+
+            def __repr__(self):
+                return '<SellOutStats %r %r %r>' % (self.kind, self.name, self.endDay)
+
+        try:
+            # create the table
+            Base.metadata.create_all(engine)
+            logger.info("Created table sell_out_stats")
+        except Exception as e:
+            logger.error("Could not create the sell_out_stats table: %s", e)
+
+
+def event_contributions(events):
+    """function for summing what a set of events adds to the statistics of their venues and presenters
+
+    Each event counts once for its venue and once for its presenter (if it has one, matched by the lower case
+    presentedBy), on the day it ended. The soldOutLead is computed as in the features.
+
+    Args:
+        events (pandas DataFrame): a dataframe of rows of the events table, with at least the EVENT_COLUMNS
+
+    Returns:
+        cells (pandas DataFrame): the kind ('venue' or 'presenter'), name, endDay, and COUNT_COLUMNS of each cell
+
+    """
+    startDate = pd.to_datetime(events['startDate'])
+    soldOutDate = pd.to_datetime(events['soldOutDate'])
+    isSoldOut = events['isSoldOut'].fillna(0).astype(int) == 1
+    soldOutLead = (startDate - soldOutDate).dt.days.clip(lower=0).fillna(0)
+
+    counts = pd.DataFrame({'endDay': pd.to_datetime(events['endDate']).dt.floor('D'),
+                           'numEvents': 1,
+                           'numSoldOut': isSoldOut.astype(int),
+                           'sumSoldOutLead': np.where(isSoldOut, soldOutLead, 0).astype(int)})
+
+    presenters = events['presentedBy'].str.lower().str.strip()
+    venues = counts.assign(kind='venue', name=events['venueId'].astype('Int64').astype(str))
+    venues = venues.loc[events['venueId'].notna().values]
+    presenters = counts.assign(kind='presenter', name=presenters).loc[(presenters.notna() & (presenters != "")).values]
+
+    cells = pd.concat([venues, presenters], ignore_index=True)
+
+    return cells.groupby(['kind', 'name', 'endDay'], as_index=False)[COUNT_COLUMNS].sum()
+
+
+def cells_to_records(cells):
+    """helper function for converting cells of the statistics into a list of row dictionaries of python values"""
+    return [{'kind': kind, 'name': name, 'endDay': endDay.to_pydatetime(), 'numEvents': int(numEvents),
+             'numSoldOut': int(numSoldOut), 'sumSoldOutLead': int(sumSoldOutLead)}
+            for kind, name, endDay, numEvents, numSoldOut, sumSoldOutLead
+            in cells[['kind', 'name', 'endDay'] + COUNT_COLUMNS].itertuples(index=False, name=None)]
+
+
+def read_event_rows(engine, event_ids, batch_size=500):
+    """function for reading the rows of a set of events that the statistics are built from
+
+    An event that has been archived (and isn't also in the hot table) is read from the archive, as its contribution
+    is still part of the statistics.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        event_ids (list): the ids of the events
+        batch_size (int): the number of events to read at a time
+
+    Returns:
+        events (pandas DataFrame): the EVENT_COLUMNS of the events that exist
+
+    """
+    event_ids = list(event_ids)
+    events = pd.DataFrame(columns=EVENT_COLUMNS.split(', '))
+
+    for table in ['events', 'events_archive']:
+        if table not in engine.table_names():
+            continue
+
+        query = text('SELECT {} FROM {} WHERE id IN :event_ids'.format(EVENT_COLUMNS, table)).bindparams(
+            bindparam('event_ids', expanding=True))
+        found = set(events['id'])
+        missing = [event_id for event_id in event_ids if event_id not in found]
+        events = pd.concat([events] + [pd.read_sql(query, engine, params={'event_ids': missing[i:i + batch_size]})
+                                       for i in range(0, len(missing), batch_size)], ignore_index=True)
+
+    return events
+
+
+def apply_stats_delta(engine, delta):
+    """function for adding the changes of a set of cells to the sell_out_stats table
+
+    The current rows of the changed cells are read, and then the new cells inserted, the changed ones updated, and
+    the ones left without events deleted, all in a single transaction.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        delta (pandas DataFrame): the kind, name, endDay, and the change to each of the COUNT_COLUMNS of each cell
+
+    Returns:
+        None
+
+    """
+    delta = delta.loc[(delta[COUNT_COLUMNS] != 0).any(axis=1)]
+    if delta.shape[0] == 0:
+        return
+
+    # read the current rows of the changed venues and presenters
+    query = text('SELECT * FROM sell_out_stats WHERE kind = :kind AND name IN :names').bindparams(
+        bindparam('names', expanding=True))
+    current = [pd.DataFrame(columns=['kind', 'name', 'endDay'] + COUNT_COLUMNS)]
+    for kind, names in delta.groupby('kind')['name']:
+        names = list(names.unique())
+        current += [pd.read_sql(query, engine, params={'kind': kind, 'names': names[i:i + 500]})
+                    for i in range(0, len(names), 500)]
+    current = pd.concat(current, ignore_index=True)
+    current['endDay'] = pd.to_datetime(current['endDay'])
+
+    cells = pd.merge(delta, current, how='left', on=['kind', 'name', 'endDay'], suffixes=('', '_current'),
+                     indicator=True)
+    existing = cells['_merge'] == 'both'
+    for column in COUNT_COLUMNS:
+        cells[column] = cells[column] + cells[column + '_current'].fillna(0)
+
+    records = cells_to_records(cells)
+    emptied = (cells['numEvents'] <= 0).values
+
+    stats_table = Table('sell_out_stats', MetaData(), autoload=True, autoload_with=engine)
+    cell = and_(stats_table.c.kind == bindparam('b_kind'), stats_table.c.name == bindparam('b_name'),
+                stats_table.c.endDay == bindparam('b_endDay'))
+
+    def bound(rows):
+        return [{'b_' + column: value for column, value in row.items()} for row in rows]
+
+    inserted = [record for record, new, empty in zip(records, ~existing, emptied) if new and not empty]
+    updated = [record for record, old, empty in zip(records, existing, emptied) if old and not empty]
+    deleted = [record for record, old, empty in zip(records, existing, emptied) if old and empty]
+
+    # write the new, changed, and emptied cells together
+    with engine.begin() as connection:
+        if len(inserted) > 0:
+            connection.execute(stats_table.insert(), inserted)
+        if len(updated) > 0:
+            connection.execute(stats_table.update().where(cell).values(
+                {column: bindparam('b_' + column) for column in COUNT_COLUMNS}), bound(updated))
+        if len(deleted) > 0:
+            connection.execute(stats_table.delete().where(cell), bound(deleted))
+
+    logger.debug('%s sell out stats cells added, %s updated, %s removed', len(inserted), len(updated), len(deleted))
+
+
+def update_sell_out_stats(engine, previous_events, changed_ids):
+    """function for updating the sell out statistics with the changes to a set of events
+
+    The contributions of the events before they changed are subtracted and those of the events now added, so only
+    the cells of the changed events are read and written.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        previous_events (pandas DataFrame): the EVENT_COLUMNS of the events before they changed (see read_event_rows),
+            without the events that were added
+        changed_ids (list): the ids of the events that were added or updated
+
+    Returns:
+        None
+
+    """
+    changed_ids = list(set(changed_ids))
+    if len(changed_ids) == 0:
+        return
+
+    previous = previous_events.loc[previous_events['id'].isin(changed_ids)]
+    current = read_event_rows(engine, changed_ids)
+
+    removed = event_contributions(previous) if previous.shape[0] > 0 else None
+    delta = event_contributions(current)
+    if removed is not None:
+        removed[COUNT_COLUMNS] = -removed[COUNT_COLUMNS]
+        delta = pd.concat([delta, removed], ignore_index=True).groupby(
+            ['kind', 'name', 'endDay'], as_index=False)[COUNT_COLUMNS].sum()
+
+    apply_stats_delta(engine, delta)
+
+    logger.info('Sell out statistics updated with %s changed events', len(changed_ids))
+
+
+def rebuild_sell_out_stats(engine, chunk_size=50000):
+    """function for rebuilding the sell out statistics from every event, including the archived ones
+
+    The events are read and summed a chunk at a time, and the table replaced in a single transaction. Rebuilding gives
+    the same statistics as the updates made along with the changes to the events.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        chunk_size (int): the number of events read at a time
+
+    Returns:
+        num_cells (int): the number of cells written
+
+    """
+    create_sell_out_stats_table(engine)
+
+    # an event added again after being archived is only in the hot table until it is archived again, so the archived
+    # copy isn't counted
+    query = 'SELECT {} FROM events'.format(EVENT_COLUMNS)
+    if 'events_archive' in engine.table_names():
+        query += ' UNION ALL SELECT {} FROM events_archive WHERE id NOT IN (SELECT id FROM events)'.format(EVENT_COLUMNS)
+
+    cells = [event_contributions(events) for events in read_sql_stream(query, engine, chunk_size)]
+    cells = pd.concat(cells, ignore_index=True) if len(cells) > 0 else pd.DataFrame(
+        columns=['kind', 'name', 'endDay'] + COUNT_COLUMNS)
+    cells = cells.groupby(['kind', 'name', 'endDay'], as_index=False)[COUNT_COLUMNS].sum()
+
+    records = cells_to_records(cells)
+
+    stats_table = Table('sell_out_stats', MetaData(), autoload=True, autoload_with=engine)
+    with engine.begin() as connection:
+        connection.execute(stats_table.delete())
+        if len(records) > 0:
+            connection.execute(stats_table.insert(), records)
+
+    logger.info('Sell out statistics rebuilt into %s cells', len(records))
+
+    return len(records)
+
+
+def run_rebuild_stats(args):
+    """runs the rebuild of the sell out statistics"""
+    try:  # opens the specified config file
+        with open(args.config, "r") as f:
+            config = yaml.load(f, Loader=yaml.Loader)
+    except Exception as e:
+        logger.error('Error loading the config file: %s, be sure you specified a config.yml file', e)
+        sys.exit()
+
+    # create the engine for the database and type
+    engine = get_engine_from_config(config, args.type, args.database_name)
+
+    if 'events' not in engine.table_names():
+        logger.error('No events table to build the sell out statistics from')
+        sys.exit()
+
+    rebuild_sell_out_stats(engine)
+
+
+if __name__ == '__main__':
+    logger.debug('Start of sell_out_stats script')
+
+    # if this code is run as a script, then parse arguments for the location of the config and, optionally, the type and location of the db
+    parser = argparse.ArgumentParser(description="rebuild the venue and presenter sell out statistics")
+    parser.add_argument('--config', help='path to yaml file with configurations')
+    parser.add_argument('--type', default=None, help="type of database, 'sqlite' or 'mysql+pymysql'")
+    parser.add_argument('--database_name', default=None, help="location of database (including name.db)")
+
+    args = parser.parse_args()
+
+    # run the rebuild based on the parsed arguments
+    run_rebuild_stats(args)
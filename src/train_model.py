@@ -3,8 +3,11 @@ import sys  # import sys for getting arguments from the command line call
 sys.path.append(os.environ.get('PYTHONPATH'))
 import argparse  # import argparse for getting arguments from the command line
 import yaml  # import yaml for pulling config file
-from datetime import datetime  # import datetime for formatting of timestamps
+from datetime import datetime, timedelta  # import datetime for formatting of timestamps
 import pickle
+import io  # import io for building the linear artifact in memory
+import json  # import json for the cached fold results and the parameters in the leaderboard
+import time  # import time for timing the fits of the search
 import logging.config  # import logging config
 
 import pandas as pd
@@ -12,31 +15,67 @@ import numpy as np
 from sklearn.preprocessing import *
 from sklearn.linear_model import *
 from sklearn.tree import *
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.ensemble import GradientBoostingClassifier, GradientBoostingRegressor
 from sklearn.compose import ColumnTransformer
+from sklearn.feature_extraction.text import HashingVectorizer
 from sklearn.pipeline import Pipeline
-from sklearn.model_selection import KFold, cross_val_score
+from sklearn.model_selection import KFold, ParameterGrid, train_test_split
+from sklearn.base import clone
+from joblib import Parallel, delayed, hash as joblib_hash  # import joblib for fitting the folds of the search across cores
 import boto3
+from sqlalchemy import Column, String, Integer, DATETIME  # import needed sqlalchemy libraries for db
+from sqlalchemy.ext.declarative import declarative_base  # import for declaring classes
+from sqlalchemy import text  # import for recording the trainings
  
 configPath = os.path.join("config", "logging", "local.conf")
 logging.config.fileConfig(configPath)
 logger = logging.getLogger("train_model_log")
 
-from src.helpers.helpers import create_db_engine, pull_features  # import helpers for creating an engine and pulling the features table
-
-def train_models(model_type, features):
-    """function for training a model of specified type using a set of passed features
+from src.helpers.helpers import create_db_engine, get_engine_options, pull_features  # import helpers for creating an engine and pulling the features table
+from src.helpers.helpers import SELL_OUT_STATS_COLUMNS, VELOCITY_COLUMNS, TEXT_COLUMNS  # import the sell out statistics, pull counter, and text columns of the features
+from src.linear_predictor import TOKEN_PATTERN  # import the tokenization of the text, shared with the numpy predictor
+from src.feature_snapshots import point_in_time_features  # import for training on the inputs known before each event
+from src.score_model import get_models  # import for loading the saved models to update incrementally
+from src.model_registry import register_models  # import for saving the models as a new version in the registry
+from src.design_cache import design_matrix  # import for reading the encoded inputs from the design matrix cache
+
+# the fixed number of hashed token features of each text column, which bounds the size of the design matrix however
+# many distinct tokens the text has
+TEXT_HASH_FEATURES = {'eventName': 2 ** 14, 'presentedBy': 2 ** 10}
+
+# the estimators of each family of models, with the grids of hyperparameters the search tries for each
+MODEL_FAMILIES = {
+    'linear': {'classifier': (LogisticRegression, {'C': [0.1, 1.0, 10.0], 'max_iter': [1000]}),
+               'regressor': (Ridge, {'alpha': [0.1, 1.0, 10.0]})},
+    'tree': {'classifier': (DecisionTreeClassifier, {'max_depth': [None, 5, 10], 'min_samples_leaf': [1, 10],
+                                                     'random_state': [123]}),
+             'regressor': (DecisionTreeRegressor, {'max_depth': [None, 5, 10], 'min_samples_leaf': [1, 10],
+                                                   'random_state': [123]})},
+    'forest': {'classifier': (RandomForestClassifier, {'n_estimators': [100], 'max_depth': [None, 10],
+                                                       'random_state': [123]}),
+               'regressor': (RandomForestRegressor, {'n_estimators': [100], 'max_depth': [None, 10],
+                                                     'random_state': [123]})},
+    'boosted': {'classifier': (GradientBoostingClassifier, {'n_estimators': [100, 200], 'learning_rate': [0.05, 0.1],
+                                                            'random_state': [123]}),
+                'regressor': (GradientBoostingRegressor, {'n_estimators': [100, 200], 'learning_rate': [0.05, 0.1],
+                                                          'random_state': [123]})}}
+
+
+def prepare_training_data(features):
+    """function for selecting the training events from a set of features and splitting off what the models predict
 
     Args:
-        model_type (str): an indicator of the type of model to train ('linear' or 'tree')
         features (Pandas DataFrame): a dataframe containing all the features data in the database
 
     Returns:
-        classifier (Model object): the trained classification model
-        regressor (Model object): the trained regression model
+        training_data (Pandas DataFrame): the inputs of the past and sold out events, indexed by id
+        y_class (numpy array): the isSoldOut of each training event
+        y_regress (numpy array): the soldOutLead of each training event
+        cat_cols (list): the categorical columns of the inputs
+        num_cols (list): the numerical columns of the inputs (the TEXT_COLUMNS being neither)
 
     """
-    logger.debug('Start of train model function')
-
     # filter the data to only use past events and events that are already sold out
     training_data1 = features.loc[features['startDate'] < datetime.today()]
     training_data2 = features.loc[features['isSoldOut'] == 1]
@@ -55,55 +94,767 @@ def train_models(model_type, features):
     # identify the columns to use for numerical and categorical values
     all_columns = training_data.columns.values
     logger.debug('All columns: %s', all_columns)
-    num_cols = ['minPrice', 'maxPrice', 'onSaleWindow', 'capacity']
+    num_cols = ['minPrice', 'maxPrice', 'onSaleWindow', 'capacity'] + SELL_OUT_STATS_COLUMNS + VELOCITY_COLUMNS
     logger.debug('Numerical columns: %s', num_cols)
-    cat_cols = [element for element in all_columns if element not in num_cols]
+    cat_cols = [element for element in all_columns if element not in num_cols + TEXT_COLUMNS]
     logger.debug('Categorical columns: %s', cat_cols)
 
+    # hand the numerical columns to the pipelines as a single contiguous float32 block
+    training_data[num_cols] = np.ascontiguousarray(training_data[num_cols].values, dtype=np.float32)
+
+    return training_data, y_class, y_regress, cat_cols, num_cols
+
+
+def build_transformer(cat_cols, num_cols, text_cols=()):
+    """function for building the transformer of the inputs shared by every model
+
+    The categorical columns are one hot encoded into a sparse matrix, and the output stays sparse (CSR) with the
+    standardized numerical columns alongside, so the design matrix grows with its non-zeros rather than with the rows
+    times the categories. The text columns are tokenized and each token hashed into a fixed number of columns (see
+    TEXT_HASH_FEATURES), which needs no fitting, so no vocabulary is kept and new tokens never grow the matrix.
+
+    Args:
+        cat_cols (list): the categorical columns of the inputs, one hot encoded
+        num_cols (list): the numerical columns of the inputs, standardized
+        text_cols (list): the text columns of the inputs, hashed
+
+    Returns:
+        ct (ColumnTransformer): the unfit transformer
+
+    """
     # establish the numerical pipeline steps
     num_ss_step = ('ss', StandardScaler())
     num_steps = [num_ss_step]
     num_pipe = Pipeline(num_steps)
 
     # establish the categorical pipeline steps
-    cat_ohe_step = ('ohe', OneHotEncoder(sparse=False, handle_unknown='ignore'))
+    cat_ohe_step = ('ohe', OneHotEncoder(sparse=True, handle_unknown='ignore'))
     cat_steps = [cat_ohe_step]
     cat_pipe = Pipeline(cat_steps)
 
     # build the overall transformers
     transformers = [('cat', cat_pipe, cat_cols),
                     ('num', num_pipe, num_cols)]
-    ct = ColumnTransformer(transformers=transformers)
 
+    # add a hashed bag of the tokens of each text column, each token counted once
+    for column in text_cols:
+        transformers.append(('text_' + column, HashingVectorizer(n_features=TEXT_HASH_FEATURES[column],
+                                                                 token_pattern=TOKEN_PATTERN, binary=True, norm=None,
+                                                                 alternate_sign=False), column))
+    return ColumnTransformer(transformers=transformers, sparse_threshold=1.0)
+
+
+def fit_estimator(estimator, X, y):
+    """helper function for fitting an estimator on a design matrix, so fits can be handed to joblib"""
+    return estimator.fit(X, y)
+
+
+def fit_shared(ct, classifier_model, regressor_model, training_data, y_class, y_regress, cache_location=None):
+    """function for fitting a classifier and a regressor on a single fit of their shared transformer
+
+    The transformer is fit once and the two models are then fit concurrently (in threads) on the same sparse design
+    matrix, so the matrix is neither rebuilt nor copied. With a cache_location, the matrix is written to (and read
+    memory-mapped from) the design matrix cache of the fit transformer, for the later reads of the same inputs. The
+    matrix is returned as well, so the models can be scored on their training events without encoding them again.
+
+    Args:
+        ct (ColumnTransformer): the unfit transformer of the inputs
+        classifier_model (estimator): the unfit classification estimator
+        regressor_model (estimator): the unfit regression estimator
+        training_data (Pandas DataFrame): the inputs of the training events
+        y_class (numpy array): the isSoldOut of each training event
+        y_regress (numpy array): the soldOutLead of each training event
+        cache_location (str): the local folder of the design matrix caches, or None to not cache the matrix
+
+    Returns:
+        classifier (Pipeline): the fit transformer and classification estimator
+        regressor (Pipeline): the fit transformer and regression estimator
+        X (sparse matrix): the design matrix of the training events
+
+    """
+    if cache_location is None:
+        X = ct.fit_transform(training_data)
+    else:
+        X = design_matrix(ct.fit(training_data), training_data, cache_location)
+    logger.debug('Design matrix of shape %s with %s non-zeros', X.shape, X.nnz)
+
+    classifier_model, regressor_model = Parallel(n_jobs=2, prefer='threads')(
+        delayed(fit_estimator)(model, X, y) for model, y in [(classifier_model, y_class), (regressor_model, y_regress)])
+
+    classifier = Pipeline([('transform', ct), ('log', classifier_model)])
+    regressor = Pipeline([('transform', ct), ('regr', regressor_model)])
+
+    return classifier, regressor, X
+
+
+def transform_fold(ct, training_data, train_index, test_index):
+    """helper function for fitting a copy of the transformer on the training rows of a fold and transforming both sides"""
+    ct = clone(ct)
+    return ct.fit_transform(training_data.iloc[train_index]), ct.transform(training_data.iloc[test_index])
+
+
+def cross_validate_shared(ct, models, training_data, targets, folds, n_jobs=None):
+    """function for cross validating a set of models that share their transformer
+
+    The transformer is fit once per fold, and every model is fit and scored on the same design matrices of the fold.
+
+    Args:
+        ct (ColumnTransformer): the unfit transformer of the inputs
+        models (list): the unfit estimators
+        training_data (Pandas DataFrame): the inputs of the training events
+        targets (list): the target of each estimator, as a numpy array over the training events
+        folds (list): the training and test row indices of each fold
+        n_jobs (int): the number of cores to fit the models of the folds across, -1 for all of them
+
+    Returns:
+        scores (list): the score of each fold, as a numpy array, for each model
+
+    """
+    matrices = [transform_fold(ct, training_data, train_index, test_index) for train_index, test_index in folds]
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(fit_fold)(clone(model), matrices[fold][0], matrices[fold][1], y, folds[fold][0], folds[fold][1])
+        for model, y in zip(models, targets) for fold in range(len(folds)))
+
+    return [np.array([result['score'] for result in results[i * len(folds):(i + 1) * len(folds)]])
+            for i in range(len(models))]
+
+
+def build_estimators(model_type, early_stopping=False, text=False):
+    """function for building the unfit classification and regression estimators of a type of model
+
+    Args:
+        model_type (str): an indicator of the type of model ('linear', 'tree', 'forest', 'boosted', or 'sgd')
+        early_stopping (bool): whether estimators that support it should stop fitting once their score on a
+            validation split of the training events stops improving
+        text (bool): whether the inputs include the hashed text columns, in which case the linear regression is
+            regularized
+
+    Returns:
+        classifier_model (estimator): the unfit classification estimator
+        regressor_model (estimator): the unfit regression estimator
+
+    """
     # if linear modeling is specified, then use a logistic regression for isSoldOut
-    # and a linear regression for soldOutLead
+    # and a linear regression for soldOutLead, a ridge regression when the thousands of hashed text columns would
+    # otherwise let it memorize the training events
     if model_type == 'linear':
-        classifier = Pipeline([('transform', ct), ('log', LogisticRegression())])
-        regressor = Pipeline([('transform', ct), ('regr', LinearRegression())])
+        classifier_model = LogisticRegression()
+        regressor_model = Ridge(alpha=10.0) if text else LinearRegression()
 
     # if tree modeling is specified, the use decision trees for both types
     elif model_type == 'tree':
-        classifier = Pipeline([('transform', ct), ('log', DecisionTreeClassifier())])
-        regressor = Pipeline([('transform', ct), ('regr', DecisionTreeRegressor())])
+        classifier_model, regressor_model = DecisionTreeClassifier(), DecisionTreeRegressor()
+
+    # if forest or boosted modeling is specified, then use random forests or gradient boosted trees for both types
+    elif model_type == 'forest':
+        classifier_model = RandomForestClassifier(n_estimators=100, random_state=123)
+        regressor_model = RandomForestRegressor(n_estimators=100, random_state=123)
+
+    elif model_type == 'boosted':
+        classifier_model = GradientBoostingClassifier(random_state=123)
+        regressor_model = GradientBoostingRegressor(random_state=123)
+
+    # if sgd modeling is specified, then use linear models fit by stochastic gradient descent, which can be updated
+    # incrementally with update_models
+    elif model_type == 'sgd':
+        classifier_model = SGDClassifier(loss='log_loss', random_state=123)
+        regressor_model = SGDRegressor(random_state=123)
 
     else:
-        logger.error('Invalid/unsupport model type, should be "linear" or "tree"')
+        logger.error('Invalid/unsupport model type, should be "linear", "tree", "forest", "boosted", or "sgd"')
         sys.exit()
 
-    # fit the models
-    classifier.fit(training_data, y_class)
-    regressor.fit(training_data, y_regress)
+    # sgd stops on a validation split with early_stopping, and gradient boosting with n_iter_no_change
+    if early_stopping:
+        for model in [classifier_model, regressor_model]:
+            params = model.get_params()
+            if 'early_stopping' in params:
+                model.set_params(early_stopping=True)
+            elif 'n_iter_no_change' in params:
+                model.set_params(n_iter_no_change=5)
+
+    return classifier_model, regressor_model
+
+
+def train_models(model_type, features, n_jobs=None, cache_location=None, n_splits=5, early_stopping=False):
+    """function for training a model of specified type using a set of passed features
+
+    Args:
+        model_type (str): an indicator of the type of model to train ('linear', 'tree', 'forest', 'boosted', or 'sgd')
+        features (Pandas DataFrame): a dataframe containing all the features data in the database
+        n_jobs (int): the number of cores to cross validate the models across, -1 for all of them
+        cache_location (str): the local folder of the design matrix caches, or None to not cache the matrix
+        n_splits (int): the number of folds to cross validate the models with
+        early_stopping (bool): whether estimators that support it should stop fitting early (see build_estimators)
+
+    Returns:
+        classifier (Model object): the trained classification model
+        regressor (Model object): the trained regression model
+        metrics (dict): the training metrics of the models (see model_metrics)
+
+    """
+    logger.debug('Start of train model function')
+
+    training_data, y_class, y_regress, cat_cols, num_cols = prepare_training_data(features)
+    text_cols = text_columns(training_data)
+    ct = build_transformer(cat_cols, num_cols, text_cols)
+    classifier_model, regressor_model = build_estimators(model_type, early_stopping, len(text_cols) > 0)
+
+    # fit the models on a single fit of the transformer
+    classifier, regressor, X = fit_shared(ct, classifier_model, regressor_model, training_data, y_class, y_regress,
+                                          cache_location)
+
+    # log the training errors and CV errors of the models, scoring both on the design matrix they were fit on
+    metrics = model_metrics(classifier, regressor, features, X=X)
+    logger.info('Classifier training accuracy: %s', metrics['trainingAccuracy'])
+    logger.info('Regressor training r-squared: %s', metrics['trainingRSquared'])
+
+    folds = list(KFold(n_splits=n_splits, shuffle=True, random_state=123).split(training_data))
+    class_scores, regress_scores = cross_validate_shared(ct, [classifier_model, regressor_model], training_data,
+                                                         [y_class, y_regress], folds, n_jobs)
+    logger.info('Classifier %s-fold CV score: %s', n_splits, class_scores)
+    logger.info('Regressor %s-fold CV score: %s', n_splits, regress_scores)
+
+    # return the models and their training metrics
+    return classifier, regressor, metrics
+
+
+def model_metrics(classifier, regressor, features, cache_location=None, X=None):
+    """function for computing the training metrics of a pair of models, recorded with their version in the registry
+
+    Both models are scored on a single design matrix, as they share the fit of their transformer (see fit_shared).
+
+    Args:
+        classifier (Model object): a trained classification model
+        regressor (Model object): a trained regression model
+        features (Pandas DataFrame): a dataframe containing all the features data in the database
+        cache_location (str): the local folder of the design matrix caches, or None to not cache the matrix
+        X (sparse matrix): the design matrix of the training events the models were fit on, or None to encode them
+
+    Returns:
+        metrics (dict): the training accuracy of the classifier, the training r-squared of the regressor, and the
+            number of training events
+
+    """
+    training_data, y_class, y_regress, cat_cols, num_cols = prepare_training_data(features)
+    if X is None:
+        X = design_matrix(classifier.steps[0][1], training_data, cache_location)
+
+    return {'trainingAccuracy': float(classifier.steps[-1][1].score(X, y_class)),
+            'trainingRSquared': float(regressor.steps[-1][1].score(X, y_regress)),
+            'numEvents': int(training_data.shape[0])}
+
+
+def subsample_training_events(features, row_budget, random_state=123):
+    """function for sampling the training events of a set of features down to a number of rows
+
+    The sample is stratified by isSoldOut, so it keeps the share of sold out events of all the training events.
+
+    Args:
+        features (Pandas DataFrame): a dataframe containing all the features data in the database
+        row_budget (int): the number of training events to sample
+        random_state (int): the seed of the sample
+
+    Returns:
+        sample (Pandas DataFrame): the features of the sampled training events
+        rest (Pandas DataFrame): the features of the other training events
+
+    """
+    training = features.loc[(features['startDate'] < datetime.today()) | (features['isSoldOut'] == 1)]
+    if training.shape[0] <= row_budget:
+        return training, training.iloc[:0]
+
+    # a class with a single event can't be split, so the sample is only stratified when each class has two
+    stratify = training['isSoldOut'] if training['isSoldOut'].value_counts().min() >= 2 else None
+    sample, rest = train_test_split(training, train_size=row_budget, stratify=stratify, random_state=random_state)
+    return sample, rest
+
+
+def extrapolate_score(num_small, score_small, num_sample, score_sample, num_full):
+    """helper function for estimating the score of a model fit on all the events from its scores on two samples
+
+    The error is assumed to fall as one over the square root of the number of training events, a common shape of a
+    learning curve, which the two scores fix. The estimate is capped at a perfect score of 1.
+    """
+    if num_small >= num_sample or num_sample >= num_full:
+        return score_sample
+    slope = (score_sample - score_small) / (num_small ** -0.5 - num_sample ** -0.5)
+    return min(score_sample + slope * (num_sample ** -0.5 - num_full ** -0.5), 1.0)
+
+
+def train_fast(model_type, features, row_budget, n_splits=3, n_jobs=None):
+    """function for quickly training approximate models, for iterating on the pipeline
+
+    The models are trained on a stratified sample of row_budget training events, cross validated with fewer folds,
+    and stop early where their estimators support it. Their gap to models trained on every event is estimated by also
+    fitting them on half the sample, scoring both on events left out of the sample, and extrapolating the learning
+    curve to all the training events (see extrapolate_score), and is logged.
+
+    Args:
+        model_type (str): an indicator of the type of model to train
+        features (Pandas DataFrame): a dataframe containing all the features data in the database
+        row_budget (int): the number of training events to train on
+        n_splits (int): the number of folds to cross validate the models with
+        n_jobs (int): the number of cores to cross validate the models across, -1 for all of them
+
+    Returns:
+        classifier (Model object): the trained classification model
+        regressor (Model object): the trained regression model
+        estimates (dict): the held out accuracy and r-squared of the models, and the estimates of those of models
+            trained on every event (empty when every event fit in the budget)
+
+    """
+    sample, rest = subsample_training_events(features, row_budget)
+    num_full = sample.shape[0] + rest.shape[0]
+    logger.info('Fast training on %s of %s training events (%.1f%% sold out, %.1f%% in all of them)', sample.shape[0],
+                num_full, 100 * sample['isSoldOut'].mean(), 100 * pd.concat([sample, rest])['isSoldOut'].mean())
+
+    classifier, regressor = train_models(model_type, sample, n_jobs, n_splits=n_splits, early_stopping=True)[:2]
+    if rest.shape[0] == 0:
+        logger.info('Every training event fit in the row budget, so there is no gap to training on all of them')
+        return classifier, regressor, {}
+
+    # fit the models on half of the sample, and score both fits on (at most row_budget of) the events left out
+    half = subsample_training_events(sample, sample.shape[0] // 2)[0]
+    half_data, half_class, half_regress, cat_cols, num_cols = prepare_training_data(half)
+    half_classifier, half_regressor = fit_shared(build_transformer(cat_cols, num_cols, text_columns(half_data)),
+                                                 *build_estimators(model_type, True, len(text_columns(half_data)) > 0),
+                                                 half_data, half_class, half_regress)[:2]
+    held_out = subsample_training_events(rest, row_budget)[0]
+    held_data, held_class, held_regress = prepare_training_data(held_out)[:3]
+
+    estimates = {}
+    for name, models, y in [('Accuracy', (half_classifier, classifier), held_class),
+                            ('RSquared', (half_regressor, regressor), held_regress)]:
+        score_half, score_sample = (float(model.score(held_data, y)) for model in models)
+        estimates['heldOut' + name] = score_sample
+        estimates['estimatedFull' + name] = extrapolate_score(half.shape[0], score_half, sample.shape[0],
+                                                              score_sample, num_full)
+        logger.info('Fast %s held out: %.4f (%.4f on half the sample), estimated with every training event: %.4f, '
+                    'an estimated gap of %+.4f', name, score_sample, score_half, estimates['estimatedFull' + name],
+                    estimates['estimatedFull' + name] - score_sample)
+
+    return classifier, regressor, estimates
+
+
+def text_columns(training_data):
+    """helper function for the TEXT_COLUMNS in a set of inputs"""
+    return [column for column in TEXT_COLUMNS if column in training_data.columns]
+
+
+def compile_linear_model(model):
+    """function for compiling a fitted linear pipeline into the arrays of a numpy LinearPredictor
+
+    The coefficients of the one hot encoded columns are split out per categorical column and sorted by the string of
+    their category, so the predictor can look them up with a binary search, and the means and scales of the standard
+    scaler are kept along with the coefficients of the numerical columns. The coefficients of the hashed token columns
+    are kept whole, the predictor hashing the tokens the same way.
+
+    Args:
+        model (Pipeline): a fitted pipeline of the transformer and a linear estimator (a binary classifier with
+            predict_proba or a regressor)
+
+    Returns:
+        arrays (dict): the arrays of the LinearPredictor, or None if the pipeline can't be compiled
+
+    """
+    ct, estimator = model.steps[0][1], model.steps[-1][1]
+    if not hasattr(estimator, 'coef_') or (hasattr(estimator, 'classes_') and len(estimator.classes_) != 2):
+        return None
+
+    coef = np.ravel(estimator.coef_).astype(np.float64)
+    arrays = {'intercept': np.float64(np.ravel(estimator.intercept_)[0] if np.ndim(estimator.intercept_) > 0
+                                      else estimator.intercept_),
+              'classes': np.asarray(estimator.classes_) if hasattr(estimator, 'classes_') else np.array([])}
+
+    # walk the output columns of the transformer in order
+    offset = 0
+    cat_columns = []
+    text_cols = []
+    arrays['num_columns'] = np.array([], dtype=str)
+    for name, transformer, columns in ct.transformers_:
+        if name == 'remainder' and transformer == 'drop':
+            continue
+
+        if name == 'cat' and transformer.named_steps['ohe'].drop_idx_ is None:
+            for column, categories in zip(columns, transformer.named_steps['ohe'].categories_):
+                values = np.asarray(categories).astype(str)
+                order = np.argsort(values, kind='mergesort')
+                arrays['cat_values_{}'.format(len(cat_columns))] = values[order]
+                arrays['cat_coef_{}'.format(len(cat_columns))] = coef[offset:offset + len(categories)][order]
+                cat_columns.append(column)
+                offset += len(categories)
+
+        elif name == 'num':
+            scaler = transformer.named_steps['ss']
+            arrays['num_columns'] = np.array(columns, dtype=str)
+            arrays['num_mean'] = np.asarray(scaler.mean_, dtype=np.float64)
+            arrays['num_scale'] = np.asarray(scaler.scale_, dtype=np.float64)
+            arrays['num_coef'] = coef[offset:offset + len(columns)]
+            offset += len(columns)
+
+        elif name.startswith('text_') and hashed_like_predictor(transformer):
+            arrays['text_coef_{}'.format(len(text_cols))] = coef[offset:offset + transformer.n_features]
+            text_cols.append(columns)
+            offset += transformer.n_features
+
+        else:
+            return None
+
+    if offset != len(coef):
+        return None
+
+    arrays['cat_columns'] = np.array(cat_columns, dtype=str)
+    arrays['text_columns'] = np.array(text_cols, dtype=str)
+    return arrays
+
+
+def hashed_like_predictor(vectorizer):
+    """helper function for checking that a HashingVectorizer tokenizes and hashes as the numpy predictor does"""
+    return (isinstance(vectorizer, HashingVectorizer) and vectorizer.analyzer == 'word' and vectorizer.lowercase
+            and vectorizer.token_pattern == TOKEN_PATTERN and vectorizer.ngram_range == (1, 1) and vectorizer.binary
+            and vectorizer.norm is None and not vectorizer.alternate_sign and vectorizer.preprocessor is None
+            and vectorizer.tokenizer is None and vectorizer.strip_accents is None and vectorizer.stop_words is None)
+
+
+def export_linear_models(classifier, regressor):
+    """function for exporting a fitted linear classifier and regressor as a single numpy artifact
+
+    The artifact (an npz of the arrays of both models) is loaded by linear_predictor.load_linear_models, which only
+    needs numpy, so scoring doesn't have to import sklearn or unpickle the pipelines.
+
+    Args:
+        classifier (Model object): a trained classification model
+        regressor (Model object): a trained regression model
+
+    Returns:
+        artifact (bytes): the npz of the compiled models, or None if either isn't a compilable linear model
+
+    """
+    compiled = {'classifier': compile_linear_model(classifier), 'regressor': compile_linear_model(regressor)}
+    if compiled['classifier'] is None or compiled['regressor'] is None:
+        logger.debug('The models are not linear, no linear artifact exported')
+        return None
+
+    buffer = io.BytesIO()
+    np.savez(buffer, **{'{}.{}'.format(model, key): value for model, arrays in compiled.items()
+                        for key, value in arrays.items()})
+    return buffer.getvalue()
+
+
+def update_models(classifier, regressor, features, trained_ids, cache_location=None):
+    """function for updating fit models with only the training events they haven't been trained on yet
+
+    The transformer of the models is kept frozen (the categories and scaling of their last full training), and the
+    estimators take a single partial_fit pass over the new events, so the update grows with the new events rather than
+    with every past event.
+
+    Args:
+        classifier (Model object): a trained classification model, with an estimator that supports partial_fit
+        regressor (Model object): a trained regression model, with an estimator that supports partial_fit
+        features (Pandas DataFrame): a dataframe containing all the features data in the database
+        trained_ids (set): the ids of the events the models have already been trained on
+        cache_location (str): the local folder of the design matrix caches, or None to not cache the matrix
+
+    Returns:
+        classifier (Model object): the updated classification model
+        regressor (Model object): the updated regression model
+        new_ids (list): the ids of the events the models were updated with
+
+    """
+    logger.debug('Start of update models function')
+
+    training_data, y_class, y_regress, cat_cols, num_cols = prepare_training_data(features)
+    new = ~training_data.index.isin(list(trained_ids))
+    new_ids = list(training_data.index[new])
+    logger.info('Updating the models with %s newly labeled events', len(new_ids))
+
+    if len(new_ids) > 0:
+        X = design_matrix(classifier.steps[0][1], training_data.loc[new], cache_location)
+        classifier.steps[-1][1].partial_fit(X, y_class[new])
+        regressor.steps[-1][1].partial_fit(X, y_regress[new])
+
+    return classifier, regressor, new_ids
+
+
+def create_training_tables(engine):
+    """function for creating the training_runs and trained_events tables in a database
+
+    Given a database connection engine, access the database and create a training_runs table, which records each
+    full training or incremental update of the models, and a trained_events table, which holds the ids of the events
+    the current models were trained on (the watermark of the incremental updates).
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        None
+
+    """
+    # check if the tables already exist, stop execution if they do
+    if 'training_runs' in engine.table_names() and 'trained_events' in engine.table_names():
+        logger.debug('training_runs and trained_events tables already exist')
+
+    else:
+        logger.debug("Creating the training_runs and trained_events tables at %s", engine.url)
+
+        Base = declarative_base()
+
+        # create a training run class, one row per training or update of the models
+        class TrainingRun(Base):
+            """Create a data model for the training_runs table """
+            __tablename__ = 'training_runs'
+            id = Column(Integer(), primary_key=True)
+            runDate = Column(DATETIME(), unique=False, nullable=False)
+            mode = Column(String(20), unique=False, nullable=False)
+            modelType = Column(String(20), unique=False, nullable=False)
+            numEvents = Column(Integer(), unique=False, nullable=False)
+
+            def __repr__(self):
+                return '<TrainingRun %r>' % self.id
+
+        # create a trained event class, one row per event the current models were trained on
+        class TrainedEvent(Base):
+            """Create a data model for the trained_events table """
+            __tablename__ = 'trained_events'
+            id = Column(String(12), primary_key=True)
+            trainedDate = Column(DATETIME(), unique=False, nullable=False)
+
+            def __repr__(self):
+                return '<TrainedEvent %r>' % self.id
+
+        try:
+            # create the tables
+            Base.metadata.create_all(engine)
+            logger.info("Created tables training_runs and trained_events")
+        except Exception as e:
+            logger.error("Could not create the training tables: %s", e)
+
+
+def get_training_state(engine):
+    """function for getting the state of the last training of the models
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+
+    Returns:
+        state (dict): the modelType and date of the last full training (lastFullDate), and the set of ids of the
+            events the models were trained on (trainedIds), or None if the models were never trained
+
+    """
+    with engine.connect() as connection:
+        last_full = connection.execute("SELECT runDate, modelType FROM training_runs WHERE mode = 'full' "
+                                       "ORDER BY runDate DESC LIMIT 1").first()
+        if last_full is None:
+            return None
+
+        trained_ids = set(row[0] for row in connection.execute('SELECT id FROM trained_events'))
+
+    return {'lastFullDate': pd.to_datetime(last_full[0]).to_pydatetime(), 'modelType': last_full[1],
+            'trainedIds': trained_ids}
+
+
+def record_training(engine, ids, mode, model_type):
+    """function for recording a training of the models along with the events it was trained on
+
+    A full training replaces the trained events, while an incremental update adds to them, in a single transaction.
 
-    # log the training errors and CV errors of the models
-    logger.info('Classifier training accuracy: %s', classifier.score(training_data, y_class))
-    logger.info('Regressor training r-squared: %s', regressor.score(training_data, y_regress))
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        ids (list): the ids of the events trained on
+        mode (str): 'full' or 'incremental'
+        model_type (str): the type of the models
+
+    Returns:
+        None
+
+    """
+    run_date = datetime.now()
+    with engine.begin() as connection:
+        if mode == 'full':
+            connection.execute('DELETE FROM trained_events')
+        if len(ids) > 0:
+            connection.execute(text('INSERT INTO trained_events (id, trainedDate) VALUES (:id, :trainedDate)'),
+                               [{'id': str(event_id), 'trainedDate': run_date} for event_id in ids])
+        connection.execute(text('INSERT INTO training_runs (runDate, mode, modelType, numEvents) '
+                                'VALUES (:runDate, :mode, :modelType, :numEvents)'),
+                           runDate=run_date, mode=mode, modelType=model_type, numEvents=len(ids))
+
+
+def load_saved_models(engine, model_location, location_type):
+    """helper function for loading the current models to update, returning None if there are none to load"""
+    try:
+        return get_models(engine, model_location, location_type, mmap=False)
+    except Exception as e:
+        logger.warning('No saved models to update: %s', e)
+        return None
 
-    kf = KFold(n_splits=5, shuffle=True, random_state=123)
-    logger.info('Classifier 5-fold CV score: %s', cross_val_score(classifier, training_data, y_class, cv=kf))
-    logger.info('Regressor 5-fold CV score: %s', cross_val_score(regressor, training_data, y_regress, cv=kf))
 
-    # return the models
-    return classifier, regressor
+def train_or_update_models(engine, model_type, features, models=None, full_retrain_days=None, n_jobs=None,
+                           cache_location=None):
+    """function for updating the saved models incrementally when possible, and training them from scratch otherwise
+
+    The models are trained from scratch when no saved models are given, when they were never trained or were last
+    trained as another type, when their estimators don't support partial_fit, or when their last full training is
+    older than full_retrain_days. Otherwise they are updated with only the events labeled since they were trained.
+
+    Args:
+        engine (SQLAlchemy engine): the engine for working with a database
+        model_type (str): an indicator of the type of model to train
+        features (Pandas DataFrame): a dataframe containing all the features data in the database
+        models (tuple): the saved classifier and regressor to update, or None to train from scratch
+        full_retrain_days (int): the number of days after which the models are trained from scratch, or None to
+            keep updating them
+        n_jobs (int): the number of cores to cross validate the models across, -1 for all of them
+        cache_location (str): the local folder of the design matrix caches, or None to not cache the matrix
+
+    Returns:
+        classifier (Model object): the trained classification model
+        regressor (Model object): the trained regression model
+        mode (str): 'full' or 'incremental'
+        metrics (dict): the training metrics of the models (see model_metrics)
+
+    """
+    create_training_tables(engine)
+    state = get_training_state(engine)
+
+    full = True
+    if models is None or state is None:
+        logger.info('No saved models and trainings to update, training from scratch')
+    elif state['modelType'] != model_type:
+        logger.info('The saved models are of type %s, training from scratch', state['modelType'])
+    elif not all(hasattr(model.steps[-1][1], 'partial_fit') for model in models):
+        logger.info('The %s models can\'t be updated incrementally, training from scratch', model_type)
+    elif full_retrain_days is not None and datetime.now() - state['lastFullDate'] > timedelta(days=full_retrain_days):
+        logger.info('The last full training is older than %s days, training from scratch', full_retrain_days)
+    else:
+        full = False
+
+    if full:
+        classifier, regressor, metrics = train_models(model_type, features, n_jobs, cache_location)
+        ids = list(prepare_training_data(features)[0].index)
+    else:
+        classifier, regressor, ids = update_models(models[0], models[1], features, state['trainedIds'],
+                                                   cache_location)
+        metrics = model_metrics(classifier, regressor, features, cache_location)
+
+    record_training(engine, ids, 'full' if full else 'incremental', model_type)
+
+    return classifier, regressor, 'full' if full else 'incremental', metrics
+
+
+def fit_fold(model, X_train, X_test, y, train_index, test_index):
+    """helper function for fitting a model on the design matrix of the training rows of a fold and scoring it on the rest"""
+    start = time.time()
+    model.fit(X_train, y[train_index])
+    fit_time = time.time() - start
+
+    return {'score': float(model.score(X_test, y[test_index])), 'fitTime': fit_time}
+
+
+def search_models(features, families=None, n_jobs=-1, n_splits=5, cache_location=None):
+    """function for searching the families of models and grids of hyperparameters for the best models
+
+    Every candidate (a family and a set of its hyperparameters, for the classifier and the regressor) is cross
+    validated on the same folds, with the folds of every candidate fit in parallel. The result of each fold is cached
+    under a hash of the training data, the candidate, and the fold, so a repeated search only fits the folds of
+    candidates or data it hasn't seen. The transformer is fit once per fold and its design matrices shared by every
+    candidate. The best classifier (by accuracy) and regressor (by r-squared) are then refit on all the training data,
+    on a single fit of the transformer.
+
+    Args:
+        features (Pandas DataFrame): a dataframe containing all the features data in the database
+        families (list): the families of MODEL_FAMILIES to search, all of them if None
+        n_jobs (int): the number of cores to fit the folds across, -1 for all of them
+        n_splits (int): the number of folds of the cross validation
+        cache_location (str): the local folder to cache the fold results in, or None to not cache them
+
+    Returns:
+        classifier (Model object): the best classification model, trained on all the training data
+        regressor (Model object): the best regression model, trained on all the training data
+        leaderboard (Pandas DataFrame): the mean and standard deviation of the scores of each candidate, best first
+            for each of the classifier and regressor
+
+    """
+    logger.debug('Start of search models function')
+
+    if families is None:
+        families = list(MODEL_FAMILIES.keys())
+
+    unknown = [family for family in families if family not in MODEL_FAMILIES]
+    if len(unknown) > 0:
+        logger.error('Invalid/unsupported model families %s, should be in %s', unknown, list(MODEL_FAMILIES.keys()))
+        sys.exit()
+
+    training_data, y_class, y_regress, cat_cols, num_cols = prepare_training_data(features)
+    targets = {'classifier': y_class, 'regressor': y_regress}
+    ct = build_transformer(cat_cols, num_cols, text_columns(training_data))
+    folds = list(KFold(n_splits=n_splits, shuffle=True, random_state=123).split(training_data))
+    data_hash = joblib_hash((training_data, y_class, y_regress))
+
+    # list every fold of every candidate, and look up the ones already cached
+    candidates = [(task, family, params) for family in families for task in ['classifier', 'regressor']
+                  for params in ParameterGrid(MODEL_FAMILIES[family][task][1])]
+    results = {}
+    to_fit = []
+    for candidate in range(len(candidates)):
+        task, family, params = candidates[candidate]
+        for fold in range(n_splits):
+            key = joblib_hash((data_hash, n_splits, fold, task, family, MODEL_FAMILIES[family][task][0].__name__,
+                               sorted(params.items(), key=lambda item: item[0])))
+            cache_file = os.path.join(cache_location, key + '.json') if cache_location is not None else None
+            if cache_file is not None and os.path.exists(cache_file):
+                with open(cache_file, 'r') as f:
+                    results[(candidate, fold)] = json.load(f)
+            else:
+                to_fit.append((candidate, fold, cache_file))
+
+    logger.info('Searching %s candidates over %s folds, %s folds cached and %s to fit', len(candidates), n_splits,
+                len(results), len(to_fit))
+
+    # fit the folds that aren't cached across the cores on the design matrices of their fold, then cache their results
+    def candidate_model(candidate):
+        task, family, params = candidates[candidate]
+        estimator, grid = MODEL_FAMILIES[family][task]
+        return estimator(**params)
+
+    matrices = {fold: transform_fold(ct, training_data, folds[fold][0], folds[fold][1])
+                for fold in sorted(set(fold for candidate, fold, cache_file in to_fit))}
+    fitted = Parallel(n_jobs=n_jobs)(
+        delayed(fit_fold)(candidate_model(candidate), matrices[fold][0], matrices[fold][1],
+                          targets[candidates[candidate][0]], folds[fold][0], folds[fold][1])
+        for candidate, fold, cache_file in to_fit)
+
+    if cache_location is not None and len(to_fit) > 0:
+        os.makedirs(cache_location, exist_ok=True)
+    for (candidate, fold, cache_file), result in zip(to_fit, fitted):
+        results[(candidate, fold)] = result
+        if cache_file is not None:
+            with open(cache_file, 'w') as f:
+                json.dump(result, f)
+
+    # rank the candidates of each task by their mean score over the folds
+    leaderboard = pd.DataFrame([{'task': candidates[candidate][0], 'family': candidates[candidate][1],
+                                 'params': json.dumps(candidates[candidate][2], sort_keys=True),
+                                 'candidate': candidate, 'fold': fold, 'score': result['score'],
+                                 'fitTime': result['fitTime']}
+                                for (candidate, fold), result in results.items()])
+    leaderboard = leaderboard.groupby(['task', 'family', 'params', 'candidate']).agg(
+        meanScore=('score', 'mean'), stdScore=('score', 'std'), meanFitTime=('fitTime', 'mean')).reset_index()
+    leaderboard = leaderboard.sort_values(['task', 'meanScore'], ascending=[True, False]).reset_index(drop=True)
+    leaderboard['rank'] = leaderboard.groupby('task').cumcount() + 1
+
+    # refit the best candidate of each task on all the training data
+    best = {}
+    for task in ['classifier', 'regressor']:
+        winner = leaderboard.loc[(leaderboard['task'] == task) & (leaderboard['rank'] == 1)].iloc[0]
+        logger.info('Best %s: %s %s with a mean CV score of %s', task, winner['family'], winner['params'],
+                    winner['meanScore'])
+        best[task] = candidate_model(int(winner['candidate']))
+
+    classifier, regressor = fit_shared(ct, best['classifier'], best['regressor'], training_data, y_class, y_regress)[:2]
+
+    return classifier, regressor, leaderboard.drop(columns=['candidate'])
 
 
 def save_models_local(classifier, regressor, location):
@@ -170,6 +921,44 @@ def save_models_s3(classifier, regressor, location):
         logger.error(e)
 
 
+def save_leaderboard_local(leaderboard, location):
+    """function for saving the leaderboard of a model search next to the models
+
+    Args:
+        leaderboard (Pandas DataFrame): the leaderboard returned by search_models
+        location (path): the path object for where to save the leaderboard (should be a directory)
+
+    Returns:
+        None
+
+    """
+    with open(os.path.join(location, 'leaderboard.csv'), "w") as f:
+        f.write(leaderboard.to_csv(index=False))
+        logger.info("Model search leaderboard saved to %s", f.name)
+
+
+def save_leaderboard_s3(leaderboard, location):
+    """function for saving the leaderboard of a model search next to the models in s3
+
+    Args:
+        leaderboard (Pandas DataFrame): the leaderboard returned by search_models
+        location (str): the name of the s3 bucket the models are saved in
+
+    Returns:
+        None
+
+    """
+    # create an s3 resource
+    s3 = boto3.resource('s3')
+
+    try:  # try creating the object
+        response = s3.Object(location, 'models/leaderboard.csv').put(Body=leaderboard.to_csv(index=False))
+        logger.info("Model search leaderboard uploaded as %s", response["ETag"])
+
+    except Exception as e:
+        logger.error(e)
+
+
 def run_train_model(args):
     """runs the model training scripts"""
     try:  # opens the specified config file
@@ -205,7 +994,7 @@ def run_train_model(args):
             sys.exit()
 
         # create the engine for the database and type
-        engine = create_db_engine(db_name, type)
+        engine = create_db_engine(db_name, type, **get_engine_options(config))
 
     elif config["database_info"]["how"] == "local":
         # if a type argument was passed, then use it for calling the appropriate database type
@@ -234,7 +1023,7 @@ def run_train_model(args):
             sys.exit()
 
         # create the engine for the database and type
-        engine = create_db_engine(db_name, type)
+        engine = create_db_engine(db_name, type, **get_engine_options(config))
 
     else:
         logger.error('Method of database storage (should be "rds" or "local") in config file not supported')
@@ -243,6 +1032,11 @@ def run_train_model(args):
     # pull the features
     features = pull_features(engine)
 
+    # take the inputs of each event as of a number of days before it started, if set in the config file
+    as_of_days = config.get("model_info", {}).get("as_of_days", None)
+    if as_of_days is not None:
+        features = point_in_time_features(engine, features, as_of_days)
+
     # if a model_type argument was passed, then use it
     if args.model_type is not None:
         model_type = args.model_type
@@ -255,8 +1049,56 @@ def run_train_model(args):
         logger.error('Model type must be pass in arguments or in the config file')
         sys.exit()
 
-    # train the models
-    classifier, regressor = train_models(model_type, features)
+    # the settings of the search, searching every family across every core unless set in the config file
+    search_info = config.get("model_info", {}).get("search", {})
+    n_jobs = search_info.get("n_jobs", -1)
+
+    # search the families of models for the best ones if asked to, otherwise train the models of the given type
+    leaderboard = None
+    estimates = {}
+    metrics = None
+    if args.search:
+        classifier, regressor, leaderboard = search_models(features, search_info.get("families", None), n_jobs,
+                                                           search_info.get("n_splits", 5),
+                                                           search_info.get("cache_location", None))
+        logger.info('Model search leaderboard:\n%s', leaderboard.to_string())
+
+        # record the search as a full training, so the next incremental update starts from scratch
+        create_training_tables(engine)
+        record_training(engine, list(prepare_training_data(features)[0].index), 'full', 'search')
+
+    # train approximate models on a sample of the events if asked to, for iterating quickly on the pipeline
+    elif args.fast:
+        fast_info = config.get("model_info", {}).get("fast", {})
+        classifier, regressor, estimates = train_fast(model_type, features, fast_info.get("row_budget", 20000),
+                                                      fast_info.get("n_splits", 3), n_jobs)
+
+    # otherwise train the models from scratch, or, if asked to, update the saved models with only the newly labeled
+    # events (retraining them periodically)
+    else:
+        model_info = config.get("model_info", {})
+        models = None
+        if args.incremental:
+            models = load_saved_models(engine, args.model_location if args.model_location is not None else
+                                       model_info.get("model_location", "models"),
+                                       args.location_type if args.location_type is not None else
+                                       model_info.get("location_type", "local"))
+        classifier, regressor, mode, metrics = train_or_update_models(
+            engine, model_type, features, models, model_info.get("incremental", {}).get("full_retrain_days", None),
+            n_jobs, model_info.get("design_cache", None))
+
+    # the local folder of the design matrix caches, if set in the config file (fast models aren't cached, so their
+    # transformers don't push out the caches of the full ones)
+    design_cache = config.get("model_info", {}).get("design_cache", None) if not args.fast else None
+
+    # the type the models are registered as, fast models being registered as candidates rather than made current,
+    # along with the estimates of their gap to full training
+    registered_type = 'search' if args.search else model_type + '-fast' if args.fast else model_type
+    promote = not args.fast
+
+    # the training metrics of searched and fast models, which aren't scored by their training on all the events
+    if metrics is None:
+        metrics = model_metrics(classifier, regressor, features, design_cache)
 
     # check for the specified save location type as an argument or in the config file
     if args.location_type is not None:
@@ -284,10 +1126,14 @@ def run_train_model(args):
             logger.error('Model location must be passed in arguments or in the config file')
             sys.exit()
 
-        # save in identified location
+        # save in identified location, as a new current version in the registry
         models_path = os.path.join(model_location)
 
-        save_models_local(classifier, regressor, models_path)
+        register_models(engine, classifier, regressor, models_path, save_type, registered_type,
+                        dict(metrics, **estimates),
+                        export_linear_models(classifier, regressor), promote)
+        if leaderboard is not None:
+            save_leaderboard_local(leaderboard, models_path)
 
     # if the location type is 's3', then save the models in s3
     elif save_type == 's3':
@@ -304,10 +1150,14 @@ def run_train_model(args):
             logger.error('Model location must be passed in arguments or in the config file')
             sys.exit()
 
-        # save in identified location
+        # save in identified location, as a new current version in the registry
         models_path = os.path.join(model_location)
 
-        save_models_s3(classifier, regressor, models_path)
+        register_models(engine, classifier, regressor, models_path, save_type, registered_type,
+                        dict(metrics, **estimates),
+                        export_linear_models(classifier, regressor), promote)
+        if leaderboard is not None:
+            save_leaderboard_s3(leaderboard, models_path)
 
     # otherwise, log the error and exit
     else:
@@ -324,9 +1174,17 @@ if __name__ == '__main__':
     parser.add_argument('--type', default=None, help="type of database to create, 'sqlite' or 'mysql+pymysql'")
     parser.add_argument('--database_name', default=None,
                         help="location where database is to be created (including name.db)")
-    parser.add_argument('--model_type', default='linear', help='type of models to train, should be "linear" or "tree"')
+    parser.add_argument('--model_type', default='linear',
+                        help='type of models to train, should be "linear", "tree", "forest", "boosted", or "sgd"')
     parser.add_argument('--model_location', default=None, help='location of where to save models')
     parser.add_argument('--location_type', default=None, help='whether the models will be saved locally or in s3')
+    parser.add_argument('--search', action='store_true',
+                        help='search the families of models and their hyperparameters for the best models')
+    parser.add_argument('--incremental', action='store_true',
+                        help='update the saved models with only the events labeled since they were trained')
+    parser.add_argument('--fast', action='store_true',
+                        help='train approximate models on a sample of the events, logging their estimated gap to '
+                             'full training')
 
     args = parser.parse_args()
 
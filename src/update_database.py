@@ -17,10 +17,12 @@ configPath = os.path.join("config","logging","local.conf")
 logging.config.fileConfig(configPath)
 logger = logging.getLogger("update_database_log")
 
-from src.helpers.helpers import API_request, set_headers, create_db_engine  # import helper functions for API requests, headers setting, and creating a DB engine
+from src.helpers.helpers import API_request, set_headers, create_db_engine, get_engine_options  # import helper functions for API requests, headers setting, and creating a DB engine
 from src.helpers.helpers import create_event, create_venue, create_frmat, create_category  # import helper functions for DB creation
 from src.helpers.helpers import update_event, update_venue, update_frmat, update_category  # import helper functions for DB update
 from src.helpers.helpers import event_to_event_dict, event_to_venue_dict  # import helpers for event and venue comparison as dicts
+from src.sell_out_stats import create_sell_out_stats_table, rebuild_sell_out_stats, read_event_rows, update_sell_out_stats  # import the upkeep of the sell out statistics
+from src.event_velocity import update_event_velocity  # import the upkeep of the pull counters
 
 
 def update_format_categories(engine, frmats_URL, categories_URL, headers=None):
@@ -182,6 +184,12 @@ def update_events_venues(engine, raw_data_location, location_type):
     session_mk.configure(bind=engine)
     session = session_mk()
 
+    # the sell out statistics are kept up to date with each change to the events, so build them from the full history
+    # the first time they are needed
+    if 'sell_out_stats' not in engine.table_names():
+        create_sell_out_stats_table(engine)
+        rebuild_sell_out_stats(engine)
+
     # initialize counters for the number of events and venues updated and added
     num_events_added = 0
     num_events_updated = 0
@@ -252,6 +260,10 @@ def update_events_venues(engine, raw_data_location, location_type):
                     # initialize a list of venue ids added to prevent attempting to add the same venue multiple times
                     new_venue_ids = []
 
+                    # read the events as they were before this file, and track the ones changed, for the sell out statistics
+                    previous_events = read_event_rows(engine, [event['id'] for event in output['events']])
+                    changed_ids = []
+
                     # query the events and venues tables for all ids, creating a dictionary of keys (for fast lookup)
                     event_ids = session.query(Event.id).all()
                     event_ids = {entity[0]: "" for entity in event_ids}
@@ -284,12 +296,14 @@ def update_events_venues(engine, raw_data_location, location_type):
                                 # if the entries are different, then update the feature
                                 update_event(engine, event, output['PullTime'])
                                 num_events_updated += 1
+                                changed_ids.append(event['id'])
                             else:
                                 logger.debug('Event %s is the same', event['id'])
                         # otherwise, create the event and add it to the list of objects to add
                         else:
                             objects_to_add.append(create_event(engine, event, output['PullTime']))
                             num_events_added += 1
+                            changed_ids.append(event['id'])
 
                         # if the venue_id is in the current list, update it
                         if int(event['venue_id']) in venue_ids.keys():
@@ -322,6 +336,12 @@ def update_events_venues(engine, raw_data_location, location_type):
                     logger.info("%s objects added", num_added)
                     overall_objects_added += num_added
 
+                    # apply the changes of this file's events to the sell out statistics
+                    update_sell_out_stats(engine, previous_events, changed_ids)
+
+                    # count this pull in the counters of its events
+                    update_event_velocity(engine, output['events'], output['PullTime'])
+
                     # update the last_update_date
                     update_path = os.path.join('config', 'last_update.txt')
                     new_update_date_txt = datetime.strftime(new_update_date, '%y-%m-%d-%H-%M-%S')
@@ -386,6 +406,10 @@ def update_events_venues(engine, raw_data_location, location_type):
                     # initialize a list of venue ids added to prevent attempting to add the same venue multiple times
                     new_venue_ids = []
 
+                    # read the events as they were before this file, and track the ones changed, for the sell out statistics
+                    previous_events = read_event_rows(engine, [event['id'] for event in output['events']])
+                    changed_ids = []
+
                     # query the events and venues tables for all ids, creating a dictionary of keys (for fast lookup)
                     event_ids = session.query(Event.id).all()
                     event_ids = {entity[0]: "" for entity in event_ids}
@@ -418,12 +442,14 @@ def update_events_venues(engine, raw_data_location, location_type):
                                 # if the entries are different, then update the feature
                                 update_event(engine, event, output['PullTime'])
                                 num_events_updated += 1
+                                changed_ids.append(event['id'])
                             else:
                                 logger.debug('Event %s is the same', event['id'])
                         # otherwise, create the event and add it to the list of objects to add
                         else:
                             objects_to_add.append(create_event(engine, event, output['PullTime']))
                             num_events_added += 1
+                            changed_ids.append(event['id'])
 
                         # if the venue_id is in the current list, update it
                         if int(event['venue_id']) in venue_ids.keys():
@@ -456,6 +482,12 @@ def update_events_venues(engine, raw_data_location, location_type):
                     logger.info("%s objects added", num_added)
                     overall_objects_added += num_added
 
+                    # apply the changes of this file's events to the sell out statistics
+                    update_sell_out_stats(engine, previous_events, changed_ids)
+
+                    # count this pull in the counters of its events
+                    update_event_velocity(engine, output['events'], output['PullTime'])
+
                     # update the last_update_date
                     update_path = os.path.join('config', 'last_update.txt')
                     new_update_date_txt = datetime.strftime(new_update_date, '%y-%m-%d-%H-%M-%S')
@@ -519,7 +551,7 @@ def run_update(args):
             sys.exit()
 
         # create the engine for the database and type
-        engine = create_db_engine(db_name, type)
+        engine = create_db_engine(db_name, type, **get_engine_options(config))
 
         # if the args passed specified an update to formats and categories, then conduct it
         if args.formats_cats:
@@ -567,7 +599,7 @@ def run_update(args):
             sys.exit()
 
         # create the engine for the database and type
-        engine = create_db_engine(db_name, type)
+        engine = create_db_engine(db_name, type, **get_engine_options(config))
 
         # if the args passed specified an update to formats and categories, then conduct it
         if args.formats_cats:
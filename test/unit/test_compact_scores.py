@@ -0,0 +1,34 @@
+import os
+import sys
+sys.path.append(os.environ.get('PYTHONPATH'))
+import pytest
+
+from datetime import datetime, timedelta
+import pandas as pd
+
+from src.compact_scores import rollup_scores
+
+
+def test_rollup_scores():
+    # ten daily predictions for an event starting on the 11th, flipping to a sell out on the 5th
+    start = datetime(2019, 6, 11)
+    scores = pd.DataFrame({'event_id': ['1'] * 10,
+                           'startDate': [start] * 10,
+                           'predictionDate': [datetime(2019, 6, 1) + timedelta(days=i) for i in range(10)],
+                           'willSellOut': [False] * 4 + [True] * 6,
+                           'confidence': [60.4] * 10,
+                           'howFarOut': [3.0] * 10})
+
+    rollups = rollup_scores(scores, [1, 7])
+
+    # assert that the first, last, changed, and lead time predictions are the only ones kept
+    assert list(rollups['predictionDate'].dt.day) == [1, 4, 5, 10]
+    assert list(rollups['reason']) == ['first', 'lead_7', 'change', 'last,lead_1']
+
+    # assert that the rollups are stored in compact types
+    assert rollups['confidence'].dtype == 'int16'
+    assert list(rollups['confidence']) == [60] * 4
+
+    # assert that rolling up the rollups again keeps the same predictions
+    again = rollup_scores(rollups, [1, 7])
+    assert list(again['predictionDate']) == list(rollups['predictionDate'])
@@ -0,0 +1,56 @@
+import os
+import sys
+sys.path.append(os.environ.get('PYTHONPATH'))
+import pytest
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from src.design_cache import design_matrix, read_cache, encoder_version
+
+
+def inputs(num_events, seed=0):
+    # events with a categorical and a numerical input
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame({'id': [str(i) for i in range(num_events)], 'venue': rng.choice(['a', 'b', 'c'], num_events),
+                         'minPrice': rng.uniform(0, 50, num_events)})
+
+
+def memory_mapped(array):
+    # whether an array is a view of a memory-mapped file
+    while array is not None and not isinstance(array, np.memmap):
+        array = getattr(array, 'base', None)
+    return array is not None
+
+
+def test_design_matrix(tmp_path):
+    cache = str(tmp_path / 'cache')
+    events = inputs(50)
+    ct = ColumnTransformer([('cat', OneHotEncoder(), ['venue']), ('num', StandardScaler(), ['minPrice'])],
+                           sparse_threshold=1.0).fit(events)
+    folder = os.path.join(cache, encoder_version(ct))
+
+    # assert that the first read encodes every event, and a repeated read uses the cached arrays without copying them
+    assert np.allclose(design_matrix(ct, events, cache).toarray(), ct.transform(events).toarray())
+    X = design_matrix(ct, events, cache)
+    assert memory_mapped(X.data) and memory_mapped(X.indices)
+
+    # assert that only new and changed events are appended, and that the result matches encoding them all
+    changed = pd.concat([events, inputs(5, seed=1)], ignore_index=True)
+    changed.loc[3, 'minPrice'] = 99.0
+    X = design_matrix(ct, changed.iloc[::-1], cache)
+    assert read_cache(folder)[0]['numRows'] == 56
+    assert np.allclose(X.toarray(), ct.transform(changed.iloc[::-1]).toarray())
+
+    # assert that an append that didn't finish is ignored, and cut off by the next one
+    with open(os.path.join(folder, 'data.bin'), 'ab') as f:
+        f.write(b'partial')
+    more = inputs(60, seed=2)
+    assert np.allclose(design_matrix(ct, more, cache).toarray(), ct.transform(more).toarray())
+
+    # assert that a refit transformer gets its own cache, and only the latest caches are kept
+    for seed in range(3):
+        design_matrix(ct.fit(inputs(50, seed)), events, cache)
+    assert len(os.listdir(cache)) == 2
@@ -0,0 +1,30 @@
+import os
+import sys
+sys.path.append(os.environ.get('PYTHONPATH'))
+import pytest
+
+from datetime import datetime
+import pandas as pd
+
+from src.evaluate_model import compare_models
+
+
+def test_compare_models():
+    features = pd.DataFrame({'id': ['a', 'b', 'c'], 'startDate': [datetime(2019, 6, 1)] * 3, 'isSoldOut': [1, 0, 1]})
+
+    # two versions scoring the events on two days, the second version missing event c on the first day
+    model_scores = pd.DataFrame({
+        'event_id': ['a', 'b', 'c', 'a', 'b', 'a', 'b', 'c', 'a', 'b', 'c'],
+        'modelVersion': [1, 1, 1, 2, 2, 1, 1, 1, 2, 2, 2],
+        'predictionDate': [datetime(2019, 5, 1)] * 5 + [datetime(2019, 5, 2)] * 6,
+        'willSellOut': [1, 0, 0, 1, 1, 1, 0, 1, 0, 0, 1]})
+
+    # assert that the versions are only compared on the events both scored, by prediction date
+    comparison = compare_models(features, model_scores)
+    assert list(comparison.index.get_level_values('modelVersion')) == [1, 2, 1, 2]
+    assert list(comparison[['tp', 'fp', 'tn', 'fn']].sum(axis=1)) == [2, 2, 3, 3]
+    assert list(comparison['fp']) == [0, 1, 0, 0]
+    assert list(comparison['CCR']) == [1, 0.5, 1, 2 / 3]
+
+    # assert that a single version has nothing to compare
+    assert compare_models(features, model_scores.loc[model_scores['modelVersion'] == 1]).shape[0] == 0
@@ -0,0 +1,70 @@
+import os
+import sys
+sys.path.append(os.environ.get('PYTHONPATH'))
+import pytest
+
+from datetime import datetime
+import pandas as pd
+
+from src.event_velocity import advance_counters, update_event_velocity, VELOCITY_TABLE_COLUMNS
+from src.helpers.helpers import create_db_engine, add_velocity_features
+from src.create_database import create_db
+
+
+def pull(min_price, available, wait_list, sold_out=False):
+    # the state of a single event in a pull, as returned by pull_state
+    return pd.DataFrame({'id': ['1'], 'minPrice': [min_price], 'maxPrice': [20.0], 'isAvailable': [available],
+                         'hasWaitList': [wait_list], 'isSoldOut': [sold_out]})
+
+
+def test_advance_counters():
+    counters = pd.DataFrame(columns=VELOCITY_TABLE_COLUMNS)
+
+    # three successive pulls: a first look, a price change, and a pause in sales with a wait list
+    counters = advance_counters(counters, pull(10.0, True, False), datetime(2019, 5, 1))
+    counters = advance_counters(counters, pull(12.0, True, False), datetime(2019, 5, 2))
+    counters = advance_counters(counters, pull(12.0, False, True), datetime(2019, 5, 3))
+    row = counters.iloc[0]
+
+    # assert that each counter moved once for its change
+    assert row['numPulls'] == 3
+    assert row['numPriceChanges'] == 1
+    assert row['numAvailabilityFlips'] == 1
+    assert row['firstPullDate'] == datetime(2019, 5, 1)
+    assert row['firstWaitListDate'] == datetime(2019, 5, 3)
+
+    # assert that a pull no newer than the last one counted isn't counted again
+    assert advance_counters(counters, pull(15.0, True, True), datetime(2019, 5, 3)).shape[0] == 0
+
+    # assert that the wait list date stays at its first appearance
+    counters = advance_counters(counters, pull(12.0, False, True), datetime(2019, 5, 4))
+    assert counters.iloc[0]['firstWaitListDate'] == datetime(2019, 5, 3)
+    assert counters.iloc[0]['numAvailabilityFlips'] == 1
+
+    # assert that the counters stop at a sell out, so its flip and wait list aren't counted
+    counters = advance_counters(pd.DataFrame(columns=VELOCITY_TABLE_COLUMNS), pull(10.0, True, False),
+                                datetime(2019, 5, 1))
+    assert advance_counters(counters, pull(10.0, False, True, sold_out=True), datetime(2019, 5, 2)).shape[0] == 0
+
+
+def test_velocity_as_of(tmp_path):
+    engine = create_db_engine(str(tmp_path / 'velocity.db'), 'sqlite')
+    create_db(engine)
+    engine.execute("INSERT INTO events (id, name, startDate, onSaleDate, venueId, categoryId, formatId, url) "
+                   "VALUES ('1', 'Show', '2019-05-10 20:00:00', '2019-04-30 00:00:00', 1, 1, 1, 'url')")
+
+    # count three pulls of an event, the last one its sell out
+    for day, (available, wait_list, sold_out) in zip([1, 3, 5], [(True, False, False), (True, True, False),
+                                                                (False, True, True)]):
+        update_event_velocity(engine, [{'id': '1', 'ticket_availability': {
+            'minimum_ticket_price': {'major_value': '10.00'}, 'maximum_ticket_price': None,
+            'has_available_tickets': available, 'waitlist_available': wait_list, 'is_sold_out': sold_out}}],
+                              datetime(2019, 5, day).strftime('%y-%m-%d-%H-%M-%S'))
+
+    # assert that the latest counters stop before the sell out, and that the counters can be read as of a time
+    features = pd.DataFrame({'id': ['1', '1']})
+    latest = add_velocity_features(engine, features)
+    assert list(latest['numPulls']) == [2.0, 2.0] and list(latest['numAvailabilityFlips']) == [0.0, 0.0]
+    as_of = add_velocity_features(engine, features, as_of=pd.Series([datetime(2019, 5, 2), datetime(2019, 4, 1)]))
+    assert list(as_of['numPulls']) == [1.0, 0.0] and list(as_of['hadWaitList']) == [0.0, 0.0]
+    assert list(latest['waitListDays']) == [3.0, 3.0]
@@ -0,0 +1,265 @@
+import os
+import sys
+sys.path.append(os.environ.get('PYTHONPATH'))
+import pytest
+
+import shutil
+from datetime import datetime
+import pandas as pd
+
+from sqlalchemy import MetaData, Table, inspect
+
+from src.helpers.helpers import create_db_engine
+from src.create_database import create_db
+from src.populate_database import initial_populate_events_venues
+from src.update_database import update_events_venues
+from src.generate_features import build_features, convert_data_to_features, stream_features, PRESENTER_SEEDS
+from src.generate_features import refresh_vocabulary, get_vocabulary, generate_features
+from src.feature_snapshots import features_as_of, lookup_features_as_of, point_in_time_features
+
+
+def golden_data():
+    # three events covering the branches of each feature, with dates as strings as they come back from sqlite
+    events = pd.DataFrame({
+        'id': ['1', '2', '3'],
+        'startDate': ['2019-05-10 20:00:00.000000', '2019-05-11 19:30:00.000000', '2019-05-12 21:00:00.000000'],
+        'onSaleDate': ['2019-04-10 10:00:00.000000', '2019-05-01 10:00:00.000000', '2019-05-12 09:00:00.000000'],
+        'soldOutDate': ['2019-05-03 12:00:00.000000', '2019-05-20 12:00:00.000000', '2019-04-12 00:00:01.000000'],
+        'venueId': [10, 20, 10],
+        'categoryId': [3001, 3002, 3001],
+        'formatId': [6, 6, 11],
+        'inventoryType': ['limited', 'limited', 'reserved'],
+        'isFree': [0, 0, 1],
+        'isReservedSeating': [0, 1, 0],
+        'minPrice': [10.0, None, 0.0],
+        'maxPrice': [20.0, None, 0.0],
+        'capacity': [200, 10000, 900],
+        'ageRestriction': ['21+', None, None],
+        'presentedBy': ['The Harmonica Dunn Presents', 'ELBO ROOM', None],
+        'isSoldOut': [1, 1, 0],
+        'name': ['event 1', 'event 2', 'event 3']})
+    venues = pd.DataFrame({
+        'id': [10, 20],
+        'name': ['The Hideout', 'Elbo Room'],
+        'city': [' Chicago ', None],
+        'ageRestriction': ['18+', None],
+        'capacity': [500, 300]})
+
+    # the golden output of the features for the three events
+    expected = pd.DataFrame({
+        'id': ['1', '2', '3'],
+        'startDate': ['2019-05-10 20:00:00.000000', '2019-05-11 19:30:00.000000', '2019-05-12 21:00:00.000000'],
+        'categoryId': [3001, 3002, 3001],
+        'formatId': [6, 6, 11],
+        'inventoryType': ['limited', 'limited', 'reserved'],
+        'isFree': [0, 0, 1],
+        'isReservedSeating': [0, 1, 0],
+        'minPrice': [10.0, 0.0, 0.0],
+        'maxPrice': [20.0, 0.0, 0.0],
+        'venueName_simple': ['the hideout', 'other', 'the hideout'],
+        'onSaleWindow': [30, 10, 0],
+        'eventWeekday': [4, 5, 6],
+        'startHour': [20, 19, 21],
+        'capacity': [200, 300, 500],
+        'locale': ['chicago', 'suburbs', 'chicago'],
+        'ageRestriction': ['21+', 'None', '18+'],
+        'presentedBy_simple': ['Harmonica Dunn', 'Elbo Room', 'Other'],
+        'isSoldOut': [1, 1, 0],
+        'soldOutLead': [7, 0, 0]})
+
+    return events, venues, expected
+
+
+def load_data(engine, events, venues=None):
+    # insert events (and venues) into a database created by create_db
+    metadata = MetaData()
+    events = events.copy()
+    events['url'] = 'https://www.eventbrite.com'
+    for column in ['startDate', 'onSaleDate', 'soldOutDate']:
+        events[column] = pd.to_datetime(events[column]).dt.to_pydatetime()
+    events = events.astype(object).where(events.notna(), None)
+    if venues is not None:
+        engine.execute(Table('venues', metadata, autoload=True, autoload_with=engine).insert(),
+                       venues.astype(object).where(venues.notna(), None).to_dict('records'))
+    engine.execute(Table('events', metadata, autoload=True, autoload_with=engine).insert(), events.to_dict('records'))
+
+
+def test_build_features():
+    events, venues, expected = golden_data()
+
+    features = build_features(events, venues, pd.Index(['the hideout']))
+
+    # assert that the features match the golden output
+    pd.testing.assert_frame_equal(features.reset_index(drop=True), expected)
+
+
+def test_convert_data_to_features_sql_pushdown(tmp_path):
+    events, venues, expected = golden_data()
+
+    # load the golden events and venues into a temporary database
+    engine = create_db_engine(str(tmp_path / 'features.db'), 'sqlite')
+    create_db(engine)
+    load_data(engine, events, venues)
+
+    state = {'mainVenues': ['the hideout'], 'presenters': PRESENTER_SEEDS}
+
+    # assert that the features computed in the database and in pandas both match the golden output
+    for sql_pushdown in [False, True]:
+        features = convert_data_to_features(engine, current_state=state, sql_pushdown=sql_pushdown)
+        features = features.sort_values('id').reset_index(drop=True)
+        pd.testing.assert_frame_equal(features, expected, check_dtype=False)
+
+        # assert that converting the events in chunks of two gives the same features
+        chunks = list(stream_features(engine, current_state=state, sql_pushdown=sql_pushdown, chunk_size=2))
+        assert [chunk.shape[0] for chunk in chunks] == [2, 1]
+        features = pd.concat(chunks).sort_values('id').reset_index(drop=True)
+        pd.testing.assert_frame_equal(features, expected, check_dtype=False)
+
+
+def test_refresh_vocabulary(tmp_path):
+    events, venues, expected = golden_data()
+
+    engine = create_db_engine(str(tmp_path / 'vocabulary.db'), 'sqlite')
+    create_db(engine)
+    load_data(engine, events, venues)
+
+    # assert that the first refresh adds the venues with enough events along with the seeded presenters
+    assert refresh_vocabulary(engine, min_events=1) == 4
+    vocabulary = get_vocabulary(engine)
+    assert sorted(vocabulary.loc[vocabulary['kind'] == 'venue', 'name']) == ['elbo room', 'the hideout']
+    assert list(vocabulary.loc[vocabulary['kind'] == 'presenter', 'label']) == ['Elbo Room', 'Harmonica Dunn']
+
+    # assert that a refresh without new venues or presenters adds nothing
+    assert refresh_vocabulary(engine, min_events=1) == 0
+
+    # assert that a new presenter is added under a new version, while one matching an existing entry isn't
+    new_events = events.copy()
+    new_events['id'] = ['4', '5', '6']
+    new_events['presentedBy'] = ['Riot Fest Presents', 'Presented by Harmonica Dunn', None]
+    load_data(engine, new_events)
+    assert refresh_vocabulary(engine, min_events=1) == 1
+    vocabulary = get_vocabulary(engine)
+    assert vocabulary.shape[0] == 5
+    assert list(vocabulary.loc[vocabulary['version'] == 2, 'name']) == ['riot fest presents']
+
+
+def test_generate_features_incremental(tmp_path):
+    events, venues, expected = golden_data()
+    events['lastInfoDate'] = [datetime(2019, 4, 28), datetime(2019, 4, 29), datetime(2019, 5, 1)]
+
+    engine = create_db_engine(str(tmp_path / 'incremental.db'), 'sqlite')
+    create_db(engine)
+    load_data(engine, events, venues)
+
+    # assert that the first generation rebuilds every feature, and that a second one without changes only converts
+    # the events last updated at the latest lastInfoDate (which may have been updated during the first)
+    assert generate_features(engine, min_events=1)[1]
+    features, full = generate_features(engine, min_events=1)
+    assert not full and list(features['id']) == ['3']
+
+    # assert that an updated event and a new event are converted, along with those at the last lastInfoDate, but not
+    # the other unchanged events
+    engine.execute("UPDATE events SET minPrice = 15.0, lastInfoDate = '2019-05-02 00:00:00.000000' WHERE id = '1'")
+    load_data(engine, events.iloc[[2]].assign(id='4', lastInfoDate=datetime(2019, 5, 2)))
+    features, full = generate_features(engine, min_events=1)
+    assert not full and sorted(features['id']) == ['1', '3', '4']
+
+    # assert that the events of a changed venue are converted, however long ago they were updated
+    engine.execute("UPDATE venues SET capacity = 350 WHERE id = 20")
+    features, full = generate_features(engine, min_events=1)
+    assert not full and sorted(features['id']) == ['1', '2', '4']
+
+    # assert that the incremental features match those of a full rebuild
+    incremental = pd.read_sql('SELECT * FROM features ORDER BY id', engine)
+    assert list(incremental['minPrice']) == [15.0, 0.0, 0.0, 0.0]
+    assert list(incremental['capacity']) == [200, 350, 500, 500]
+    generate_features(engine, full_rebuild=True, min_events=1)
+    pd.testing.assert_frame_equal(incremental, pd.read_sql('SELECT * FROM features ORDER BY id', engine))
+
+    # assert that a change to the feature code rebuilds every feature
+    engine.execute("UPDATE features_state SET codeVersion = 'old'")
+    features, full = generate_features(engine, min_events=1)
+    assert full and features.shape[0] == 4
+
+    # assert that a presenter added to the vocabulary rebuilds every feature
+    load_data(engine, events.iloc[[0]].assign(id='5', presentedBy='Riot Fest Presents',
+                                              lastInfoDate=datetime(2019, 5, 3)))
+    features, full = generate_features(engine, refresh=True, min_events=1)
+    assert full and features.shape[0] == 5
+    assert list(generate_features(engine, min_events=1)[0]['id']) == ['5']
+
+
+def test_generate_features_after_update(tmp_path):
+    # populate a database with the events pulled on one day, and generate their features
+    raw_data = tmp_path / 'raw' / '2019' / '5'
+    os.makedirs(str(raw_data / '2'))
+    os.makedirs(str(raw_data / '3'))
+    shutil.copy(os.path.join('data', 'sample', '2019', '5', '2', '8_5_45_1.json'), str(raw_data / '2'))
+    engine = create_db_engine(str(tmp_path / 'events.db'), 'sqlite')
+    create_db(engine)
+    initial_populate_events_venues(engine, str(tmp_path / 'raw'), 'local')
+    assert generate_features(engine)[1]
+
+    # update the database with the events pulled the next day, restoring the last update date the update records in
+    # the config folder
+    shutil.copy(os.path.join('data', 'sample', '2019', '5', '3', '23_47_33_1.json'), str(raw_data / '3'))
+    with open(os.path.join('config', 'last_update.txt'), 'r') as f:
+        last_update = f.read()
+    try:
+        with open(os.path.join('config', 'last_update.txt'), 'w') as f:
+            f.write('19-05-02-23-59-59')
+        update_events_venues(engine, str(tmp_path / 'raw'), 'local')
+    finally:
+        with open(os.path.join('config', 'last_update.txt'), 'w') as f:
+            f.write(last_update)
+
+    # assert that the incremental generation gives the same features as a full rebuild
+    features, full = generate_features(engine)
+    assert not full and features.shape[0] > 0
+    incremental = pd.read_sql('SELECT * FROM features ORDER BY id', engine)
+    generate_features(engine, full_rebuild=True)
+    pd.testing.assert_frame_equal(incremental, pd.read_sql('SELECT * FROM features ORDER BY id', engine))
+
+
+def test_feature_snapshots(tmp_path):
+    events, venues, expected = golden_data()
+
+    engine = create_db_engine(str(tmp_path / 'snapshots.db'), 'sqlite')
+    create_db(engine)
+    load_data(engine, events, venues)
+
+    # generate the features, change the price of an event, and generate them again
+    generate_features(engine, full_rebuild=True, min_events=1)
+    between = datetime.now()
+    engine.execute("UPDATE events SET minPrice = 15.0 WHERE id = '1'")
+    generate_features(engine, full_rebuild=True, min_events=1)
+
+    # assert that only the changed event got a second snapshot
+    snapshots = pd.read_sql('SELECT id FROM feature_snapshots', engine)
+    assert sorted(snapshots['id']) == ['1', '1', '2', '3']
+
+    # assert that the presenter labels can be as long as the presentedBy of the events
+    for table in ['features', 'feature_snapshots']:
+        columns = {column['name']: column['type'] for column in inspect(engine).get_columns(table)}
+        assert columns['presentedBy_simple'].length == 255
+
+    # assert that the features as of a time are the versions of that time
+    assert list(features_as_of(engine, between).sort_values('id')['minPrice']) == [10.0, 0.0, 0.0]
+    assert list(features_as_of(engine, datetime.now()).sort_values('id')['minPrice']) == [15.0, 0.0, 0.0]
+    assert features_as_of(engine, datetime(2019, 1, 1)).shape[0] == 0
+
+    # assert that each request is matched to the version of its own time, in the order of the requests
+    requests = pd.DataFrame({'id': ['1', '2', '1', '3'],
+                             'asOf': [datetime.now(), between, between, datetime(2019, 1, 1)]})
+    matched = lookup_features_as_of(engine, requests)
+    assert list(matched['id']) == ['1', '2', '1', '3']
+    assert list(matched['minPrice'].iloc[:3]) == [15.0, 0.0, 10.0]
+    assert pd.isna(matched['validFrom'].iloc[3])
+
+    # assert that the point in time inputs replace the latest ones, keeping the outcomes
+    latest = pd.read_sql('SELECT * FROM features ORDER BY id', engine)
+    latest['startDate'] = pd.to_datetime([between, between, datetime(2019, 1, 1)])
+    latest['isSoldOut'] = 1
+    features = point_in_time_features(engine, latest, 0)
+    assert list(features['minPrice']) == [10.0, 0.0, 0.0]
+    assert list(features['isSoldOut']) == [1, 1, 1]
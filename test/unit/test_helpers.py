@@ -6,6 +6,7 @@ import pytest
 from sqlalchemy.engine import Engine
 from datetime import datetime
 import json
+import pandas as pd
 
 from src.helpers import helpers
 
@@ -43,6 +44,28 @@ def test_create_db_engine():
         assert(True)
 
 
+def test_create_db_engine_cached():
+    # assert that asking for the same database twice returns the same pooled engine
+    engine = helpers.create_db_engine('test.db', 'sqlite', pool_pre_ping=True)
+    assert engine is helpers.create_db_engine('test.db', 'sqlite', pool_pre_ping=True)
+
+    # assert that different pool options build a separate engine
+    assert engine is not helpers.create_db_engine('test.db', 'sqlite', pool_pre_ping=True, pool_recycle=3600)
+
+    # assert that the mysql-only pool options are ignored for sqlite rather than raising an error
+    assert isinstance(helpers.create_db_engine('test.db', 'sqlite', pool_size=5, max_overflow=10), Engine)
+
+
+def test_get_engine_options():
+    config = {'database_info': {'how': 'local', 'pool_size': 5, 'pool_pre_ping': True}}
+
+    # assert that only the pool options present in the config are returned
+    assert helpers.get_engine_options(config) == {'pool_size': 5, 'pool_pre_ping': True}
+
+    # assert that a config without a database_info section gives no options
+    assert helpers.get_engine_options({}) == {}
+
+
 def test_event_to_event_dict():
     example = '{"name": {"text": "Sounds of Summer \u2013 Havana Night with Pandemonium Steel Band", "html": "Sounds of Summer \u2013 Havana Night with Pandemonium Steel Band"}, "description": {"text": "Enjoy traditional Caribbean music, and themed food and beverage specials, with Pandemonium Steel Band on the Cantigny clubhouse patio.", "html": "Enjoy traditional Caribbean music, and themed food and beverage specials, with Pandemonium Steel Band on the Cantigny clubhouse patio."}, "id": "59111762874", "url": "https://www.eventbrite.com/e/sounds-of-summer-havana-night-with-pandemonium-steel-band-tickets-59111762874?aff=ebapi", "start": {"timezone": "America/Chicago", "local": "2019-06-08T18:00:00", "utc": "2019-06-08T23:00:00Z"}, "end": {"timezone": "America/Chicago", "local": "2019-06-08T21:00:00", "utc": "2019-06-09T02:00:00Z"}, "organization_id": "298709505518", "created": "2019-03-20T14:29:59Z", "changed": "2019-03-20T14:33:35Z", "published": "2019-03-20T14:33:34Z", "capacity": null, "capacity_is_custom": null, "status": "live", "currency": "USD", "listed": true, "shareable": false, "online_event": false, "tx_time_limit": 480, "hide_start_date": false, "hide_end_date": false, "locale": "en_US", "is_locked": false, "privacy_setting": "unlocked", "is_series": false, "is_series_parent": false, "inventory_type": "limited", "is_reserved_seating": false, "show_pick_a_seat": false, "show_seatmap_thumbnail": false, "show_colors_in_seatmap_thumbnail": false, "source": "coyote", "is_free": true, "version": "3.7.0", "summary": "Enjoy traditional Caribbean music, and themed food and beverage specials, with Pandemonium Steel Band on the Cantigny clubhouse patio.", "logo_id": "58811313", "organizer_id": "19827544012", "venue_id": "31002373", "category_id": "103", "subcategory_id": null, "format_id": "6", "resource_uri": "https://www.eventbriteapi.com/v3/events/59111762874/", "is_externally_ticketed": false, "music_properties": {"resource_uri": "https://www.eventbriteapi.com/v3/events/59111762874/music_properties/", "age_restriction": null, "presented_by": null, "door_time": null}, "ticket_availability": {"has_available_tickets": true, "minimum_ticket_price": {"currency": "USD", "value": 0, "major_value": "0.00", "display": "0.00 USD"}, "maximum_ticket_price": {"currency": "USD", "value": 0, "major_value": "0.00", "display": "0.00 USD"}, "is_sold_out": false, "start_sales_date": {"timezone": "America/Chicago", "local": "2019-03-20T00:00:00", "utc": "2019-03-20T05:00:00Z"}, "waitlist_available": false}, "format": {"resource_uri": "https://www.eventbriteapi.com/v3/formats/6/", "id": "6", "name": "Concert or Performance", "name_localized": "Concert or Performance", "short_name": "Performance", "short_name_localized": "Performance"}, "venue": {"address": {"address_1": "27w270 Mack Road", "address_2": null, "city": "Wheaton", "region": "IL", "postal_code": "60189", "country": "US", "latitude": "41.8471004", "longitude": "-88.15528819999997", "localized_address_display": "27w270 Mack Road, Wheaton, IL 60189", "localized_area_display": "Wheaton, IL", "localized_multi_line_address_display": ["27w270 Mack Road", "Wheaton, IL 60189"]}, "resource_uri": "https://www.eventbriteapi.com/v3/venues/31002373/", "id": "31002373", "age_restriction": null, "capacity": null, "name": "Cantigny Golf Course Club House", "latitude": "41.8471004", "longitude": "-88.15528819999997"}, "basic_inventory_info": {"has_ticket_classes": true, "has_inventory_tiers": false, "has_ticket_rules": false, "has_add_ons": false, "has_donations": false}, "bookmark_info": {"bookmarked": false}, "logo": {"crop_mask": {"top_left": {"x": 0, "y": 1446}, "width": 2574, "height": 1287}, "original": {"url": "https://img.evbuc.com/https%3A%2F%2Fcdn.evbuc.com%2Fimages%2F58811313%2F298709505518%2F1%2Foriginal.20190320-143250?auto=compress&s=8dc615282f4f7a2c83f8da7c734bd2e9", "width": 2574, "height": 3861}, "id": "58811313", "url": "https://img.evbuc.com/https%3A%2F%2Fcdn.evbuc.com%2Fimages%2F58811313%2F298709505518%2F1%2Foriginal.20190320-143250?h=200&w=450&auto=compress&rect=0%2C1446%2C2574%2C1287&s=05b9340cab33f3561c59212169ec5998", "aspect_ratio": "2", "edge_color": "#172636", "edge_color_set": true}}'
 
@@ -81,3 +104,52 @@ def test_event_to_venue_dict():
         assert(True)
 
 
+def test_upsert_frame(tmp_path):
+    # build a small scores-like table in a temporary database
+    engine = helpers.create_db_engine(str(tmp_path / 'upsert.db'), 'sqlite')
+    engine.execute('CREATE TABLE scores (pred_id VARCHAR(30) PRIMARY KEY, startDate DATETIME, willSellOut BOOLEAN, '
+                   'confidence FLOAT)')
+
+    frame = pd.DataFrame({'pred_id': ['a', 'b'],
+                          'startDate': [datetime(2019, 6, 1, 20), datetime(2019, 6, 2, 20)],
+                          'willSellOut': [True, False],
+                          'confidence': [60.0, 70.0]})
+
+    # assert that new rows are all added
+    assert helpers.upsert_frame(engine, frame, 'scores', 'pred_id') == (2, 0, 0)
+
+    # assert that writing the same rows again changes nothing
+    assert helpers.upsert_frame(engine, frame, 'scores', 'pred_id') == (0, 0, 2)
+
+    # assert that a changed row is updated alongside an added row
+    frame = pd.concat([frame, pd.DataFrame({'pred_id': ['c'], 'startDate': [datetime(2019, 6, 3, 20)],
+                                            'willSellOut': [True], 'confidence': [80.0]})], ignore_index=True)
+    frame.loc[1, 'willSellOut'] = True
+    assert helpers.upsert_frame(engine, frame, 'scores', 'pred_id') == (1, 1, 1)
+
+    # assert that the table holds the written values
+    saved = pd.read_sql('SELECT * FROM scores ORDER BY pred_id', engine)
+    assert list(saved['willSellOut']) == [1, 1, 1]
+    assert list(saved['confidence']) == [60.0, 70.0, 80.0]
+
+
+def test_set_column_types():
+    # a scores-like frame as read from sqlite, with string dates and python objects
+    frame = pd.DataFrame({'pred_id': ['a-19-06-01', 'b-19-06-01'],
+                          'event_id': ['a', 'b'],
+                          'startDate': ['2019-06-01 20:00:00.000000', '2019-06-02 20:00:00.000000'],
+                          'willSellOut': [1, 0],
+                          'confidence': [60.0, 70.0]})
+
+    typed = helpers.set_column_types(frame, helpers.SCORE_TYPES)
+
+    # assert that the listed columns are converted and the others left alone
+    assert str(typed['event_id'].dtype) == 'category'
+    assert str(typed['startDate'].dtype) == 'datetime64[ns]'
+    assert str(typed['willSellOut'].dtype) == 'int8'
+    assert str(typed['confidence'].dtype) == 'float32'
+    assert typed['pred_id'].dtype == object
+    assert typed['startDate'][0] == datetime(2019, 6, 1, 20)
+
+    # assert that the passed frame isn't changed
+    assert frame['startDate'].dtype == object
@@ -0,0 +1,65 @@
+import os
+import sys
+sys.path.append(os.environ.get('PYTHONPATH'))
+import pytest
+
+import numpy as np
+from sklearn.linear_model import LogisticRegression, LinearRegression
+
+from src.helpers.helpers import create_db_engine
+from src.model_registry import register_models, rollback_version, get_current_version, list_versions
+from src.model_registry import load_current_models, load_version, load_current_linear_models, load_candidate_models
+from src.model_registry import check_local_artifacts
+
+
+def fit_models(seed):
+    # a small classifier and regressor fit on random data
+    rng = np.random.RandomState(seed)
+    X = rng.rand(20, 3)
+    return LogisticRegression().fit(X, X[:, 0] > 0.5), LinearRegression().fit(X, X[:, 1])
+
+
+def test_model_registry(tmp_path):
+    engine = create_db_engine(str(tmp_path / 'registry.db'), 'sqlite')
+    location = str(tmp_path / 'models')
+
+    # register two versions, the second becoming current
+    first = fit_models(0)
+    register_models(engine, first[0], first[1], location, 'local', 'linear', {'trainingAccuracy': 0.9})
+    second = fit_models(1)
+    register_models(engine, second[0], second[1], location, 'local', 'linear')
+
+    # assert that only the newest version is current, and that its models load memory-mapped
+    assert list(list_versions(engine)['status']) == ['current', 'retired']
+    classifier, regressor = load_current_models(engine)
+    assert isinstance(classifier.coef_, np.memmap)
+    assert np.allclose(classifier.coef_, second[0].coef_)
+
+    # assert that rollbacks walk back along the promotions, a third version rolling back to the second and then to
+    # the first, and that there is nothing before the first
+    third = fit_models(2)
+    register_models(engine, third[0], third[1], location, 'local', 'linear')
+    assert rollback_version(engine) == 2
+    assert rollback_version(engine) == 1
+    with pytest.raises(SystemExit):
+        rollback_version(engine)
+    record = get_current_version(engine)
+    assert record['version'] == 1
+    assert np.allclose(load_current_models(engine)[1].coef_, first[1].coef_)
+    assert load_current_linear_models(engine) is None
+
+    # assert that only the listed versions load as challengers, each version being read once per process
+    candidates = load_candidate_models(engine, [2, 5])
+    assert list(candidates) == [2]
+    assert candidates[2][0] is classifier
+
+    # assert that artifacts that don't match the hash of their version aren't loaded, whether read whole or hashed in
+    # chunks before being memory-mapped
+    assert check_local_artifacts(record, chunk_size=7) == ['classifier', 'regressor']
+    with open(os.path.join(record['location'], 'regressor.joblib'), 'ab') as f:
+        f.write(b'0')
+    with pytest.raises(SystemExit):
+        load_version(record, mmap=False)
+    with pytest.raises(SystemExit):
+        check_local_artifacts(record, chunk_size=7)
+
@@ -0,0 +1,87 @@
+import os
+import sys
+sys.path.append(os.environ.get('PYTHONPATH'))
+import pytest
+
+import shutil
+import argparse
+import yaml
+import pandas as pd
+
+from src.helpers.helpers import create_db_engine
+from src.create_database import create_db
+from src.populate_database import initial_populate_events_venues
+from src.model_registry import get_current_version
+from src.run_daily import run_daily
+
+
+def populated_database(tmp_path):
+    # raw data of events that started long ago, more than archive_days before today
+    raw_data = tmp_path / 'raw' / '2019' / '5' / '3'
+    os.makedirs(str(raw_data))
+    for name in ['23_47_33_1.json', '23_47_33_2.json']:
+        shutil.copy(os.path.join('data', 'sample', '2019', '5', '3', name), str(raw_data / name))
+
+    with open(os.path.join('config', 'config.yml'), 'r') as f:
+        config = yaml.load(f, Loader=yaml.Loader)
+    config['update_database']['update_events_venues']['raw_data_location'] = str(tmp_path / 'raw')
+    config['model_info'].update({'model_location': str(tmp_path / 'models'), 'design_cache': None})
+    config['evaluate_model']['save_location'] = str(tmp_path)
+    with open(str(tmp_path / 'config.yml'), 'w') as f:
+        yaml.dump(config, f)
+
+    # populate a new database with the events
+    engine = create_db_engine(str(tmp_path / 'events.db'), 'sqlite')
+    create_db(engine)
+    initial_populate_events_venues(engine, str(tmp_path / 'raw'), 'local')
+
+    args = argparse.Namespace(config=str(tmp_path / 'config.yml'), type='sqlite',
+                              database_name=str(tmp_path / 'events.db'), API_token=None, formats_cats=False,
+                              model_type=None, force=False, full_rebuild=False, refresh_vocabulary=False,
+                              incremental=False)
+    return engine, args
+
+
+def run_daily_runs(args, forces):
+    # run the daily pipeline once per force flag, restoring the last update date the update stage records in the
+    # config folder
+    with open(os.path.join('config', 'last_update.txt'), 'r') as f:
+        last_update = f.read()
+    try:
+        for force in forces:
+            args.force = force
+            run_daily(args)
+    finally:
+        with open(os.path.join('config', 'last_update.txt'), 'w') as f:
+            f.write(last_update)
+
+
+def test_run_daily_old_events(tmp_path):
+    engine, args = populated_database(tmp_path)
+    run_daily_runs(args, [False])
+
+    # assert that the events got their features and the models were trained before the events were archived
+    with engine.connect() as connection:
+        counts = {table: connection.execute('SELECT COUNT(*) FROM {}'.format(table)).scalar()
+                  for table in ['events', 'features', 'events_archive', 'features_archive']}
+    assert counts['events'] == 0 and counts['features'] == 0
+    assert counts['events_archive'] == counts['features_archive'] > 0
+    assert get_current_version(engine) is not None
+
+
+def test_run_daily_skips(tmp_path):
+    engine, args = populated_database(tmp_path)
+
+    # run the pipeline three times as is and then forced, and pull the status of each stage on each run
+    run_daily_runs(args, [False, False, False, True])
+    runs = pd.read_sql('SELECT stage, status FROM pipeline_runs ORDER BY id', engine)
+    statuses = runs.assign(run=runs.groupby('stage').cumcount()).pivot(index='stage', columns='run', values='status')
+
+    # assert that the update is skipped once the raw data is unchanged, that every stage is skipped once nothing it
+    # depends on changed (the first run's archiving changing the tables the second run reads), and that a forced run
+    # runs every stage again
+    assert statuses.shape == (7, 4)
+    assert (statuses[0] == 'success').all()
+    assert statuses.loc['update', 1] == 'skipped'
+    assert (statuses[2] == 'skipped').all()
+    assert (statuses[3] == 'success').all()
@@ -0,0 +1,61 @@
+import os
+import sys
+sys.path.append(os.environ.get('PYTHONPATH'))
+import pytest
+
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+import src.score_model as score_model
+from src.train_model import train_or_update_models
+from src.helpers.helpers import create_db_engine, pull_model_scores
+from src.model_registry import register_models, get_current_version, load_version
+from test_train_model import search_features
+
+
+def test_score_champion_challengers(tmp_path, monkeypatch):
+    engine = create_db_engine(str(tmp_path / 'scoring.db'), 'sqlite')
+    features = search_features()
+    location = str(tmp_path / 'models')
+
+    # register sgd models as the current version, and an incremental update of them (sharing their transformer) as
+    # two candidates
+    champion, regressor = train_or_update_models(engine, 'sgd', features.iloc[:40])[:2]
+    register_models(engine, champion, regressor, location, 'local', 'sgd')
+    candidate = train_or_update_models(engine, 'sgd', features, (champion, regressor))[:2]
+    register_models(engine, candidate[0], candidate[1], location, 'local', 'sgd', promote=False)
+    register_models(engine, candidate[0], candidate[1], location, 'local', 'sgd', promote=False)
+
+    # count the encodings of the inputs
+    encodings = []
+    design_matrix = score_model.design_matrix
+    monkeypatch.setattr(score_model, 'design_matrix', lambda *args: encodings.append(1) or design_matrix(*args))
+
+    # assert that the champion and the listed challenger are scored on a single encoding of the future events, the
+    # champion into the scores table and both into the model_scores table, and that the unlisted candidate isn't
+    future = features.assign(startDate=datetime.today() + timedelta(days=30), isSoldOut=0)
+    score_model.create_scores_table(engine)
+    score_model.score_champion_challengers(engine, *load_version(get_current_version(engine)), future,
+                                           cache_location=str(tmp_path / 'cache'), challengers=[1, 2])
+    assert len(encodings) == 1
+    assert pd.read_sql('SELECT COUNT(*) AS n FROM scores', engine)['n'][0] == 60
+    assert pull_model_scores(engine).groupby('modelVersion').size().to_dict() == {1: 60, 2: 60}
+
+    # assert that the challengers must be listed by version in the config
+    assert score_model.challenger_versions({'challengers': [3, 2, 3]}) == [2, 3]
+    assert score_model.challenger_versions({}) == []
+    with pytest.raises(SystemExit):
+        score_model.challenger_versions({'challengers': True})
+
+
+def test_build_scores():
+    events = pd.DataFrame({'id': ['a', 'b', 'c'], 'startDate': [datetime.today() + timedelta(days=days, hours=1)
+                                                                for days in [0, 5, 30]]})
+    probs = np.array([[0.9, 0.1], [0.345, 0.655], [0.2, 0.8]])
+
+    # assert that the class and confidence come from the highest probability, and the lead is clipped to the days left
+    scores = score_model.build_scores(events, probs, np.array([0, 1]), np.array([3.0, -2.0, 12.5]))
+    assert list(scores['willSellOut']) == [0, 1, 1]
+    assert np.allclose(scores['confidence'], [90, 66, 80])
+    assert list(scores['howFarOut']) == [0.0, 0.0, 12.5]
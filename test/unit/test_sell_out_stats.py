@@ -0,0 +1,78 @@
+import os
+import sys
+sys.path.append(os.environ.get('PYTHONPATH'))
+import pytest
+
+from datetime import datetime
+import pandas as pd
+
+from sqlalchemy import MetaData, Table
+
+from src.helpers.helpers import create_db_engine, add_sell_out_stats
+from src.create_database import create_db
+from src.sell_out_stats import event_contributions, rebuild_sell_out_stats, read_event_rows, update_sell_out_stats
+
+
+def stats_events():
+    # four events at one venue, the first two ending before the last two go on sale
+    return pd.DataFrame({
+        'id': ['1', '2', '3', '4'],
+        'name': ['event 1', 'event 2', 'event 3', 'event 4'],
+        'venueId': [10, 10, 10, 10],
+        'categoryId': [3001] * 4,
+        'formatId': [6] * 4,
+        'url': ['https://www.eventbrite.com'] * 4,
+        'presentedBy': ['Riot Fest Presents', 'riot fest presents ', None, 'Riot Fest Presents'],
+        'startDate': [datetime(2019, 5, 10, 20), datetime(2019, 5, 11, 20), datetime(2019, 6, 10, 20),
+                      datetime(2019, 6, 11, 20)],
+        'endDate': [datetime(2019, 5, 10, 23), datetime(2019, 5, 11, 23), datetime(2019, 6, 10, 23),
+                    datetime(2019, 6, 11, 23)],
+        'onSaleDate': [datetime(2019, 4, 1), datetime(2019, 4, 1), datetime(2019, 5, 12), datetime(2019, 5, 11)],
+        'soldOutDate': [datetime(2019, 5, 6), None, None, None],
+        'isSoldOut': [True, False, False, False]})
+
+
+def test_event_contributions():
+    cells = event_contributions(stats_events())
+
+    # assert that each event counts for its venue and (lower case) presenter on the day it ended
+    venue = cells.loc[cells['kind'] == 'venue']
+    assert list(venue['name'].unique()) == ['10']
+    assert venue['numEvents'].sum() == 4
+    presenter = cells.loc[cells['kind'] == 'presenter']
+    assert list(presenter['name'].unique()) == ['riot fest presents']
+    assert presenter['numEvents'].sum() == 3
+
+    # assert that the lead of the sold out event is counted
+    assert list(venue['numSoldOut']) == [1, 0, 0, 0]
+    assert list(venue['sumSoldOutLead']) == [4, 0, 0, 0]
+
+
+def test_update_sell_out_stats(tmp_path):
+    events = stats_events()
+
+    engine = create_db_engine(str(tmp_path / 'stats.db'), 'sqlite')
+    create_db(engine)
+    events_table = Table('events', MetaData(), autoload=True, autoload_with=engine)
+    engine.execute(events_table.insert(), events.astype(object).where(events.notna(), None).to_dict('records'))
+    rebuild_sell_out_stats(engine)
+
+    features = add_sell_out_stats(engine, events[['id']])
+
+    # assert that only the events that ended on a day before each on sale day are counted
+    assert list(features['venueEvents']) == [0, 0, 2, 1]
+    assert list(features['venueSellOutRate']) == [0, 0, 0.5, 1]
+    assert list(features['venueSoldOutLead']) == [0, 0, 4, 4]
+    assert list(features['presenterEvents']) == [0, 0, 0, 1]
+
+    # assert that updating the statistics with changed events matches rebuilding them
+    previous = read_event_rows(engine, ['2', '3'])
+    engine.execute(events_table.update().where(events_table.c.id == '2').values(
+        isSoldOut=True, soldOutDate=datetime(2019, 5, 10)))
+    engine.execute(events_table.update().where(events_table.c.id == '3').values(presentedBy='Elbo Room'))
+    update_sell_out_stats(engine, previous, ['2', '3'])
+    updated = pd.read_sql('SELECT * FROM sell_out_stats ORDER BY kind, name, endDay', engine)
+
+    rebuild_sell_out_stats(engine)
+    rebuilt = pd.read_sql('SELECT * FROM sell_out_stats ORDER BY kind, name, endDay', engine)
+    pd.testing.assert_frame_equal(updated, rebuilt)
@@ -0,0 +1,172 @@
+import os
+import sys
+sys.path.append(os.environ.get('PYTHONPATH'))
+import pytest
+
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import src.train_model as train_model
+from src.helpers.helpers import create_db_engine, SELL_OUT_STATS_COLUMNS, VELOCITY_COLUMNS
+from src.linear_predictor import load_linear_models
+from src.model_registry import register_models, get_current_version, load_version, load_current_linear_models
+
+
+def search_features(num_events=60):
+    # past events whose sell out follows their price, with a categorical column and the added numerical ones
+    rng = np.random.RandomState(0)
+    minPrice = rng.uniform(0, 50, num_events)
+    features = pd.DataFrame({
+        'id': [str(i) for i in range(num_events)],
+        'startDate': [datetime(2019, 5, 1) + timedelta(days=i) for i in range(num_events)],
+        'categoryId': rng.choice([3001, 3002], num_events),
+        'minPrice': minPrice,
+        'maxPrice': minPrice + 10,
+        'onSaleWindow': rng.randint(1, 60, num_events),
+        'capacity': rng.randint(100, 1000, num_events),
+        'isSoldOut': (minPrice < 25).astype(int),
+        'soldOutLead': np.where(minPrice < 25, rng.randint(0, 30, num_events), 0)})
+    for column in SELL_OUT_STATS_COLUMNS + VELOCITY_COLUMNS:
+        features[column] = rng.uniform(0, 1, num_events)
+    features['eventName'] = [' '.join(rng.choice(['Jazz', 'night', 'with', 'The', 'Quartet', 'DJ', 'live!'], 3))
+                             for i in range(num_events)]
+    features['presentedBy'] = rng.choice(['', 'Sound Presents', 'Live Nation'], num_events)
+    return features
+
+
+def test_search_models(tmp_path, monkeypatch):
+    features = search_features()
+    cache = str(tmp_path / 'cache')
+
+    classifier, regressor, leaderboard = train_model.search_models(features, ['linear', 'tree'], n_jobs=1, n_splits=3,
+                                                                   cache_location=cache)
+
+    # assert that every candidate of each task is ranked, and each fold result was cached
+    num_candidates = {task: sum(1 for family in ['linear', 'tree'] for params in
+                                train_model.ParameterGrid(train_model.MODEL_FAMILIES[family][task][1]))
+                      for task in ['classifier', 'regressor']}
+    assert (leaderboard.groupby('task').size() == pd.Series(num_candidates)).all()
+    assert list(leaderboard.loc[leaderboard['task'] == 'classifier', 'rank']) == list(
+        range(1, num_candidates['classifier'] + 1))
+    assert len(os.listdir(cache)) == 3 * sum(num_candidates.values())
+
+    # assert that the best models are fit and predict for every event
+    assert classifier.predict(features.set_index('id').drop(columns=['startDate', 'isSoldOut', 'soldOutLead'])).shape == (60,)
+
+    # assert that a repeated search refits nothing but the best models, with the same leaderboard
+    def fail(*args):
+        raise AssertionError('a cached fold was refit')
+    monkeypatch.setattr(train_model, 'fit_fold', fail)
+    repeated = train_model.search_models(features, ['linear', 'tree'], n_jobs=1, n_splits=3, cache_location=cache)[2]
+    pd.testing.assert_frame_equal(repeated, leaderboard)
+
+
+def test_train_models():
+    features = search_features()
+
+    classifier, regressor, metrics = train_model.train_models('linear', features)
+
+    # assert that the metrics scored on the design matrix of the fit match those of encoding the events again
+    assert metrics == train_model.model_metrics(classifier, regressor, features)
+    assert metrics['numEvents'] == 60
+
+    # assert that the linear regressor is regularized when the inputs include the hashed text, and only then
+    assert type(regressor.steps[-1][1]).__name__ == 'Ridge'
+    plain = train_model.train_models('linear', features.drop(columns=['eventName', 'presentedBy']))[1]
+    assert type(plain.steps[-1][1]).__name__ == 'LinearRegression'
+
+    # assert that both models share a single fit of the transformer, and that it builds a sparse design matrix
+    assert classifier.named_steps['transform'] is regressor.named_steps['transform']
+    inputs = features.set_index('id').drop(columns=['startDate', 'isSoldOut', 'soldOutLead'])
+    assert sparse.isspmatrix_csr(classifier.named_steps['transform'].transform(inputs))
+    assert regressor.predict(inputs).shape == (60,)
+
+    # assert that the text is hashed into a fixed number of columns however many new tokens it has
+    width = classifier.named_steps['transform'].transform(inputs).shape[1]
+    inputs['eventName'] = ['Unheard Of Name {}'.format(i) for i in range(60)]
+    assert classifier.named_steps['transform'].transform(inputs).shape[1] == width
+    assert width >= sum(train_model.TEXT_HASH_FEATURES.values())
+
+
+def test_train_or_update_models(tmp_path):
+    features = search_features()
+    engine = create_db_engine(str(tmp_path / 'training.db'), 'sqlite')
+
+    # train sgd models on the first 40 events from scratch
+    classifier, regressor, mode, metrics = train_model.train_or_update_models(engine, 'sgd', features.iloc[:40])
+    assert mode == 'full'
+    coef = classifier.steps[-1][1].coef_.copy()
+
+    # assert that an update only trains on the events labeled since, with the transformer kept frozen
+    transformer = classifier.steps[0][1]
+    classifier, regressor, mode, metrics = train_model.train_or_update_models(engine, 'sgd', features,
+                                                                              (classifier, regressor))
+    assert mode == 'incremental' and metrics['numEvents'] == 60
+    assert classifier.steps[0][1] is transformer
+    assert not np.allclose(classifier.steps[-1][1].coef_, coef)
+    runs = pd.read_sql('SELECT mode, numEvents FROM training_runs ORDER BY id', engine)
+    assert list(runs['mode']) == ['full', 'incremental'] and list(runs['numEvents']) == [40, 20]
+    assert pd.read_sql('SELECT COUNT(*) AS n FROM trained_events', engine)['n'][0] == 60
+
+    # assert that models that can't be updated, or whose full training is too old, are trained from scratch
+    assert train_model.train_or_update_models(engine, 'linear', features, (classifier, regressor))[2] == 'full'
+    train_model.train_or_update_models(engine, 'sgd', features)
+    assert train_model.train_or_update_models(engine, 'sgd', features, (classifier, regressor),
+                                              full_retrain_days=-1)[2] == 'full'
+
+
+def test_export_linear_models(monkeypatch):
+    features = search_features()
+    monkeypatch.setattr(train_model, 'TEXT_HASH_FEATURES', {'eventName': 8, 'presentedBy': 4})  # so tokens collide
+    inputs = features.set_index('id').drop(columns=['startDate', 'isSoldOut', 'soldOutLead'])
+    inputs.iloc[:5, inputs.columns.get_loc('categoryId')] = 3003  # a category the models weren't trained on
+    inputs.iloc[:5, inputs.columns.get_loc('eventName')] = 'Jazz Trio, LIVE jazz'  # new and repeated tokens
+
+    # assert that the numpy predictors match the sklearn pipelines for the linear and sgd models
+    for model_type in ['linear', 'sgd']:
+        classifier, regressor = train_model.train_models(model_type, features)[:2]
+        compiled_classifier, compiled_regressor = load_linear_models(
+            train_model.export_linear_models(classifier, regressor))
+        assert (compiled_classifier.predict(inputs) == classifier.predict(inputs)).all()
+        assert np.allclose(compiled_classifier.predict_proba(inputs), classifier.predict_proba(inputs))
+        assert np.allclose(compiled_regressor.predict(inputs), regressor.predict(inputs))
+
+    # assert that models that aren't linear aren't exported
+    assert train_model.export_linear_models(*train_model.train_models('tree', features)[:2]) is None
+
+
+def test_linear_artifact(tmp_path):
+    engine = create_db_engine(str(tmp_path / 'registry.db'), 'sqlite')
+    features = search_features()
+    classifier, regressor = train_model.train_models('linear', features)[:2]
+
+    # assert that the linear artifact is stored with the version and loaded as its numpy predictors
+    register_models(engine, classifier, regressor, str(tmp_path / 'models'), 'local', 'linear', None,
+                    train_model.export_linear_models(classifier, regressor))
+    compiled_classifier, compiled_regressor = load_current_linear_models(engine)
+    assert np.allclose(compiled_regressor.predict(features), regressor.predict(features))
+
+    # assert that the artifact is covered by the hash of the version
+    with open(os.path.join(get_current_version(engine)['location'], 'linear.npz'), 'ab') as f:
+        f.write(b'0')
+    with pytest.raises(SystemExit):
+        load_version(get_current_version(engine), mmap=False)
+
+
+def test_train_fast():
+    features = search_features(200)
+
+    # assert that the sample keeps the share of sold out events
+    sample, rest = train_model.subsample_training_events(features, 80)
+    assert sample.shape[0] == 80 and rest.shape[0] == 120
+    assert abs(sample['isSoldOut'].mean() - features['isSoldOut'].mean()) < 0.01
+
+    # assert that fast sgd models stop early, and that their held out and estimated full scores are returned
+    classifier, regressor, estimates = train_model.train_fast('sgd', features, 80, n_splits=2)
+    assert classifier.steps[-1][1].early_stopping and regressor.steps[-1][1].early_stopping
+    assert set(estimates) == {'heldOutAccuracy', 'estimatedFullAccuracy', 'heldOutRSquared', 'estimatedFullRSquared'}
+
+    # assert that features within the budget are trained on whole
+    assert train_model.train_fast('linear', features, 500)[2] == {}